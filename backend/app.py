@@ -1,156 +1,954 @@
-from flask import Flask, request, jsonify
-from flask_sqlalchemy import SQLAlchemy
+from flask import Flask, Response, abort, current_app, g, jsonify, request, stream_with_context, url_for
+from flask.cli import with_appcontext
+from flask.logging import default_handler
+from cache import create_cache
+from change_feed import ChangeFeed
+from compression import init_compression
+from group_commit import GroupCommitter
+from idempotency import REPLAYED_HEADER, create_idempotency_store, idempotent
+from jobs import JobQueue
+from log_pipeline import REQUEST_ID_HEADER, init_request_logging, parse_sample_rates, setup_logging
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, AppMetrics
+from models import db, Tenant, Todo, todo_etag
+from readiness import ReadinessProbe
+from request_parsing import (
+    STREAM_FORMATS, collection_etag, encode_cursor, format_change_token, parse_change_token,
+    parse_list_params, parse_positive_int, parse_stream_format, validate_todo_input, validate_todo_update,
+)
+from serialization import create_encoder
+from snapshot import (
+    FORMATS as SNAPSHOT_FORMATS, SnapshotError, parse_format as parse_snapshot_format, read_snapshot, write_snapshot,
+)
+from storage import ConflictError, create_store
+from tenancy import current_owner, generate_api_key, hash_api_key, init_tenancy
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
+from werkzeug.local import LocalProxy
+import click
+import math
 import os
-import logging
-from logging.handlers import RotatingFileHandler
-
-app = Flask(__name__)
-CORS(app)
-
-# Configure logging
-if not app.debug:
-    # Ensure logs directory exists
-    log_dir = os.path.join(app.instance_path, 'logs')
-    os.makedirs(log_dir, exist_ok=True)
-    
-    # Set up file handler
-    file_handler = RotatingFileHandler(
-        os.path.join(log_dir, 'flask.log'),
-        maxBytes=10240,
-        backupCount=10
-    )
-    file_handler.setFormatter(logging.Formatter(
-        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-    ))
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    
-    # Also log to stderr for container logs
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-    app.logger.addHandler(console_handler)
-    
-    app.logger.setLevel(logging.INFO)
-    app.logger.info('Flask app startup')
-
-# Database Configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///todos.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
-
-# Todo Model
-class Todo(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    task = db.Column(db.String(200), nullable=False)
-    completed = db.Column(db.Boolean, default=False)
-
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'task': self.task,
-            'completed': self.completed
-        }
+from datetime import datetime, timedelta, timezone
+import threading
+import time
+
+# Importing this module has no side effects: create_app() builds each app
+# with its own store, caches and change feed, kept in app.extensions.
+# Views reach those of the app serving the request through these proxies.
+EXTENSION = 'todo_api'
+
+def _app_component(name):
+    return LocalProxy(lambda: current_app.extensions[EXTENSION][name])
+
+store = _app_component('store')
+todo_cache = _app_component('todo_cache')
+todo_encoder = _app_component('todo_encoder')
+app_metrics = _app_component('app_metrics')
+change_feed = _app_component('change_feed')
+idempotency_store = _app_component('idempotency_store')
+readiness_probe = _app_component('readiness_probe')
+job_queue = _app_component('job_queue')
+
+_routes = []
+# Endpoints whose responses get TODOS_CACHE_CONTROL
+CACHEABLE_ENDPOINTS = {'get_todos', 'get_todo'}
+
+def route(rule, **options):
+    """Like app.route(), for the views create_app() registers on every app."""
+    def decorator(view):
+        _routes.append((rule, view, options))
+        return view
+    return decorator
+
+def default_config(environ=os.environ):
+    """Return the settings read from the environment."""
+    return {
+        # Logging: JSON lines written by a background thread (see log_pipeline.py)
+        'LOG_LEVEL': environ.get('LOG_LEVEL', 'INFO').upper(),
+        # Directory of flask.log and its rotated files; unset uses instance/logs
+        'LOG_DIR': environ.get('LOG_DIR') or None,
+        'LOG_MAX_BYTES': int(environ.get('LOG_MAX_BYTES', 50 * 1024 * 1024)),
+        'LOG_BACKUP_COUNT': int(environ.get('LOG_BACKUP_COUNT', 5)),
+        'LOG_QUEUE_SIZE': int(environ.get('LOG_QUEUE_SIZE', 10000)),
+        'LOG_SAMPLE_RATE': float(environ.get('LOG_SAMPLE_RATE', 1.0)),
+        'LOG_SAMPLE_RATES': parse_sample_rates(environ.get('LOG_SAMPLE_RATES')),
+        # Database Configuration
+        # DATABASE_URL selects the storage backend: sqlite:///... or postgresql://...
+        'SQLALCHEMY_DATABASE_URI': environ.get('DATABASE_URL', 'sqlite:///todos.db'),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        # Pagination and streaming
+        'TODOS_MAX_PAGE_SIZE': int(environ.get('TODOS_MAX_PAGE_SIZE', 1000)),
+        'TODOS_STREAM_BATCH_SIZE': int(environ.get('TODOS_STREAM_BATCH_SIZE', 1000)),
+        # Encoder of todo lists: auto (orjson when installed), orjson or python
+        'JSON_ENCODER': environ.get('JSON_ENCODER', 'auto'),
+        # Maximum number of items accepted by the /todos/bulk endpoints
+        'TODOS_BULK_MAX_ITEMS': int(environ.get('TODOS_BULK_MAX_ITEMS', 1000)),
+        # Cache-Control of GET /todos and GET /todos/<id>; clients revalidate with the ETag
+        'TODOS_CACHE_CONTROL': environ.get('TODOS_CACHE_CONTROL', 'no-cache'),
+        # Response compression (gzip, or brotli when installed) of JSON bodies from COMPRESSION_MIN_SIZE bytes
+        'COMPRESSION_ENABLED': environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true',
+        'COMPRESSION_MIN_SIZE': int(environ.get('COMPRESSION_MIN_SIZE', 1024)),
+        'COMPRESSION_GZIP_LEVEL': int(environ.get('COMPRESSION_GZIP_LEVEL', 6)),
+        'COMPRESSION_BROTLI_QUALITY': int(environ.get('COMPRESSION_BROTLI_QUALITY', 4)),
+        'COMPRESSION_CACHE_MAX_ENTRIES': int(environ.get('COMPRESSION_CACHE_MAX_ENTRIES', 1000)),
+        'COMPRESSION_CACHE_MAX_BYTES': int(environ.get('COMPRESSION_CACHE_MAX_BYTES', 16 * 1024 * 1024)),
+        # Response cache (CACHE_BACKEND: memory, redis or none)
+        'CACHE_BACKEND': environ.get('CACHE_BACKEND', 'memory'),
+        'CACHE_TTL': int(environ.get('CACHE_TTL', 30)),
+        'CACHE_MAX_ENTRIES': int(environ.get('CACHE_MAX_ENTRIES', 10000)),
+        'CACHE_MAX_BYTES': int(environ.get('CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+        'CACHE_REDIS_URL': environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0'),
+        # Full-text search
+        'SEARCH_MAX_PAGE_SIZE': int(environ.get('SEARCH_MAX_PAGE_SIZE', 100)),
+        'SEARCH_BACKFILL_BATCH_SIZE': int(environ.get('SEARCH_BACKFILL_BATCH_SIZE', 1000)),
+        'SEARCH_BACKFILL_ON_STARTUP': environ.get('SEARCH_BACKFILL_ON_STARTUP', 'true').lower() == 'true',
+        # Request and database metrics served at /metrics
+        'METRICS_ENABLED': environ.get('METRICS_ENABLED', 'true').lower() == 'true',
+        # Tenants: API keys (AUTH_REQUIRED rejects anonymous requests) and per-tenant rate limits
+        'AUTH_REQUIRED': environ.get('AUTH_REQUIRED', 'false').lower() == 'true',
+        'AUTH_KEY_CACHE_SIZE': int(environ.get('AUTH_KEY_CACHE_SIZE', 10000)),
+        'AUTH_KEY_CACHE_TTL': int(environ.get('AUTH_KEY_CACHE_TTL', 60)),
+        # Requests per second allowed to each tenant; 0 disables rate limiting
+        'RATE_LIMIT_PER_SECOND': float(environ.get('RATE_LIMIT_PER_SECOND', 0)),
+        'RATE_LIMIT_BURST': int(environ.get('RATE_LIMIT_BURST', 20)),
+        # Idempotency-Key support on POST and PUT (IDEMPOTENCY_BACKEND: memory or redis)
+        'IDEMPOTENCY_BACKEND': environ.get('IDEMPOTENCY_BACKEND', 'memory'),
+        'IDEMPOTENCY_TTL': int(environ.get('IDEMPOTENCY_TTL', 86400)),
+        'IDEMPOTENCY_MAX_KEYS': int(environ.get('IDEMPOTENCY_MAX_KEYS', 100000)),
+        # Group commit of single-todo writes; a window of 0 commits each write on its own
+        'GROUP_COMMIT_WINDOW_MS': float(environ.get('GROUP_COMMIT_WINDOW_MS', 0)),
+        'GROUP_COMMIT_MAX_LATENCY_MS': float(environ.get('GROUP_COMMIT_MAX_LATENCY_MS', 10)),
+        'GROUP_COMMIT_MAX_BATCH': int(environ.get('GROUP_COMMIT_MAX_BATCH', 64)),
+        # Delta sync served at /todos/changes
+        'CHANGES_MAX_PAGE_SIZE': int(environ.get('CHANGES_MAX_PAGE_SIZE', 1000)),
+        'TOMBSTONE_RETENTION_DAYS': int(environ.get('TOMBSTONE_RETENTION_DAYS', 30)),
+        # Change feed served at /todos/events
+        'EVENTS_LOG_SIZE': int(environ.get('EVENTS_LOG_SIZE', 10000)),
+        'EVENTS_HEARTBEAT_INTERVAL': float(environ.get('EVENTS_HEARTBEAT_INTERVAL', 15)),
+        'EVENTS_RETRY_MS': int(environ.get('EVENTS_RETRY_MS', 3000)),
+        # Each open stream holds a server thread: cap them per process (by
+        # default half the gunicorn threads) and end each after a while
+        'EVENTS_MAX_STREAMS': int(environ.get('EVENTS_MAX_STREAMS',
+                                              max(1, int(environ.get('GUNICORN_THREADS', 4)) // 2))),
+        'EVENTS_MAX_STREAM_SECONDS': float(environ.get('EVENTS_MAX_STREAM_SECONDS', 300)),
+        # Background jobs (see jobs.py), run by JOBS_WORKERS threads in each server process
+        'JOBS_WORKERS': int(environ.get('JOBS_WORKERS', 1)),
+        'JOBS_MAX_ATTEMPTS': int(environ.get('JOBS_MAX_ATTEMPTS', 3)),
+        'JOBS_RETRY_DELAY': float(environ.get('JOBS_RETRY_DELAY', 5)),
+        'JOBS_POLL_INTERVAL': float(environ.get('JOBS_POLL_INTERVAL', 1)),
+        'JOBS_STALE_AFTER': float(environ.get('JOBS_STALE_AFTER', 60)),
+        # Todos moved to the archive per transaction
+        'ARCHIVE_BATCH_SIZE': int(environ.get('ARCHIVE_BATCH_SIZE', 1000)),
+        # Rows per batch of snapshot exports and imports (see snapshot.py)
+        'SNAPSHOT_BATCH_SIZE': int(environ.get('SNAPSHOT_BATCH_SIZE', 10000)),
+        # Readiness served at /readyz from a probe refreshed in the background; 0 probes on every request
+        'READINESS_REFRESH_INTERVAL': float(environ.get('READINESS_REFRESH_INTERVAL', 5)),
+        'READINESS_MAX_POOL_SATURATION': float(environ.get('READINESS_MAX_POOL_SATURATION', 0.9)),
+        'READINESS_MAX_WRITE_LOCK_WAIT_MS': float(environ.get('READINESS_MAX_WRITE_LOCK_WAIT_MS', 1000)),
+        'READINESS_MIN_DISK_FREE_MB': int(environ.get('READINESS_MIN_DISK_FREE_MB', 100)),
+        'READINESS_MAX_REPLICATION_LAG': float(environ.get('READINESS_MAX_REPLICATION_LAG', 30)),
+        # Run the common queries once at startup and in each new server worker
+        'STARTUP_WARM_UP': environ.get('STARTUP_WARM_UP', 'true').lower() == 'true',
+    }
+
+def _cache_entry(response, **extra):
+    """Capture what is needed to replay a JSON response from the cache."""
+    headers = {
+        name: response.headers[name]
+        for name in ('ETag', 'Link', 'X-Next-Cursor') if name in response.headers
+    }
+    return {'body': response.get_data(as_text=True), 'headers': headers, **extra}
+
+def _add_cache_control(response):
+    """Tell clients how long they may reuse todo reads without revalidating them."""
+    if request.endpoint in CACHEABLE_ENDPOINTS and response.status_code in (200, 304):
+        response.headers.setdefault('Cache-Control', current_app.config['TODOS_CACHE_CONTROL'])
+    return response
+
+def _cached_response(entry):
+    return Response(entry['body'], mimetype='application/json', headers=entry['headers'])
+
+def _not_modified(etag):
+    """Return a 304 response if the client already holds etag, else None."""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+def _check_if_match(if_match, etag):
+    """Raise ConflictError if an If-Match header does not match etag."""
+    if if_match and not if_match.contains(etag):
+        raise ConflictError('If-Match precondition failed')
+
+def run_write(write):
+    """Run write() and commit it, in the next group commit when one is configured."""
+    group_committer = current_app.extensions[EXTENSION]['group_committer']
+    if group_committer is None:
+        return write()
+    return group_committer.submit(write, shard=g.get('shard'))
+
+def _stream_todos(stream_format, params):
+    """Stream todos as NDJSON or as a chunked JSON array, one chunk per batch."""
+    batch_size = current_app.config['TODOS_STREAM_BATCH_SIZE']
+    filters = {key: value for key, value in params.items() if key != 'limit'}
+    filters['owner_id'] = current_owner()
+
+    def generate_ndjson():
+        for rows in store.iter_row_batches(batch_size=batch_size, **filters):
+            yield todo_encoder.ndjson(rows)
+
+    def generate_json_array():
+        yield b'['
+        first = True
+        for rows in store.iter_row_batches(batch_size=batch_size, **filters):
+            yield todo_encoder.array_items(rows, first)
+            first = False
+        yield b']'
+
+    generate = generate_ndjson if stream_format == 'ndjson' else generate_json_array
+    return Response(stream_with_context(generate()), mimetype=STREAM_FORMATS[stream_format])
 
 # API Endpoints
-@app.route('/todos', methods=['GET'])
+@route('/todos', methods=['GET'])
 def get_todos():
-    app.logger.info('GET /todos request received')
-    todos = Todo.query.all()
-    app.logger.info(f'Returning {len(todos)} todos')
-    return jsonify([todo.to_dict() for todo in todos])
+    try:
+        params = parse_list_params(request.args)
+        stream_format = parse_stream_format(request.args, request.accept_mimetypes.best)
+    except ValueError as e:
+        current_app.logger.warning('Invalid GET /todos parameters: %s', e)
+        return jsonify({"error": str(e)}), 400
+
+    if stream_format:
+        current_app.logger.info('Streaming todos as %s', stream_format)
+        return _stream_todos(stream_format, params)
+
+    # The change counter alone decides freshness, so a matching
+    # If-None-Match is answered without loading or serializing any rows
+    change_counter = store.change_counter()
+    etag = collection_etag(change_counter, current_owner())
+    not_modified = _not_modified(etag)
+    if not_modified:
+        current_app.logger.info('Todos not modified')
+        return not_modified
+
+    # Tenant ids are unique across shards, so the owner alone scopes the list. The
+    # change counter in the key retires pages once any process commits a change.
+    query = '&'.join(f'{key}={value}' for key, value in params.items())
+    cache_key = todo_cache.list_key(f'owner={current_owner()}&counter={change_counter}&{query}')
+    cached = todo_cache.get(cache_key)
+    if cached is not None:
+        current_app.logger.info('Returning cached todos')
+        return _cached_response(cached)
+    epoch = todo_cache.epoch()
+    response = _build_todos_response(params)
+    response.set_etag(etag)
+    todo_cache.set(cache_key, _cache_entry(response), epoch)
+    return response
+
+def _todos_json(rows):
+    """Return (id, task, completed) rows as the JSON array jsonify would send."""
+    provider = current_app.json
+    if provider.compact is False or (provider.compact is None and current_app.debug):
+        # The fast encoder only writes compact JSON; jsonify indents in debug mode
+        return jsonify([{'id': todo_id, 'task': task, 'completed': completed} for todo_id, task, completed in rows])
+    return Response(todo_encoder.array(rows), mimetype='application/json')
+
+def _build_todos_response(params):
+    filters = dict(params, owner_id=current_owner())
+    limit = filters.pop('limit')
+    if limit is None and filters['after'] is None:
+        # Unpaginated requests keep returning the whole list for existing clients
+        todos = store.list_rows(**filters)
+        current_app.logger.info('Returning %s todos', len(todos))
+        return _todos_json(todos)
+
+    limit = min(limit or current_app.config['TODOS_MAX_PAGE_SIZE'], current_app.config['TODOS_MAX_PAGE_SIZE'])
+    # Fetch one extra row to find out whether another page follows
+    todos = store.list_rows(limit=limit + 1, **filters)
+    has_more = len(todos) > limit
+    todos = todos[:limit]
+    current_app.logger.info('Returning page of %s todos', len(todos))
+    response = _todos_json(todos)
+    if has_more:
+        next_cursor = encode_cursor(params['sort'], todos[-1])
+        query = {key: value for key, value in request.args.items() if key not in ('after', 'limit')}
+        next_url = url_for('get_todos', **query, limit=limit, after=next_cursor)
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response
+
+@route('/todos/search', methods=['GET'])
+def search_todos():
+    q = request.args.get('q', '').strip()
+    try:
+        if not q:
+            raise ValueError("'q' is required")
+        limit = parse_positive_int('limit', request.args.get('limit')) or 20
+        offset = request.args.get('offset', '0')
+        if not offset.isdigit():
+            raise ValueError("'offset' must be a non-negative integer")
+        offset = int(offset)
+    except ValueError as e:
+        current_app.logger.warning('Invalid GET /todos/search parameters: %s', e)
+        return jsonify({"error": str(e)}), 400
 
-@app.route('/todos/<int:id>', methods=['GET'])
+    limit = min(limit, current_app.config['SEARCH_MAX_PAGE_SIZE'])
+    # Fetch one extra row to tell whether another page follows
+    results = store.search(q, limit + 1, offset, owner_id=current_owner())
+    pending = store.search_index_pending()
+    current_app.logger.info('Returning %s search results', min(len(results), limit))
+    return jsonify({
+        "query": q,
+        "results": results[:limit],
+        "next_offset": offset + limit if len(results) > limit else None,
+        # False while older todos are still being added to the index
+        "index_complete": pending == 0,
+    })
+
+@route('/todos/changes', methods=['GET'])
+def todo_changes():
+    """Return the todos changed and deleted since a change token, for delta sync."""
+    try:
+        since = parse_change_token(request.args.get('since'))
+        max_page_size = current_app.config['CHANGES_MAX_PAGE_SIZE']
+        limit = min(parse_positive_int('limit', request.args.get('limit')) or max_page_size, max_page_size)
+    except ValueError as e:
+        current_app.logger.warning('Invalid GET /todos/changes parameters: %s', e)
+        return jsonify({"error": str(e)}), 400
+    if since is not None and since[0] < store.pruned_revision():
+        return jsonify({"error": "Changes since this token were compacted, reload the full list"}), 410
+
+    # Read before the changes, so the token never runs ahead of them
+    revision = store.change_counter()
+    changes = store.list_changes(since, limit + 1, owner_id=current_owner())
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    if has_more:
+        token = format_change_token(changes[-1]['revision'], changes[-1]['id'])
+    else:
+        revision = max([revision, *(change['revision'] for change in changes)])
+        token = format_change_token(max(revision, since[0]) if since else revision)
+    return jsonify({"changes": changes, "token": token, "has_more": has_more})
+
+@route('/todos/<int:id>', methods=['GET'])
 def get_todo(id):
-    app.logger.info(f'GET /todos/{id} request received')
-    todo = Todo.query.get_or_404(id)
-    app.logger.info(f'Returning todo {id}')
-    return jsonify(todo.to_dict())
+    owner_id = current_owner()
+    # Check the version alone before hydrating and serializing the row; this
+    # also scopes the todo to its owner
+    validators = store.get_validators(id, owner_id)
+    if validators is None:
+        abort(404)
+    version, revision = validators
+    not_modified = _not_modified(todo_etag(id, version))
+    if not_modified:
+        return not_modified
+    # Another process may have written the todo without invalidating this
+    # cache, so an entry is only used while the row is unchanged
+    cache_key = todo_cache.todo_key(id, g.get('shard'))
+    cached = todo_cache.get(cache_key, version=version, revision=revision)
+    if cached is not None:
+        current_app.logger.info('Returning cached todo %s', id)
+        return _cached_response(cached)
+    epoch = todo_cache.epoch()
+    todo = store.get(id, owner_id)
+    if todo is None:
+        abort(404)
+    current_app.logger.info('Returning todo %s', id)
+    response = jsonify(todo.to_dict())
+    response.set_etag(todo.etag)
+    todo_cache.set(cache_key, _cache_entry(response, version=todo.version, revision=todo.revision), epoch)
+    return response
 
-@app.route('/todos', methods=['POST'])
+@route('/todos', methods=['POST'])
+@idempotent(idempotency_store)
 def add_todo():
-    app.logger.info('POST /todos request received')
     data = request.get_json()
-    if not data:
-        app.logger.warning('No data provided in POST /todos request')
-        return jsonify({"error": "No data provided"}), 400
-    
-    if 'task' not in data:
-        app.logger.warning('Task field missing in POST /todos request')
-        return jsonify({"error": "Task field is required"}), 400
-        
-    if not isinstance(data['task'], str) or not data['task'].strip():
-        app.logger.warning('Invalid task value in POST /todos request')
-        return jsonify({"error": "Task must be a non-empty string"}), 400
-        
-    new_todo = Todo(task=data['task'], completed=data.get('completed', False))
-    db.session.add(new_todo)
-    db.session.commit()
-    app.logger.info(f'Created new todo with id {new_todo.id}')
-    return jsonify(new_todo.to_dict()), 201
-
-@app.route('/todos/<int:id>', methods=['PUT'])
+    error = validate_todo_input(data)
+    if error:
+        current_app.logger.warning('Invalid POST /todos request: %s', error)
+        return jsonify({"error": error}), 400
+
+    owner_id = current_owner()
+    new_todo = run_write(lambda: store.create(data['task'], data.get('completed', False), owner_id).to_dict())
+    current_app.logger.info('Created new todo with id %s', new_todo['id'])
+    change_feed.publish('create', new_todo, owner_id)
+    return jsonify(new_todo), 201
+
+def _get_bulk_items(key):
+    """Return (items, error_response) for the list under key in a bulk request body."""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get(key), list) or not data[key]:
+        return None, (jsonify({"error": f"'{key}' must be a non-empty list"}), 400)
+    max_items = current_app.config['TODOS_BULK_MAX_ITEMS']
+    if len(data[key]) > max_items:
+        return None, (jsonify({"error": f"Batch exceeds the maximum of {max_items} items"}), 413)
+    return data[key], None
+
+def _batch_errors(items, validate):
+    """Validate every item and return a list of per-item errors."""
+    errors = []
+    for index, item in enumerate(items):
+        error = validate(item)
+        if error:
+            errors.append({"index": index, "status": 400, "error": error})
+    return errors
+
+def _bulk_update_item_error(item):
+    if not isinstance(item, dict) or not isinstance(item.get('id'), int) or isinstance(item['id'], bool):
+        return "Each item needs an integer id"
+    return validate_todo_update(item)
+
+@route('/todos/bulk', methods=['POST'])
+@idempotent(idempotency_store)
+def bulk_add_todos():
+    items, error_response = _get_bulk_items('todos')
+    if error_response:
+        return error_response
+    errors = _batch_errors(items, validate_todo_input)
+    if errors:
+        current_app.logger.warning('Rejected POST /todos/bulk batch with %s invalid items', len(errors))
+        return jsonify({"error": "Batch contains invalid items", "results": errors}), 400
+
+    rows = [{'task': item['task'], 'completed': item.get('completed', False)} for item in items]
+    created = store.bulk_create(rows, owner_id=current_owner())
+    current_app.logger.info('Bulk created %s todos', len(created))
+    for todo in created:
+        change_feed.publish('create', todo, current_owner())
+    results = [{"index": index, "status": 201, "todo": todo} for index, todo in enumerate(created)]
+    return jsonify({"results": results}), 201
+
+@route('/todos/bulk', methods=['PATCH'])
+@idempotent(idempotency_store)
+def bulk_update_todos():
+    items, error_response = _get_bulk_items('todos')
+    if error_response:
+        return error_response
+    errors = _batch_errors(items, _bulk_update_item_error)
+    if errors:
+        current_app.logger.warning('Rejected PATCH /todos/bulk batch with %s invalid items', len(errors))
+        return jsonify({"error": "Batch contains invalid items", "results": errors}), 400
+
+    try:
+        todos = store.bulk_update(items, owner_id=current_owner())
+    except ConflictError:
+        current_app.logger.warning('Concurrent update detected in PATCH /todos/bulk')
+        return jsonify({"error": "Todos were modified concurrently, retry the batch"}), 412
+    current_app.logger.info('Bulk updated %s todos', len(todos))
+    for todo in todos.values():
+        change_feed.publish('update', todo, current_owner())
+    results = []
+    for index, item in enumerate(items):
+        if item['id'] in todos:
+            results.append({"index": index, "status": 200, "todo": todos[item['id']]})
+        else:
+            results.append({"index": index, "status": 404, "error": "Todo not found"})
+    return jsonify({"results": results})
+
+@route('/todos/bulk', methods=['DELETE'])
+def bulk_delete_todos():
+    ids, error_response = _get_bulk_items('ids')
+    if error_response:
+        return error_response
+    errors = [
+        {"index": index, "status": 400, "error": "Id must be an integer"}
+        for index, todo_id in enumerate(ids)
+        if not isinstance(todo_id, int) or isinstance(todo_id, bool)
+    ]
+    if errors:
+        return jsonify({"error": "Batch contains invalid items", "results": errors}), 400
+
+    existing = store.bulk_delete(ids, owner_id=current_owner())
+    current_app.logger.info('Bulk deleted %s todos', len(existing))
+    for todo_id in sorted(existing):
+        change_feed.publish('delete', {'id': todo_id}, current_owner())
+    results = [
+        {"index": index, "id": todo_id, "status": 204 if todo_id in existing else 404}
+        for index, todo_id in enumerate(ids)
+    ]
+    return jsonify({"results": results})
+
+@route('/todos/<int:id>', methods=['PUT'])
+@idempotent(idempotency_store)
 def update_todo(id):
-    app.logger.info(f'PUT /todos/{id} request received')
-    todo = Todo.query.get_or_404(id)
-    data = request.get_json()
-    todo.task = data.get('task', todo.task)
-    todo.completed = data.get('completed', todo.completed)
-    db.session.commit()
-    app.logger.info(f'Updated todo {id}')
-    return jsonify(todo.to_dict())
+    # Read the request up front: the write may run on the group commit thread
+    owner_id = current_owner()
+    if_match = request.if_match
+    try:
+        data, body_error = request.get_json(), None
+    except HTTPException as e:
+        # Reported after the 404 and 412 checks, as before
+        data, body_error = None, e
+
+    def write():
+        todo = store.get_for_update(id, owner_id)
+        if todo is None:
+            abort(404)
+        _check_if_match(if_match, todo.etag)
+        if body_error is not None:
+            raise body_error
+        store.update(todo, {
+            'task': data.get('task', todo.task),
+            'completed': data.get('completed', todo.completed),
+        })
+        return todo.to_dict(), todo.etag
 
-@app.route('/todos/<int:id>', methods=['DELETE'])
+    try:
+        todo, etag = run_write(write)
+    except ConflictError as e:
+        current_app.logger.warning('Rejected update of todo %s: %s', id, e)
+        return jsonify({"error": "Todo has been modified"}), 412
+    current_app.logger.info('Updated todo %s', id)
+    change_feed.publish('update', todo, owner_id)
+    response = jsonify(todo)
+    response.set_etag(etag)
+    return response
+
+@route('/todos/<int:id>', methods=['DELETE'])
 def delete_todo(id):
-    app.logger.info(f'DELETE /todos/{id} request received')
-    todo = Todo.query.get_or_404(id)
-    db.session.delete(todo)
-    db.session.commit()
-    app.logger.info(f'Deleted todo {id}')
+    owner_id = current_owner()
+    if_match = request.if_match
+
+    def write():
+        todo = store.get_for_update(id, owner_id)
+        if todo is None:
+            abort(404)
+        _check_if_match(if_match, todo.etag)
+        store.delete(todo)
+
+    try:
+        run_write(write)
+    except ConflictError as e:
+        current_app.logger.warning('Rejected delete of todo %s: %s', id, e)
+        return jsonify({"error": "Todo has been modified"}), 412
+    current_app.logger.info('Deleted todo %s', id)
+    change_feed.publish('delete', {'id': id}, owner_id)
     return '', 204
 
-@app.route('/health', methods=['GET'])
+@route('/todos/archive-completed', methods=['POST'])
+@idempotent(idempotency_store)
+def archive_completed_todos():
+    """Queue moving the completed todos to the archive and return the job to poll."""
+    job = job_queue.enqueue('archive-completed', owner_id=current_owner(), shard=g.get('shard'))
+    current_app.logger.info('Queued job %s to archive completed todos', job['id'])
+    response = jsonify(job)
+    response.status_code = 202
+    response.headers['Location'] = url_for('get_job', id=job['id'])
+    return response
+
+@route('/jobs/<int:id>', methods=['GET'])
+def get_job(id):
+    job = job_queue.get(id, current_owner())
+    if job is None:
+        abort(404)
+    return jsonify(job.to_dict())
+
+def archive_completed_job(job):
+    """Move the owner's completed todos to the archive, one batch per transaction."""
+    batch_size = current_app.config['ARCHIVE_BATCH_SIZE']
+    archived = job.progress  # Moved by an earlier attempt
+    job.report(archived, archived + store.count_completed(job.owner_id))
+    while True:
+        ids = store.archive_completed(job.owner_id, batch_size)
+        if not ids:
+            if archived:
+                # One event for the whole job rather than a delete per todo,
+                # which would overflow the log and flood every stream
+                change_feed.publish('reset', {}, job.owner_id)
+            return {'archived': archived}
+        archived += len(ids)
+        job.report(archived)
+        # Leave the writer free for requests between batches
+        time.sleep(0.01)
+
+@route('/todos/export', methods=['GET'])
+def export_todos():
+    """Stream a snapshot of every todo of the caller (see snapshot.py)."""
+    try:
+        snapshot_format = parse_snapshot_format(request.args.get('format'))
+    except ValueError as e:
+        current_app.logger.warning('Invalid GET /todos/export parameters: %s', e)
+        return jsonify({"error": str(e)}), 400
+    current_app.logger.info('Exporting todos as %s', snapshot_format)
+    batches = store.iter_row_batches(batch_size=current_app.config['SNAPSHOT_BATCH_SIZE'], owner_id=current_owner())
+    response = Response(stream_with_context(write_snapshot(snapshot_format, batches, todo_encoder)),
+                        mimetype=SNAPSHOT_FORMATS[snapshot_format])
+    extension = 'ndjson' if snapshot_format == 'ndjson' else 'todos'
+    response.headers['Content-Disposition'] = f'attachment; filename="todos.{extension}"'
+    return response
+
+@route('/todos/import', methods=['POST'])
+def import_todos():
+    """Add the todos of a snapshot to those of the caller, all or none (see snapshot.py)."""
+    try:
+        snapshot_format = parse_snapshot_format(request.args.get('format'), request.mimetype)
+    except ValueError as e:
+        current_app.logger.warning('Invalid POST /todos/import parameters: %s', e)
+        return jsonify({"error": str(e)}), 400
+    # The body is read batch by batch while the rows are inserted
+    batches = read_snapshot(snapshot_format, request.stream, current_app.config['SNAPSHOT_BATCH_SIZE'])
+    try:
+        imported = store.import_rows(batches, owner_id=current_owner())
+    except SnapshotError as e:
+        current_app.logger.warning('Rejected snapshot import: %s', e)
+        return jsonify({"error": str(e)}), 400
+    current_app.logger.info('Imported %s todos', imported)
+    # One event instead of a delta per imported row: streams reload the list
+    change_feed.publish('reset', {}, current_owner())
+    # The imported todos are indexed for search in the background
+    start_search_backfill(current_app._get_current_object())
+    return jsonify({"imported": imported}), 201
+
+@route('/todos/events', methods=['GET'])
+def todo_events():
+    """Stream todo changes as Server-Sent Events (see change_feed.py)."""
+    feed = change_feed._get_current_object()
+    if not feed.open_stream():
+        current_app.logger.warning('Refused event stream: %s streams open', feed.max_streams)
+        response = jsonify({"error": "Too many open event streams"})
+        response.status_code = 503
+        # A slot frees up at the latest when the oldest stream reaches its time limit
+        response.headers['Retry-After'] = str(max(1, math.ceil(current_app.config['EVENTS_MAX_STREAM_SECONDS'])))
+        return response
+    stream = feed.stream(
+        request.headers.get('Last-Event-ID'),
+        heartbeat=current_app.config['EVENTS_HEARTBEAT_INTERVAL'],
+        retry=current_app.config['EVENTS_RETRY_MS'],
+        owner=current_owner(),
+        max_duration=current_app.config['EVENTS_MAX_STREAM_SECONDS'],
+    )
+    response = Response(stream, mimetype='text/event-stream')
+    response.call_on_close(feed.close_stream)
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies such as nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(todo_cache.stats())
+
+@route('/metrics', methods=['GET'])
+def metrics():
+    if not current_app.config['METRICS_ENABLED']:
+        abort(404)
+    return Response(app_metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+@route('/health', methods=['GET'])
 def health_check():
-    app.logger.debug('Health check request received')
+    current_app.logger.debug('Health check request received')
     try:
         # Try to query the database
-        Todo.query.first()
+        store.ping()
         return jsonify({
             "status": "healthy",
             "database": "connected",
-            "environment": os.environ.get('FLASK_ENV', 'unknown')
+            "environment": os.environ.get('FLASK_ENV', 'unknown'),
+            "storage": store.settings()
         }), 200
     except Exception as e:
-        app.logger.error(f'Health check failed: {str(e)}')
+        current_app.logger.error('Health check failed: %s', e)
         return jsonify({
             "status": "unhealthy",
             "error": str(e),
             "environment": os.environ.get('FLASK_ENV', 'unknown')
         }), 500
 
-def init_db():
+@route('/livez', methods=['GET'])
+def liveness_check():
+    """Answer without any I/O: the process is up and serving requests."""
+    return jsonify({"status": "alive"}), 200
+
+@route('/readyz', methods=['GET'])
+def readiness_check():
+    """Report whether this replica should get traffic, from the cached probe (see readiness.py)."""
+    ready, report = readiness_probe.status()
+    return jsonify(report), 200 if ready else 503
+
+def init_db(app):
     with app.app_context():
         app.logger.info('Initializing database')
-        db.create_all()
+        applied = store.migrate()
+        if applied:
+            app.logger.info('Applied migrations: %s', ", ".join(applied))
         # Add a test todo only in development environment
         if os.environ.get('FLASK_ENV') == 'development' and not Todo.query.first():
-            test_todo = Todo(task="Test todo", completed=False)
-            db.session.add(test_todo)
-            db.session.commit()
+            store.create("Test todo", False)
             app.logger.info('Added test todo in development environment')
 
-if __name__ == '__main__':
-    # Ensure instance path exists
+@click.command('migrate')
+@with_appcontext
+def migrate_command():
+    """Apply pending schema migrations."""
+    applied = store.migrate()
+    print(f'Applied migrations: {", ".join(applied)}' if applied else 'Database is up to date')
+
+@click.command('create-tenant')
+@click.argument('name')
+@with_appcontext
+def create_tenant_command(name):
+    """Create a tenant and print its API key, which is not stored and cannot be shown again."""
+    api_key = generate_api_key()
+    tenant = store.create_tenant(name, hash_api_key(api_key))
+    print(f'Created tenant {tenant.id} ({tenant.name}) on shard {tenant.shard}')
+    print(f'API key: {api_key}')
+
+@click.command('reindex-search')
+@click.option('--full', is_flag=True, help='Re-index every todo, not just the ones never indexed.')
+@with_appcontext
+def reindex_search_command(full):
+    """Build the full-text search index in batches."""
+    batch_size = current_app.config['SEARCH_BACKFILL_BATCH_SIZE']
+    for shard in store.shard_names():
+        store.select_shard(shard)
+        if full:
+            store.reset_search_index()
+        while not store.backfill_search_index(batch_size):
+            pending = store.search_index_pending()
+            print(f'{pending} todos left to index')
+    print('Search index is complete')
+
+@click.command('compact-tombstones')
+@click.option('--days', type=int, default=None, help='Keep tombstones of deletes this recent (default: TOMBSTONE_RETENTION_DAYS).')
+@with_appcontext
+def compact_tombstones_command(days):
+    """Prune tombstones of old deletes; older change tokens then need a full reload."""
+    if days is None:
+        days = current_app.config['TOMBSTONE_RETENTION_DAYS']
+    pruned = 0
+    for shard in store.shard_names():
+        store.select_shard(shard)
+        pruned += store.compact_tombstones(datetime.now(timezone.utc) - timedelta(days=days))
+    print(f'Pruned {pruned} tombstones')
+
+def _select_tenant(tenant_id):
+    """Send the store to the shard of tenant_id and return it as the owner; None is the anonymous list."""
+    if tenant_id is not None:
+        tenant = db.session.get(Tenant, tenant_id)
+        if tenant is None:
+            raise click.BadParameter(f'No tenant with id {tenant_id}', param_hint='--tenant')
+        store.select_shard(store.shard_name(tenant.shard))
+    return tenant_id
+
+@click.command('export-todos')
+@click.argument('file', type=click.File('wb'))
+@click.option('--format', 'snapshot_format', type=click.Choice(list(SNAPSHOT_FORMATS)), default='ndjson', show_default=True)
+@click.option('--tenant', type=int, default=None, help='Id of the tenant whose todos to export (default: the anonymous list).')
+@with_appcontext
+def export_todos_command(file, snapshot_format, tenant):
+    """Write a snapshot of the todos to FILE, - for standard output."""
+    owner_id = _select_tenant(tenant)
+    exported = 0
+
+    def batches():
+        nonlocal exported
+        for rows in store.iter_row_batches(batch_size=current_app.config['SNAPSHOT_BATCH_SIZE'], owner_id=owner_id):
+            exported += len(rows)
+            yield rows
+
+    for chunk in write_snapshot(snapshot_format, batches(), todo_encoder):
+        file.write(chunk)
+    # Standard output may be the snapshot itself
+    click.echo(f'Exported {exported} todos', err=True)
+
+@click.command('import-todos')
+@click.argument('file', type=click.File('rb'))
+@click.option('--format', 'snapshot_format', type=click.Choice(list(SNAPSHOT_FORMATS)), default='ndjson', show_default=True)
+@click.option('--tenant', type=int, default=None, help='Id of the tenant to add the todos to (default: the anonymous list).')
+@with_appcontext
+def import_todos_command(file, snapshot_format, tenant):
+    """Add the todos of the snapshot in FILE, - for standard input, in one transaction."""
+    owner_id = _select_tenant(tenant)
+    batches = read_snapshot(snapshot_format, file, current_app.config['SNAPSHOT_BATCH_SIZE'])
+    try:
+        imported = store.import_rows(batches, owner_id=owner_id)
+    except SnapshotError as e:
+        raise click.ClickException(f'Nothing imported: {e}')
+    print(f'Imported {imported} todos')
+    # A background thread would not outlive the command
+    backfill_search_index(current_app._get_current_object(), pause=0)
+
+CLI_COMMANDS = (migrate_command, create_tenant_command, reindex_search_command, compact_tombstones_command,
+                export_todos_command, import_todos_command)
+
+def backfill_search_index(app, pause=0.05):
+    """Index todos that predate the search index, one short batch at a time.
+
+    The pause between batches leaves the single SQLite writer free for
+    requests while a large table is indexed.
+    """
+    batch_size = app.config['SEARCH_BACKFILL_BATCH_SIZE']
+    with app.app_context():
+        try:
+            for shard in store.shard_names():
+                store.select_shard(shard)
+                while not store.backfill_search_index(batch_size):
+                    time.sleep(pause)
+            app.logger.info('Search index backfill complete')
+        except Exception:
+            app.logger.exception('Search index backfill failed')
+
+def start_search_backfill(app):
+    with app.app_context():
+        pending = 0
+        for shard in store.shard_names():
+            store.select_shard(shard)
+            pending += store.search_index_pending()
+    if pending:
+        app.logger.info('Indexing %s todos for search in the background', pending)
+        threading.Thread(target=backfill_search_index, args=(app,), name='search-backfill', daemon=True).start()
+
+def warm_up(app):
+    """Build the URL map and run each shard's common queries once (see TodoStore.warm_up)."""
+    app.url_map.update()
+    with app.app_context():
+        for shard in store.shard_names():
+            store.select_shard(shard)
+            store.warm_up()
+
+def create_app(config=None):
+    """Return a new application ready to serve, with its database initialized.
+
+    config overrides the settings read from the environment. Logging, CORS,
+    the database engines and the caches are set up here rather than at
+    import time. Used by the production server entry point (wsgi.py), the
+    flask CLI and the development server below.
+    """
+    app = Flask(__name__)
+    app.config.update(default_config())
+    app.config.update(config or {})
+    # Let browsers read the pagination and caching headers
+    CORS(app, expose_headers=['ETag', 'Link', 'Location', 'X-Next-Cursor', 'Retry-After', REQUEST_ID_HEADER,
+                              REPLAYED_HEADER])
+
+    # Logging: JSON lines written by a background thread (see log_pipeline.py)
+    log_pipeline = None
+    if not app.debug:
+        app.logger.removeHandler(default_handler)
+        log_pipeline = setup_logging(app)
+        app.logger.info('Flask app startup')
+    init_request_logging(app)
+
     os.makedirs(app.instance_path, exist_ok=True)
-    
-    # Initialize database
-    init_db()
-    
+    app_store = create_store(app, db)
+    app_metrics = AppMetrics()
+    if app.config['METRICS_ENABLED']:
+        app_metrics.instrument_sqlalchemy(app, db)
+        # Before tenancy, whose checks end rejected requests (401, 429) early
+        app_metrics.init_app(app)
+    init_tenancy(app, app_store)
+    app_cache = create_cache(app.config)
+    app_change_feed = ChangeFeed(app.config['EVENTS_LOG_SIZE'], app.config['EVENTS_MAX_STREAMS'])
+    group_committer = None
+    if app.config['GROUP_COMMIT_WINDOW_MS'] > 0:
+        group_committer = GroupCommitter(
+            app, app_store,
+            window=app.config['GROUP_COMMIT_WINDOW_MS'] / 1000,
+            max_latency=app.config['GROUP_COMMIT_MAX_LATENCY_MS'] / 1000,
+            max_batch=app.config['GROUP_COMMIT_MAX_BATCH'],
+        )
+    probe = ReadinessProbe(app, app_store)
+    app_job_queue = JobQueue(
+        app, app_store,
+        workers=app.config['JOBS_WORKERS'],
+        max_attempts=app.config['JOBS_MAX_ATTEMPTS'],
+        retry_delay=app.config['JOBS_RETRY_DELAY'],
+        poll_interval=app.config['JOBS_POLL_INTERVAL'],
+        stale_after=app.config['JOBS_STALE_AFTER'],
+    )
+    app_job_queue.register('archive-completed', archive_completed_job)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=app_change_feed.restart_after_fork)
+        os.register_at_fork(after_in_child=probe.restart_after_fork)
+        os.register_at_fork(after_in_child=app_job_queue.restart_after_fork)
+        if group_committer is not None:
+            os.register_at_fork(after_in_child=group_committer.restart_after_fork)
+    app.after_request(_add_cache_control)
+    # Registered last so it runs first: the hooks above see the compressed response
+    compressor = init_compression(app) if app.config['COMPRESSION_ENABLED'] else None
+    # Cached responses are invalidated once a transaction that changed todos commits
+    app_store.on_commit(lambda changed, everything, shard: app_cache.invalidate(changed, everything=everything, shard=shard))
+
+    app.extensions[EXTENSION] = {
+        'store': app_store,
+        'todo_cache': app_cache,
+        'todo_encoder': create_encoder(app.config['JSON_ENCODER']),
+        'app_metrics': app_metrics,
+        'change_feed': app_change_feed,
+        'idempotency_store': create_idempotency_store(app.config),
+        'group_committer': group_committer,
+        'log_pipeline': log_pipeline,
+        'compressor': compressor,
+        'readiness_probe': probe,
+        'job_queue': app_job_queue,
+    }
+    for rule, view, options in _routes:
+        app.add_url_rule(rule, view_func=view, **options)
+    for command in CLI_COMMANDS:
+        app.cli.add_command(command)
+
+    init_db(app)
+    if app.config['SEARCH_BACKFILL_ON_STARTUP']:
+        start_search_backfill(app)
+    if app.config['STARTUP_WARM_UP']:
+        warm_up(app)
+    return app
+
+def dispose_engines(app, close=False):
+    """Drop the pooled database connections of this process.
+
+    Production workers call this right after fork with close=False, which
+    discards the connections inherited from the master without closing them
+    underneath it, so no connection is ever shared between processes. On
+    worker exit close=True closes them cleanly.
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=close)
+
+def init_worker(app):
+    """Give a newly forked server worker its own connections, opened before its first request."""
+    dispose_engines(app, close=False)
+    if app.config['STARTUP_WARM_UP']:
+        warm_up(app)
+    if app.config['READINESS_REFRESH_INTERVAL'] > 0:
+        app.extensions[EXTENSION]['readiness_probe'].start()
+    app.extensions[EXTENSION]['job_queue'].start()
+
+def shutdown_worker(app):
+    """Stop the background threads, close the worker's database connections and flush its logs."""
+    app.extensions[EXTENSION]['readiness_probe'].stop()
+    app.extensions[EXTENSION]['job_queue'].stop()
+    app.extensions[EXTENSION]['app_metrics'].uninstrument_sqlalchemy()
+    dispose_engines(app, close=True)
+    log_pipeline = app.extensions[EXTENSION]['log_pipeline']
+    if log_pipeline is not None:
+        log_pipeline.stop()
+
+if __name__ == '__main__':
+    # APP_SERVER selects the server: "development" runs Werkzeug's reloading
+    # debug server, "production" runs the gunicorn worker pool from
+    # gunicorn.conf.py and "asgi" runs the asyncio variant (asgi_app.py) on
+    # uvicorn. The development server is only the default when
+    # FLASK_ENV=development.
+    default_server = 'development' if os.environ.get('FLASK_ENV') == 'development' else 'production'
+    server = os.environ.get('APP_SERVER', default_server)
+
     # Get port from environment or default to 5000
     port = int(os.environ.get('PORT', 5000))
-    
-    app.logger.info(f'Starting Flask app on port {port}')
-    
+
+    if server == 'production':
+        print(f'Starting production server on port {port}')
+        config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py')
+        os.execvp('gunicorn', ['gunicorn', '--config', config_path, 'wsgi:app'])
+    if server == 'asgi':
+        print(f'Starting ASGI server on port {port}')
+        workers = os.environ.get('WEB_CONCURRENCY', '1')
+        os.execvp('uvicorn', ['uvicorn', 'asgi_app:app', '--host', '0.0.0.0', '--port', str(port),
+                              '--workers', workers])
+
+    app = create_app()
+    app.logger.info('Starting Flask development server on port %s', port)
+
     # Run app
     app.run(
         host='0.0.0.0',  # Bind to all interfaces
@@ -0,0 +1,319 @@
+"""ASGI variant of the todo API.
+
+Serves the ``/todos``, ``/todos/{id}``, ``/health`` and ``/livez`` routes of app.py
+with the same contract (openapi.yaml) from Starlette on an asyncio event
+loop, using async database drivers. A slow client holds a coroutine rather
+than a worker thread, so one process can keep thousands of connections
+open. Run it with:
+
+    cd backend
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000 --workers 4
+
+or ``APP_SERVER=asgi python app.py``. Both variants can serve the same
+database at the same time. The bulk, search, changes, events, export,
+import, jobs, cache, metrics and readiness endpoints, Idempotency-Key
+replay, group commit and API keys are only served by app.py; this variant
+serves the anonymous list, and so refuses to start when ``AUTH_REQUIRED``
+is set.
+"""
+import contextlib
+import functools
+import json
+import logging
+import os
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header, parse_etags, quote_etag
+from werkzeug.routing import Map, Rule
+
+from async_storage import AsyncTodoStore
+from models import todo_etag
+from request_parsing import (
+    STREAM_FORMATS, collection_etag, encode_cursor, parse_list_params, parse_stream_format,
+    validate_todo_input,
+)
+from serialization import create_encoder
+from storage import ConflictError
+
+logger = logging.getLogger('asgi_app')
+
+INSTANCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
+
+config = {
+    'DATABASE_URL': os.environ.get('DATABASE_URL', 'sqlite:///todos.db'),
+    'TODOS_MAX_PAGE_SIZE': int(os.environ.get('TODOS_MAX_PAGE_SIZE', 1000)),
+    'TODOS_STREAM_BATCH_SIZE': int(os.environ.get('TODOS_STREAM_BATCH_SIZE', 1000)),
+    'JSON_ENCODER': os.environ.get('JSON_ENCODER', 'auto'),
+    'TODOS_CACHE_CONTROL': os.environ.get('TODOS_CACHE_CONTROL', 'no-cache'),
+    'COMPRESSION_ENABLED': os.environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true',
+    'COMPRESSION_MIN_SIZE': int(os.environ.get('COMPRESSION_MIN_SIZE', 1024)),
+    'COMPRESSION_GZIP_LEVEL': int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6)),
+    'AUTH_REQUIRED': os.environ.get('AUTH_REQUIRED', 'false').lower() == 'true',
+}
+
+store = AsyncTodoStore(config['DATABASE_URL'], INSTANCE_PATH)
+store.install_change_tracking()
+todo_encoder = create_encoder(config['JSON_ENCODER'])
+# Builds the same next-page URLs as Flask's url_for('get_todos', ...)
+_urls = Map([Rule('/todos', endpoint='get_todos')]).bind('')
+
+
+def json_response(data, status=200, headers=None):
+    """Encode data exactly as Flask's jsonify does."""
+    body = json.dumps(data, sort_keys=True, separators=(',', ':')) + '\n'
+    return Response(body, status_code=status, headers=headers, media_type='application/json')
+
+
+def _error(message, status):
+    return json_response({"error": message}, status)
+
+
+def _not_modified(request, etag):
+    """Return a 304 response if the client already holds etag, else None."""
+    if parse_etags(request.headers.get('if-none-match')).contains(etag):
+        return Response(status_code=304, headers={'ETag': quote_etag(etag)})
+    return None
+
+
+def _precondition_failed(request, etag):
+    """Return a 412 response if an If-Match header does not match etag, else None."""
+    if_match = parse_etags(request.headers.get('if-match'))
+    if if_match and not if_match.contains(etag):
+        logger.warning('If-Match precondition failed for %s', request.url.path)
+        return _error("Todo has been modified", 412)
+    return None
+
+
+async def _get_json(request):
+    """Parse a JSON body, failing like Flask's request.get_json()."""
+    if request.headers.get('content-type', '').split(';')[0].strip() != 'application/json':
+        return None, _error("Content-Type must be application/json", 415)
+    try:
+        return json.loads(await request.body()), None
+    except ValueError:
+        return None, _error("Malformed JSON body", 400)
+
+
+def _todo_response(todo, status=200):
+    response = json_response(todo.to_dict(), status)
+    if status == 200:
+        response.headers['ETag'] = quote_etag(todo.etag)
+    return response
+
+
+def _stream_todos(stream_format, params):
+    """Stream todos as NDJSON or as a chunked JSON array, one chunk per batch."""
+    batch_size = config['TODOS_STREAM_BATCH_SIZE']
+    filters = {key: value for key, value in params.items() if key != 'limit'}
+
+    async def generate_ndjson():
+        async for rows in store.iter_row_batches(batch_size=batch_size, **filters):
+            yield todo_encoder.ndjson(rows)
+
+    async def generate_json_array():
+        yield b'['
+        first = True
+        async for rows in store.iter_row_batches(batch_size=batch_size, **filters):
+            yield todo_encoder.array_items(rows, first)
+            first = False
+        yield b']'
+
+    generate = generate_ndjson if stream_format == 'ndjson' else generate_json_array
+    return StreamingResponse(generate(), media_type=STREAM_FORMATS[stream_format])
+
+
+def cacheable(endpoint):
+    """Give the 200 and 304 responses of a todo read the TODOS_CACHE_CONTROL header."""
+    @functools.wraps(endpoint)
+    async def wrapper(request):
+        response = await endpoint(request)
+        if response.status_code in (200, 304):
+            response.headers['Cache-Control'] = config['TODOS_CACHE_CONTROL']
+        return response
+    return wrapper
+
+
+@cacheable
+async def get_todos(request):
+    args = request.query_params
+    try:
+        params = parse_list_params(args)
+        best_accept = parse_accept_header(request.headers.get('accept'), MIMEAccept).best
+        stream_format = parse_stream_format(args, best_accept)
+    except ValueError as e:
+        logger.warning('Invalid GET /todos parameters: %s', e)
+        return _error(str(e), 400)
+
+    if stream_format:
+        return _stream_todos(stream_format, params)
+
+    etag = collection_etag(await store.change_counter())
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+
+    filters = dict(params)
+    limit = filters.pop('limit')
+    headers = {'ETag': quote_etag(etag)}
+    if limit is None and filters['after'] is None:
+        # Unpaginated requests keep returning the whole list for existing clients
+        todos = await store.list_rows(**filters)
+        return Response(todo_encoder.array(todos), headers=headers, media_type='application/json')
+
+    limit = min(limit or config['TODOS_MAX_PAGE_SIZE'], config['TODOS_MAX_PAGE_SIZE'])
+    # Fetch one extra row to find out whether another page follows
+    todos = await store.list_rows(limit=limit + 1, **filters)
+    has_more = len(todos) > limit
+    todos = todos[:limit]
+    if has_more:
+        next_cursor = encode_cursor(params['sort'], todos[-1])
+        query = {key: value for key, value in args.items() if key not in ('after', 'limit')}
+        next_url = _urls.build('get_todos', {**query, 'limit': limit, 'after': next_cursor})
+        headers['X-Next-Cursor'] = next_cursor
+        headers['Link'] = f'<{next_url}>; rel="next"'
+    return Response(todo_encoder.array(todos), headers=headers, media_type='application/json')
+
+
+async def add_todo(request):
+    data, error_response = await _get_json(request)
+    if error_response:
+        return error_response
+    error = validate_todo_input(data)
+    if error:
+        logger.warning('Invalid POST /todos request: %s', error)
+        return _error(error, 400)
+    todo = await store.create(data['task'], data.get('completed', False))
+    return _todo_response(todo, 201)
+
+
+@cacheable
+async def get_todo(request):
+    todo_id = request.path_params['id']
+    if request.headers.get('if-none-match'):
+        # Check the version alone before hydrating and serializing the row
+        version = await store.get_version(todo_id)
+        if version is not None:
+            not_modified = _not_modified(request, todo_etag(todo_id, version))
+            if not_modified:
+                return not_modified
+    todo = await store.get(todo_id)
+    if todo is None:
+        return _error("Todo not found", 404)
+    return _todo_response(todo)
+
+
+async def update_todo(request):
+    todo_id = request.path_params['id']
+    todo = await store.get_for_update(todo_id)
+    if todo is None:
+        return _error("Todo not found", 404)
+    precondition_failed = _precondition_failed(request, todo.etag)
+    if precondition_failed:
+        return precondition_failed
+    data, error_response = await _get_json(request)
+    if error_response:
+        return error_response
+    if not isinstance(data, dict):
+        return _error("Update must be an object", 400)
+    try:
+        await store.update(todo, {
+            'task': data.get('task', todo.task),
+            'completed': data.get('completed', todo.completed),
+        })
+    except ConflictError:
+        logger.warning('Concurrent update of todo %s detected', todo_id)
+        return _error("Todo has been modified", 412)
+    return _todo_response(todo)
+
+
+async def delete_todo(request):
+    todo_id = request.path_params['id']
+    todo = await store.get_for_update(todo_id)
+    if todo is None:
+        return _error("Todo not found", 404)
+    precondition_failed = _precondition_failed(request, todo.etag)
+    if precondition_failed:
+        return precondition_failed
+    try:
+        await store.delete(todo)
+    except ConflictError:
+        logger.warning('Concurrent update of todo %s detected', todo_id)
+        return _error("Todo has been modified", 412)
+    return Response(status_code=204)
+
+
+async def health_check(request):
+    environment = os.environ.get('FLASK_ENV', 'unknown')
+    try:
+        await store.ping()
+        return json_response({
+            "status": "healthy",
+            "database": "connected",
+            "environment": environment,
+            "storage": store.settings(),
+        })
+    except Exception as e:
+        logger.error('Health check failed: %s', e)
+        return json_response({"status": "unhealthy", "error": str(e), "environment": environment}, 500)
+
+
+async def liveness_check(request):
+    return json_response({"status": "alive"})
+
+
+class SessionMiddleware:
+    """Open a database session per request, kept until the response is fully sent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        async with store.scope():
+            await self.app(scope, receive, send)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    if config['AUTH_REQUIRED']:
+        # Serving the anonymous list would bypass the API keys app.py enforces
+        raise RuntimeError('AUTH_REQUIRED is set, but asgi_app.py does not check API keys; '
+                           'serve this database with app.py instead')
+    applied = store.migrate()
+    if applied:
+        logger.info('Applied migrations: %s', ', '.join(applied))
+    yield
+    await store.dispose()
+
+
+middleware = [
+    # Let browsers read the pagination and caching headers
+    Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'],
+               expose_headers=['ETag', 'Link', 'X-Next-Cursor']),
+    Middleware(SessionMiddleware),
+]
+if config['COMPRESSION_ENABLED']:
+    # gzip only, and ETags stay as they are; app.py also serves brotli and tags each encoding
+    middleware.append(Middleware(GZipMiddleware, minimum_size=config['COMPRESSION_MIN_SIZE'],
+                                 compresslevel=config['COMPRESSION_GZIP_LEVEL']))
+
+app = Starlette(
+    routes=[
+        Route('/todos', get_todos, methods=['GET']),
+        Route('/todos', add_todo, methods=['POST']),
+        Route('/todos/{id:int}', get_todo, methods=['GET']),
+        Route('/todos/{id:int}', update_todo, methods=['PUT']),
+        Route('/todos/{id:int}', delete_todo, methods=['DELETE']),
+        Route('/health', health_check, methods=['GET']),
+        Route('/livez', liveness_check, methods=['GET']),
+    ],
+    middleware=middleware,
+    lifespan=lifespan,
+)
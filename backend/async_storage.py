@@ -0,0 +1,199 @@
+"""Todo storage on SQLAlchemy's asyncio extension, for asgi_app.py.
+
+``AsyncTodoStore`` offers the reads and single-todo writes of ``TodoStore``
+as coroutines, over aiosqlite or asyncpg. It reuses TodoStore's query
+builder and change tracking, so both API variants read and write the same
+rows, versions and collection change counter on a shared database.
+
+Each request gets its own session through ``scope()``, the async
+counterpart of Flask-SQLAlchemy's request-scoped session. The ASGI variant
+has no API keys, so it serves the anonymous list of the main database.
+"""
+import contextlib
+import os
+from contextvars import ContextVar
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+import migrations
+import storage_profiles
+from models import Todo, TodoMeta
+from storage import ConflictError, TodoStore, normalize_url
+
+# Async DBAPI driver for each database dialect
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+
+def resolve_url(url, instance_path):
+    """Return url with relative SQLite paths resolved like Flask-SQLAlchemy does."""
+    url = normalize_url(url)
+    path = storage_profiles.sqlite_file_path(url, instance_path)
+    return f'sqlite:///{path}' if path else url
+
+
+def async_url(url):
+    """Return url with the async driver of its dialect."""
+    scheme, _, rest = url.partition('://')
+    dialect = scheme.split('+', 1)[0]
+    if dialect not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver for '{dialect}' databases, expected one of: {', '.join(ASYNC_DRIVERS)}")
+    return f'{ASYNC_DRIVERS[dialect]}://{rest}'
+
+
+class AsyncTodoStore(TodoStore):
+    name = 'async'
+
+    def __init__(self, url, instance_path, environ=os.environ):
+        super().__init__(db=None)
+        self.url = resolve_url(url, instance_path)
+        self.db_file = storage_profiles.sqlite_file_path(self.url, instance_path)
+        self.reader = None
+        if self.db_file:
+            # The same writer and read-only pools as SQLiteTodoStore. aiosqlite
+            # would open a connection per checkout by default.
+            self.profile, self.profile_settings = storage_profiles.load_profile(environ)
+            self.engine = create_async_engine(
+                async_url(self.url), poolclass=AsyncAdaptedQueuePool,
+                **storage_profiles.engine_options(self.profile_settings))
+            storage_profiles.install_pragmas(self.engine.sync_engine, self.profile_settings)
+            reader = storage_profiles.reader_bind(self.db_file, self.profile_settings)
+            self.reader = create_async_engine(
+                async_url(reader.pop('url')), poolclass=AsyncAdaptedQueuePool, **reader)
+            storage_profiles.install_pragmas(self.reader.sync_engine, self.profile_settings, read_only=True)
+        elif self.url.startswith('sqlite'):
+            self.engine = create_async_engine(async_url(self.url))
+        else:
+            self.engine = create_async_engine(
+                async_url(self.url),
+                pool_size=int(environ.get('DB_POOL_SIZE', 10)),
+                max_overflow=int(environ.get('DB_MAX_OVERFLOW', 10)),
+                pool_pre_ping=True,
+                pool_recycle=1800,
+            )
+        # A Session subclass per store so the tracking events stay local to it
+        self._session_class = type('TrackedSession', (Session,), {})
+        # Attributes must stay readable after commit: async sessions cannot lazy-load
+        self._sessions = async_sessionmaker(
+            self.engine, sync_session_class=self._session_class, expire_on_commit=False)
+        self._current = ContextVar('todo_session')
+
+    @property
+    def session(self):
+        return self._current.get()
+
+    @contextlib.asynccontextmanager
+    async def scope(self):
+        """Give the enclosed request its own session and close it afterwards."""
+        session = self._sessions()
+        token = self._current.set(session)
+        try:
+            yield session
+        finally:
+            self._current.reset(token)
+            await session.close()
+
+    def settings(self):
+        if not self.db_file:
+            return {"dialect": self.engine.dialect.name}
+        return {
+            "dialect": "sqlite",
+            "profile": self.profile,
+            "pragmas": {name: self.profile_settings[name] for name in storage_profiles.PRAGMAS},
+            "writer_pool_size": self.profile_settings['writer_pool_size'],
+            "read_pool_size": self.profile_settings['read_pool_size'],
+        }
+
+    def read_bind(self):
+        return {'bind': self.reader.sync_engine} if self.reader is not None else None
+
+    def migrate(self):
+        """Apply pending migrations through a short-lived sync engine."""
+        engine = create_engine(self.url)
+        try:
+            return migrations.upgrade(engine)
+        finally:
+            engine.dispose()
+
+    async def dispose(self):
+        await self.engine.dispose()
+        if self.reader is not None:
+            await self.reader.dispose()
+
+    # Reads
+
+    async def ping(self):
+        await self.session.execute(select(Todo.id).limit(1), bind_arguments=self.read_bind())
+
+    async def change_counter(self):
+        return (await self.session.execute(
+            select(TodoMeta.change_counter).where(TodoMeta.id == 1), bind_arguments=self.read_bind()
+        )).scalar() or 0
+
+    async def get(self, todo_id, owner_id=None):
+        # AsyncSession.get() takes no bind_arguments, so select the row instead
+        return (await self.session.execute(
+            select(Todo).where(Todo.id == todo_id, Todo.owner_id == owner_id), bind_arguments=self.read_bind()
+        )).scalar()
+
+    async def get_for_update(self, todo_id, owner_id=None):
+        todo = await self.session.get(Todo, todo_id)
+        return todo if todo is not None and todo.owner_id == owner_id else None
+
+    async def get_version(self, todo_id, owner_id=None):
+        return (await self.session.execute(
+            select(Todo.version).where(Todo.id == todo_id, Todo.owner_id == owner_id),
+            bind_arguments=self.read_bind(),
+        )).scalar()
+
+    async def list_rows(self, after=None, limit=None, **filters):
+        query = self.build_list_query(Todo.id, Todo.task, Todo.completed, after=after, limit=limit, **filters)
+        return (await self.session.execute(query, bind_arguments=self.read_bind())).all()
+
+    async def iter_row_batches(self, after=None, batch_size=1000, **filters):
+        query = self.build_list_query(Todo.id, Todo.task, Todo.completed, after=after, **filters)
+        result = await self.session.stream(
+            query.execution_options(yield_per=batch_size), bind_arguments=self.read_bind())
+        async for rows in result.partitions():
+            yield rows
+
+    # Writes
+
+    async def create(self, task, completed=False, owner_id=None):
+        todo = Todo(task=task, completed=completed, owner_id=owner_id)
+        self.session.add(todo)
+        await self.session.commit()
+        return todo
+
+    async def update(self, todo, changes):
+        for key, value in changes.items():
+            setattr(todo, key, value)
+        await self._commit()
+        return todo
+
+    async def delete(self, todo):
+        await self.session.delete(todo)
+        await self._commit()
+
+    async def _commit(self):
+        try:
+            await self.session.commit()
+        except StaleDataError:
+            # Another transaction updated the row after it was loaded
+            await self.session.rollback()
+            raise ConflictError()
+
+    def install_change_tracking(self):
+        """Run TodoStore's change tracking on the sync sessions behind the async ones."""
+        session_class = self._session_class
+        event.listen(session_class, 'before_flush', self._track_pending_flush)
+        event.listen(session_class, 'after_flush', self._track_flush)
+        event.listen(session_class, 'do_orm_execute', self._track_bulk_statement)
+        event.listen(session_class, 'after_commit', self._notify_commit)
+        event.listen(session_class, 'after_rollback', self._discard_changes)
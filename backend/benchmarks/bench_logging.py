@@ -0,0 +1,95 @@
+"""Measure what a log call costs the thread that makes it.
+
+Compares the previous setup (f-string messages written synchronously to a
+RotatingFileHandler capped at 10 KiB and to a stream) with the queue based
+pipeline in log_pipeline.py, from inside a request context as in a handler.
+
+    cd backend
+    python benchmarks/bench_logging.py [--calls 20000]
+"""
+import argparse
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask, g  # noqa: E402
+
+from log_pipeline import JsonFormatter, LogPipeline  # noqa: E402
+
+
+def _time_calls(logger, calls, lazy):
+    todo_id = 42
+    start = time.perf_counter()
+    for _ in range(calls):
+        if lazy:
+            logger.info('Returning todo %s', todo_id)
+        else:
+            logger.info(f'Returning todo {todo_id}')
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def _logger(name, handlers):
+    logger = logging.getLogger(name)
+    logger.handlers = list(handlers)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger
+
+
+def bench_sync(log_dir, calls):
+    file_handler = RotatingFileHandler(os.path.join(log_dir, 'sync.log'), maxBytes=10240, backupCount=10)
+    stream_handler = logging.StreamHandler(io.StringIO())
+    formatter = logging.Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+    logger = _logger('bench.sync', [file_handler, stream_handler])
+    micros = _time_calls(logger, calls, lazy=False)
+    file_handler.close()
+    return micros, micros
+
+
+def bench_async(log_dir, calls):
+    file_handler = RotatingFileHandler(os.path.join(log_dir, 'async.log'), maxBytes=50 * 1024 * 1024, backupCount=5)
+    stream_handler = logging.StreamHandler(io.StringIO())
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(JsonFormatter())
+    pipeline = LogPipeline([file_handler, stream_handler], queue_size=calls + 1)
+    pipeline.start()
+    logger = _logger('bench.async', [pipeline.handler])
+    start = time.perf_counter()
+    micros = _time_calls(logger, calls, lazy=True)
+    # Include draining the queue to show the writer keeps up
+    pipeline.stop()
+    total = (time.perf_counter() - start) / calls * 1e6
+    file_handler.close()
+    return micros, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=20000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    with tempfile.TemporaryDirectory() as log_dir, app.test_request_context('/todos/42'):
+        g.request_id = 'bench'
+        g.log_sampled = True
+        results = {
+            'synchronous file + stream': bench_sync(log_dir, args.calls),
+            'queue pipeline': bench_async(log_dir, args.calls),
+        }
+
+    print(f'{args.calls} log calls')
+    print(f"{'setup':<28}{'caller us/call':>16}{'incl. writer':>16}")
+    for name, (caller, total) in results.items():
+        print(f'{name:<28}{caller:>16.2f}{total:>16.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Compare ways of producing the GET /todos response body.
+
+* orm + jsonify: the previous path, hydrating Todo objects and encoding
+  to_dict() dicts with Flask's default JSON provider.
+* rows + <encoder>: column tuples encoded by serialization.py.
+
+Each variant queries and encodes the same page of todos from a throwaway
+SQLite database, and the script checks the bodies are byte-identical.
+
+    cd backend
+    python benchmarks/bench_serialization.py [--rows 1000 10000] [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+_tmp = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp, 'bench.db')}"
+os.environ.setdefault('DB_PROFILE', 'testing')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('METRICS_ENABLED', 'false')
+
+from flask import jsonify  # noqa: E402
+from sqlalchemy import insert, select  # noqa: E402
+
+from app import create_app, db, store  # noqa: E402
+from models import Todo  # noqa: E402
+from serialization import ENCODERS, create_encoder  # noqa: E402
+
+
+def _best_of(repeat, fn):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--non-ascii-every', type=int, default=0,
+                        help='make every Nth task non-ASCII, which orjson pages fall back on')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.session.execute(insert(Todo), [
+            {'task': f'Task number {n} café' if args.non_ascii_every and n % args.non_ascii_every == 0
+             else f'Task number {n}', 'completed': n % 3 == 0}
+            for n in range(max(args.rows))
+        ])
+        db.session.commit()
+
+        print(f"{'rows':>8}  {'variant':<20}{'ms':>10}{'speedup':>10}")
+        for rows in args.rows:
+            def orm_jsonify():
+                todos = db.session.scalars(select(Todo).order_by(Todo.id).limit(rows)).all()
+                body = jsonify([todo.to_dict() for todo in todos]).get_data()
+                db.session.expunge_all()
+                return body
+
+            baseline, expected = _best_of(args.repeat, orm_jsonify)
+            print(f'{rows:>8}  {"orm + jsonify":<20}{baseline * 1000:>10.2f}{1:>10.2f}')
+            for name in ENCODERS:
+                encoder = create_encoder(name)
+                elapsed, body = _best_of(args.repeat, lambda: encoder.array(store.list_rows(limit=rows)))
+                assert body == expected, f'{name} output differs from jsonify'
+                print(f'{rows:>8}  {"rows + " + name:<20}{elapsed * 1000:>10.2f}{baseline / elapsed:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
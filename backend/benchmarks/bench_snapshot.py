@@ -0,0 +1,65 @@
+"""Time a snapshot round trip: export a large todo list, then import it back.
+
+Fills a throwaway SQLite database with --rows todos, then for each format
+exports them to memory the way GET /todos/export does and imports the
+snapshot into a tenant the way POST /todos/import does, in one transaction.
+The search index backfill that follows an import is timed on its own.
+
+    cd backend
+    python benchmarks/bench_snapshot.py [--rows 1000000] [--formats ndjson columnar]
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+_tmp = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp, 'bench.db')}"
+os.environ.setdefault('DB_PROFILE', 'testing')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('METRICS_ENABLED', 'false')
+
+from app import backfill_search_index, create_app, store  # noqa: E402
+from snapshot import FORMATS, read_snapshot, write_snapshot  # noqa: E402
+
+
+def _generated(rows, batch_size):
+    for start in range(0, rows, batch_size):
+        yield [(f'Task number {n}', n % 3 == 0) for n in range(start, min(start + batch_size, rows))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--formats', nargs='+', choices=list(FORMATS), default=list(FORMATS))
+    args = parser.parse_args()
+
+    app = create_app({'SEARCH_BACKFILL_ON_STARTUP': False, 'STARTUP_WARM_UP': False})
+    batch_size = app.config['SNAPSHOT_BATCH_SIZE']
+    encoder = app.extensions['todo_api']['todo_encoder']
+    with app.app_context():
+        store.import_rows(_generated(args.rows, batch_size))
+        backfill_search_index(app, pause=0)
+
+        print(f"{'format':<10}{'MB':>8}{'export s':>10}{'import s':>10}{'index s':>10}{'import rows/s':>15}")
+        for owner_id, snapshot_format in enumerate(args.formats, 1):
+            started = time.perf_counter()
+            data = b''.join(write_snapshot(snapshot_format, store.iter_row_batches(batch_size=batch_size), encoder))
+            exported = time.perf_counter() - started
+
+            started = time.perf_counter()
+            imported = store.import_rows(read_snapshot(snapshot_format, io.BytesIO(data), batch_size), owner_id)
+            elapsed = time.perf_counter() - started
+            assert imported == args.rows
+            started = time.perf_counter()
+            backfill_search_index(app, pause=0)
+            indexed = time.perf_counter() - started
+            print(f'{snapshot_format:<10}{len(data) / 1e6:>8.1f}{exported:>10.2f}{elapsed:>10.2f}{indexed:>10.2f}'
+                  f'{args.rows / elapsed:>15,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Measure startup: cold import, create_app() and a new worker's first requests.
+
+Each run is a fresh interpreter on a throwaway SQLite database. It imports
+app, calls create_app() as the gunicorn master does with preload_app, then
+forks a worker that runs the post_worker_init hook and times its first
+requests, one of each kind, followed by a second GET /todos for reference.
+Runs with STARTUP_WARM_UP off and on show what the warm-up moves off the
+first requests.
+
+    cd backend
+    python benchmarks/bench_startup.py [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+STEPS = ['import app', 'create_app()', 'worker init', 'GET /todos', 'POST /todos', 'GET /todos/<id>',
+         'PUT /todos/<id>', 'GET /todos again']
+
+
+def _elapsed_ms(started):
+    return (time.perf_counter() - started) * 1000
+
+
+def _first_requests(app_module, app):
+    """Run in the worker: the post_worker_init hook, then one request of each kind."""
+    timings = {}
+    started = time.perf_counter()
+    app_module.init_worker(app)
+    timings['worker init'] = _elapsed_ms(started)
+    client = app.test_client()
+    todo_id = None
+    for step in STEPS[3:]:
+        started = time.perf_counter()
+        if step == 'POST /todos':
+            todo_id = client.post('/todos', json={'task': 'First'}).json['id']
+        elif step == 'GET /todos/<id>':
+            client.get(f'/todos/{todo_id}')
+        elif step == 'PUT /todos/<id>':
+            client.put(f'/todos/{todo_id}', json={'completed': True})
+        else:
+            client.get('/todos')
+        timings[step] = _elapsed_ms(started)
+    return timings
+
+
+def child():
+    """One run, in a fresh interpreter; prints its timings as JSON."""
+    sys.path.insert(0, BACKEND_DIR)
+    started = time.perf_counter()
+    import app as app_module
+    timings = {'import app': _elapsed_ms(started)}
+    started = time.perf_counter()
+    app = app_module.create_app()
+    timings['create_app()'] = _elapsed_ms(started)
+
+    if not hasattr(os, 'fork'):
+        timings.update(_first_requests(app_module, app))
+    else:
+        # Like gunicorn with preload_app, the worker forks from the initialized master
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            with os.fdopen(write_fd, 'w') as pipe:
+                json.dump(_first_requests(app_module, app), pipe)
+            os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as pipe:
+            timings.update(json.load(pipe))
+        os.waitpid(pid, 0)
+    print(json.dumps(timings))
+
+
+def run(warm_up):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+            STARTUP_WARM_UP='true' if warm_up else 'false',
+            LOG_LEVEL='WARNING',
+        )
+        env.setdefault('DB_PROFILE', 'testing')
+        result = subprocess.run([sys.executable, __file__, '--child'], cwd=tmp, env=env,
+                                capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return
+
+    variants = {'no warm-up': False, 'warm-up': True}
+    medians = {}
+    for name, warm_up in variants.items():
+        runs = [run(warm_up) for _ in range(args.runs)]
+        medians[name] = {step: statistics.median(timings[step] for timings in runs) for step in STEPS}
+
+    print(f'median of {args.runs} runs, ms')
+    print(f"{'step':<20}" + ''.join(f'{name:>14}' for name in variants))
+    for step in STEPS:
+        print(f'{step:<20}' + ''.join(f'{medians[name][step]:>14.2f}' for name in variants))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,373 @@
+"""Load-testing suite for a running API server.
+
+Three subcommands:
+
+    seed     Fill the server with a dataset of N todos through POST /todos/bulk.
+    run      Drive a weighted mix of reads and writes from concurrent client
+             threads for a fixed time, then report requests per second and
+             p50/p95/p99 latency per operation. ``--output`` saves the report
+             as JSON.
+    compare  Compare two saved reports and exit non-zero when the second one
+             regressed beyond the given thresholds, for use as a build gate.
+
+Example, against a server started with ``python app.py``:
+
+    cd backend
+    python benchmarks/loadtest.py seed --todos 100000
+    python benchmarks/loadtest.py run --duration 30 --concurrency 16 --output current.json
+    python benchmarks/loadtest.py compare baseline.json current.json --max-latency-regression 0.15
+
+The client uses keep-alive ``http.client`` connections, one per thread, and
+no third-party packages.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import quote, urlsplit
+
+VERBS = ('Buy', 'Call', 'Write', 'Review', 'Fix', 'Plan', 'Clean', 'Book', 'Send', 'Read')
+NOUNS = ('milk', 'report', 'invoice', 'dentist', 'garden', 'budget', 'tickets', 'email', 'car', 'slides')
+
+OPERATIONS = ('list_page', 'get_todo', 'filter_completed', 'search', 'create', 'update', 'delete')
+
+# Operation weights of the built-in workload mixes
+MIXES = {
+    'read-heavy': {'list_page': 35, 'get_todo': 40, 'filter_completed': 10, 'search': 10, 'create': 3, 'update': 2},
+    'mixed': {'list_page': 25, 'get_todo': 25, 'filter_completed': 5, 'search': 5, 'create': 20, 'update': 15, 'delete': 5},
+    'write-heavy': {'list_page': 10, 'get_todo': 10, 'create': 40, 'update': 30, 'delete': 10},
+}
+
+PERCENTILES = (50, 95, 99)
+
+
+def task_text(n):
+    return f'{VERBS[n % len(VERBS)]} {NOUNS[(n // len(VERBS)) % len(NOUNS)]} {n}'
+
+
+def parse_mix(value):
+    """Return operation weights from a mix name or 'op=weight,...'."""
+    if value in MIXES:
+        return dict(MIXES[value])
+    mix = {}
+    for item in value.split(','):
+        operation, _, weight = item.partition('=')
+        if operation.strip() not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{operation.strip()}', expected one of: {', '.join(OPERATIONS)}")
+        mix[operation.strip()] = float(weight)
+    return mix
+
+
+def percentile(sorted_values, p):
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def summarize(latencies, errors, elapsed):
+    """Summary statistics of one operation; latencies are in seconds."""
+    latencies = sorted(latencies)
+    summary = {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else None,
+    }
+    for p in PERCENTILES:
+        value = percentile(latencies, p)
+        summary[f'p{p}_ms'] = round(value * 1000, 3) if value is not None else None
+    return summary
+
+
+class Client:
+    """A keep-alive connection to the server, used by one thread."""
+
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.hostname, parts.port, timeout=timeout)
+        self.prefix = parts.path.rstrip('/')
+
+    def request(self, method, path, body=None):
+        headers = {'Accept': 'application/json'}
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        try:
+            self.connection.request(method, self.prefix + path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            # Reconnect on the next request
+            self.connection.close()
+            raise
+        return response.status, data
+
+    def close(self):
+        self.connection.close()
+
+
+class Workload:
+    """Picks operations by weight and turns them into requests."""
+
+    def __init__(self, mix, min_id, max_id, page_size=50):
+        self.operations = list(mix)
+        self.weights = [mix[operation] for operation in self.operations]
+        self.min_id = min_id
+        self.max_id = max_id
+        self.page_size = page_size
+
+    def random_id(self, rng):
+        return rng.randint(self.min_id, self.max_id) if self.max_id >= self.min_id else 1
+
+    def next_request(self, rng, created):
+        """Return (operation, method, path, body, accepted statuses)."""
+        operation = rng.choices(self.operations, self.weights)[0]
+        if operation == 'list_page':
+            after = self.random_id(rng)
+            return operation, 'GET', f'/todos?limit={self.page_size}&after={after}', None, (200,)
+        if operation == 'get_todo':
+            return operation, 'GET', f'/todos/{self.random_id(rng)}', None, (200, 404)
+        if operation == 'filter_completed':
+            return operation, 'GET', f'/todos?completed=true&limit={self.page_size}', None, (200,)
+        if operation == 'search':
+            term = rng.choice(NOUNS)
+            return operation, 'GET', f'/todos/search?q={quote(term)}&limit=20', None, (200,)
+        if operation == 'create':
+            return operation, 'POST', '/todos', {'task': task_text(rng.randrange(10 ** 9))}, (201,)
+        if operation == 'update':
+            body = {'completed': rng.random() < 0.5}
+            return operation, 'PUT', f'/todos/{self.random_id(rng)}', body, (200, 404, 412)
+        if operation == 'delete':
+            # Only delete todos this client created, so the dataset keeps its size
+            if created:
+                return operation, 'DELETE', f'/todos/{created.pop()}', None, (204, 404)
+            return 'create', 'POST', '/todos', {'task': task_text(rng.randrange(10 ** 9))}, (201,)
+        raise ValueError(operation)
+
+
+def _id_range(client):
+    status, body = client.request('GET', '/todos?limit=1')
+    first = json.loads(body) if status == 200 else []
+    status, body = client.request('GET', '/todos?limit=1&sort=id&order=desc')
+    last = json.loads(body) if status == 200 else []
+    if not first or not last:
+        return 1, 0
+    return first[0]['id'], last[0]['id']
+
+
+def _count_todos(client):
+    """Count todos by streaming the whole list as NDJSON."""
+    status, body = client.request('GET', '/todos?stream=ndjson')
+    if status != 200:
+        raise RuntimeError(f'Could not list todos: HTTP {status}')
+    return body.count(b'\n')
+
+
+def seed(base_url, todos, batch_size=1000, concurrency=4, completed_ratio=0.3, seed_value=0):
+    """Bring the server up to at least `todos` todos; return how many were added."""
+    client = Client(base_url)
+    existing = _count_todos(client)
+    client.close()
+    end = max(todos, existing)
+    local = threading.local()
+
+    def post(start):
+        # Each batch has its own generator so the dataset does not depend on thread scheduling
+        rng = random.Random(seed_value * 10 ** 9 + start)
+        batch = [
+            {'task': task_text(n), 'completed': rng.random() < completed_ratio}
+            for n in range(start, min(start + batch_size, end))
+        ]
+        if not hasattr(local, 'client'):
+            local.client = Client(base_url)
+        status, body = local.client.request('POST', '/todos/bulk', {'todos': batch})
+        if status != 201:
+            raise RuntimeError(f'Seeding failed with HTTP {status}: {body[:200]!r}')
+        return len(batch)
+
+    added = 0
+    starts = range(existing, end, batch_size)
+    # Submit a few batches at a time so millions of todos are never all in memory
+    window = concurrency * 4
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for offset in range(0, len(starts), window):
+            added += sum(pool.map(post, starts[offset:offset + window]))
+            print(f'  seeded {existing + added}/{end}', file=sys.stderr)
+    return added
+
+
+def run(base_url, mix, duration=30.0, concurrency=16, warmup=2.0, seed_value=0):
+    """Drive the workload and return the report as a dict."""
+    client = Client(base_url)
+    min_id, max_id = _id_range(client)
+    client.close()
+    workload = Workload(mix, min_id, max_id)
+    start_at = time.perf_counter() + warmup
+    stop_at = start_at + duration
+
+    def worker(index):
+        rng = random.Random(seed_value * 1000 + index)
+        client = Client(base_url)
+        latencies, errors, created = {}, {}, []
+        try:
+            while True:
+                operation, method, path, body, accepted = workload.next_request(rng, created)
+                started = time.perf_counter()
+                if started >= stop_at:
+                    break
+                try:
+                    status, data = client.request(method, path, body)
+                except (OSError, http.client.HTTPException):
+                    status, data = None, b''
+                finished = time.perf_counter()
+                if status == 201 and operation == 'create':
+                    created.append(json.loads(data)['id'])
+                if started < start_at:
+                    continue  # Warm-up requests are not measured
+                if status in accepted:
+                    latencies.setdefault(operation, []).append(finished - started)
+                else:
+                    errors[operation] = errors.get(operation, 0) + 1
+        finally:
+            client.close()
+        return latencies, errors
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, range(concurrency)))
+
+    latencies, errors = {}, {}
+    for worker_latencies, worker_errors in results:
+        for operation, values in worker_latencies.items():
+            latencies.setdefault(operation, []).extend(values)
+        for operation, count in worker_errors.items():
+            errors[operation] = errors.get(operation, 0) + count
+
+    operations = {
+        operation: summarize(latencies.get(operation, []), errors.get(operation, 0), duration)
+        for operation in sorted(set(latencies) | set(errors))
+    }
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'base_url': base_url,
+            'id_range': [min_id, max_id],
+            'mix': mix,
+            'duration_s': duration,
+            'warmup_s': warmup,
+            'concurrency': concurrency,
+            'python': platform.python_version(),
+            'host': platform.node(),
+            'commit': os.environ.get('GITHUB_SHA') or os.environ.get('BENCH_COMMIT'),
+        },
+        'overall': summarize(all_latencies, sum(errors.values()), duration),
+        'operations': operations,
+    }
+
+
+def compare(baseline, current, max_latency_regression=0.10, max_throughput_regression=0.10,
+            metric='p95_ms', max_error_rate=0.01):
+    """Return a list of regressions of current against baseline (empty when it passes).
+
+    Latency regressions compare `metric` per operation; throughput compares
+    requests per second overall.
+    """
+    failures = []
+    for operation, stats in current['operations'].items():
+        base = baseline['operations'].get(operation)
+        if not base or not base.get(metric) or stats.get(metric) is None:
+            continue
+        change = stats[metric] / base[metric] - 1
+        if change > max_latency_regression:
+            failures.append(f'{operation}: {metric} {base[metric]} -> {stats[metric]} (+{change:.0%})')
+    base_rps, rps = baseline['overall']['rps'], current['overall']['rps']
+    if base_rps and rps / base_rps - 1 < -max_throughput_regression:
+        failures.append(f'overall: rps {base_rps} -> {rps} ({rps / base_rps - 1:.0%})')
+    total = current['overall']['requests'] + current['overall']['errors']
+    if total and current['overall']['errors'] / total > max_error_rate:
+        failures.append(f"overall: {current['overall']['errors']} errors in {total} requests")
+    return failures
+
+
+def print_report(report, file=sys.stdout):
+    columns = ('requests', 'errors', 'rps', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms')
+    print(f"{'operation':<18}" + ''.join(f'{column:>11}' for column in columns), file=file)
+    rows = list(report['operations'].items()) + [('overall', report['overall'])]
+    for operation, stats in rows:
+        cells = ''.join(f"{'-' if stats[column] is None else stats[column]:>11}" for column in columns)
+        print(f'{operation:<18}{cells}', file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    default_url = os.environ.get('API_URL', 'http://127.0.0.1:5000')
+
+    seed_parser = commands.add_parser('seed', help='create the dataset')
+    seed_parser.add_argument('--url', default=default_url)
+    seed_parser.add_argument('--todos', type=int, default=10000, help='dataset size, e.g. 1000 to 10000000')
+    seed_parser.add_argument('--batch-size', type=int, default=1000, help='todos per bulk request')
+    seed_parser.add_argument('--concurrency', type=int, default=4)
+    seed_parser.add_argument('--seed', type=int, default=0)
+
+    run_parser = commands.add_parser('run', help='run a workload and report latencies')
+    run_parser.add_argument('--url', default=default_url)
+    run_parser.add_argument('--mix', default='read-heavy',
+                            help=f"{', '.join(MIXES)} or op=weight,... with ops {', '.join(OPERATIONS)}")
+    run_parser.add_argument('--duration', type=float, default=30.0, help='measured seconds')
+    run_parser.add_argument('--warmup', type=float, default=2.0, help='unmeasured seconds before measuring')
+    run_parser.add_argument('--concurrency', type=int, default=16, help='client threads')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--output', help='write the report as JSON to this file')
+
+    compare_parser = commands.add_parser('compare', help='fail when a report regressed against a baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--metric', default='p95_ms', choices=[f'p{p}_ms' for p in PERCENTILES] + ['mean_ms'])
+    compare_parser.add_argument('--max-latency-regression', type=float, default=0.10,
+                                help='allowed relative latency increase per operation')
+    compare_parser.add_argument('--max-throughput-regression', type=float, default=0.10,
+                                help='allowed relative drop in overall requests per second')
+    compare_parser.add_argument('--max-error-rate', type=float, default=0.01)
+
+    args = parser.parse_args(argv)
+    if args.command == 'seed':
+        started = time.perf_counter()
+        added = seed(args.url, args.todos, args.batch_size, args.concurrency, seed_value=args.seed)
+        print(f'Added {added} todos in {time.perf_counter() - started:.1f}s')
+        return 0
+    if args.command == 'run':
+        report = run(args.url, parse_mix(args.mix), args.duration, args.concurrency, args.warmup, args.seed)
+        print_report(report)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2)
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    failures = compare(baseline, current, args.max_latency_regression, args.max_throughput_regression,
+                       args.metric, args.max_error_rate)
+    for failure in failures:
+        print(f'REGRESSION {failure}')
+    if not failures:
+        print('No regressions')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
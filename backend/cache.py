@@ -0,0 +1,292 @@
+"""Read-through cache for todo responses.
+
+Cached values are the serialized response bodies of the todo read endpoints.
+``TodoCache`` owns the keyspace and the invalidation rules and delegates
+storage to a backend: the in-process ``LRUCache`` by default, or
+``RedisCache`` when several workers need to share one cache.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with TTL and size-based eviction.
+
+    Entries are evicted least-recently-used first once either ``max_entries``
+    or ``max_bytes`` is exceeded. Counters live outside the LRU so they are
+    never evicted.
+    """
+
+    name = 'memory'
+
+    def __init__(self, max_entries=10000, max_bytes=64 * 1024 * 1024, ttl=30, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, size, expires_at = entry
+            if expires_at <= self._clock():
+                self._remove(key)
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        size = len(value['body'])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._store(key, value, size, ttl)
+
+    def add(self, key, value, ttl=None):
+        """Set key only if it holds no live entry; return whether it was set."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] > self._clock():
+                return False
+            self._store(key, value, len(value['body']), ttl)
+            return True
+
+    def _store(self, key, value, size, ttl):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, size, self._clock() + (ttl or self.ttl))
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+
+    def counter(self, key):
+        return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+            self._bytes = 0
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+
+class RedisCache:
+    """Cache backend on a Redis-compatible client shared by all workers.
+
+    Any object with ``get``, ``set(key, value, ex=...)``, ``delete``, ``incr``
+    and ``scan_iter`` works, so tests can pass a local stand-in.
+    """
+
+    name = 'redis'
+
+    def __init__(self, client, ttl=30, prefix='todo-api:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package")
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, json.dumps(value), ex=ttl or self.ttl)
+
+    def add(self, key, value, ttl=None):
+        return bool(self.client.set(self.prefix + key, json.dumps(value), ex=ttl or self.ttl, nx=True))
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+    def counter(self, key):
+        return int(self.client.get(self.prefix + key) or 0)
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self):
+        # Redis evicts on its own; its INFO stats are the source of truth
+        return {}
+
+
+class TodoCache:
+    """Keyspace and invalidation rules for cached todo responses.
+
+    Single todos are keyed by shard and id and deleted individually when
+    they change. List responses are keyed by a generation number that every
+    write bumps, so all cached pages go stale at once without enumerating
+    them.
+
+    Invalidation only sees the commits of this process, so callers also
+    validate entries against the database: list keys include the collection
+    change counter, and ``get`` takes the values a single todo entry must
+    still hold, such as its version.
+
+    Readers snapshot ``epoch()`` before querying the database and pass it to
+    ``set``; the entry is only stored if no invalidation ran in between, so
+    a read that raced a commit can never repopulate the cache with old data.
+    The epoch is a counter of the backend, shared by every worker on Redis.
+    """
+
+    LIST_GENERATION = 'todos:list-generation'
+    ITEM_GENERATION = 'todos:item-generation'
+    EPOCH = 'todos:epoch'
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def todo_key(self, todo_id, shard=None):
+        # Ids are only unique within one database file
+        scope = f'{shard}:' if shard else ''
+        return f'todo:{self.backend.counter(self.ITEM_GENERATION)}:{scope}{todo_id}'
+
+    def list_key(self, query):
+        return f'todos:{self.backend.counter(self.LIST_GENERATION)}:{query}'
+
+    def epoch(self):
+        return self.backend.counter(self.EPOCH)
+
+    def get(self, key, **expected):
+        """Return the entry under key, unless it is missing or differs from expected."""
+        value = self.backend.get(key)
+        if value is None or any(value.get(name) != expected[name] for name in expected):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def set(self, key, value, epoch):
+        with self._lock:
+            if epoch == self.epoch():
+                self.backend.set(key, value)
+
+    def invalidate(self, todo_ids=(), everything=False, shard=None):
+        """Drop cached entries after a commit that touched todo_ids in shard.
+
+        ``everything`` is used when the changed ids are unknown, such as after
+        a bulk statement with a WHERE clause.
+        """
+        with self._lock:
+            self.backend.incr(self.EPOCH)
+            if everything:
+                self.backend.incr(self.ITEM_GENERATION)
+            elif todo_ids:
+                self.backend.delete(*(self.todo_key(todo_id, shard) for todo_id in todo_ids))
+            self.backend.incr(self.LIST_GENERATION)
+
+    def clear(self):
+        with self._lock:
+            self.backend.clear()
+            # Counters start over, so move the epoch past any reader's snapshot
+            self.backend.incr(self.EPOCH)
+            self.hits = self.misses = 0
+
+    def stats(self):
+        stats = {
+            'backend': self.backend.name,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': 0,
+        }
+        stats.update(self.backend.stats())
+        return stats
+
+
+class NullCache:
+    """Backend that stores nothing, used when caching is disabled."""
+
+    name = 'none'
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def add(self, key, value, ttl=None):
+        return True
+
+    def delete(self, *keys):
+        pass
+
+    def counter(self, key):
+        return 0
+
+    def incr(self, key):
+        return 0
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {}
+
+
+def create_cache(config):
+    """Build a TodoCache from the CACHE_* settings in config."""
+    backend_name = config.get('CACHE_BACKEND', 'memory')
+    ttl = config.get('CACHE_TTL', 30)
+    if backend_name == 'memory':
+        backend = LRUCache(
+            max_entries=config.get('CACHE_MAX_ENTRIES', 10000),
+            max_bytes=config.get('CACHE_MAX_BYTES', 64 * 1024 * 1024),
+            ttl=ttl,
+        )
+    elif backend_name == 'redis':
+        backend = RedisCache.from_url(config['CACHE_REDIS_URL'], ttl=ttl)
+    elif backend_name == 'none':
+        backend = NullCache()
+    else:
+        raise ValueError(f"Unknown CACHE_BACKEND '{backend_name}'")
+    return TodoCache(backend)
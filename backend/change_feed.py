@@ -0,0 +1,137 @@
+"""In-memory change feed behind the ``GET /todos/events`` stream.
+
+Write endpoints publish one compact delta per changed todo (``create`` and
+``update`` carry the todo, ``delete`` only its id). A snapshot import and
+the archive job publish a single ``reset`` event instead, telling clients
+to reload. Each event gets an id
+and goes into a bounded log, and connected Server-Sent Events clients
+receive it as soon as it is published.
+
+A client that reconnects with ``Last-Event-ID`` gets the events it missed
+replayed from the log. If that is no longer possible (the events were
+evicted, the id belongs to another process or to one that has restarted,
+or the client is new), it gets a ``reset`` event instead and reloads the
+list. Event ids start with a random stream id that is regenerated in every
+process, so ids from one process never resume a stream in another.
+
+Events carry the owner of the todo, and each stream only receives the
+events of the owner it was opened for.
+
+Under a threaded server every open stream holds a request thread. To keep
+threads free for other requests, at most ``max_streams`` streams are open at
+once per process (callers turn the others away), and each stream ends after
+``max_duration`` seconds; clients reconnect with ``Last-Event-ID`` and lose
+nothing.
+"""
+import itertools
+import json
+import secrets
+import threading
+import time
+from collections import deque
+
+
+def format_event(event_id, event, data):
+    """Render one Server-Sent Event."""
+    return f'id: {event_id}\nevent: {event}\ndata: {data}\n\n'
+
+
+class ChangeFeed:
+    """Bounded log of todo changes that streams can wait on."""
+
+    def __init__(self, max_events=10000, max_streams=None):
+        self.max_events = max_events
+        self.max_streams = max_streams
+        self._condition = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self.stream_id = secrets.token_hex(4)
+        self._events = deque(maxlen=self.max_events)  # (seq, event, encoded data, owner)
+        self._seq = 0
+        self.open_streams = 0
+
+    def open_stream(self):
+        """Take a stream slot; return False if max_streams streams are open already."""
+        with self._condition:
+            if self.max_streams is not None and self.open_streams >= self.max_streams:
+                return False
+            self.open_streams += 1
+            return True
+
+    def close_stream(self):
+        """Give back the slot taken by open_stream."""
+        with self._condition:
+            self.open_streams -= 1
+
+    def restart_after_fork(self):
+        """Start an empty log with a new stream id in a forked worker."""
+        self._condition = threading.Condition()
+        self._reset()
+
+    def event_id(self, seq):
+        return f'{self.stream_id}-{seq}'
+
+    def publish(self, event, data, owner=None):
+        """Append an event for the streams of owner and wake up the waiting streams."""
+        encoded = json.dumps(data, sort_keys=True, separators=(',', ':'))
+        with self._condition:
+            self._seq += 1
+            self._events.append((self._seq, event, encoded, owner))
+            self._condition.notify_all()
+
+    def resume_position(self, last_event_id):
+        """Return the sequence number to resume after, or None if last_event_id cannot be resumed."""
+        stream_id, _, seq = (last_event_id or '').strip().rpartition('-')
+        if stream_id != self.stream_id or not seq.isdigit():
+            return None
+        seq = int(seq)
+        with self._condition:
+            return seq if self._available(seq) else None
+
+    def _available(self, after):
+        oldest = self._events[0][0] if self._events else self._seq + 1
+        return oldest - 1 <= after <= self._seq
+
+    def wait(self, after, timeout):
+        """Return the events published after seq after, waiting up to timeout seconds.
+
+        Returns an empty list on timeout and None once the events after
+        ``after`` have been evicted from the log.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._seq != after, timeout)
+            if not self._available(after):
+                return None
+            start = len(self._events) - (self._seq - after)
+            return list(itertools.islice(self._events, start, None))
+
+    def stream(self, last_event_id=None, heartbeat=15.0, retry=3000, owner=None, max_duration=None):
+        """Yield the text of an SSE stream of owner's events, resuming after last_event_id if possible.
+
+        The stream ends after max_duration seconds, if given.
+        """
+        deadline = time.monotonic() + max_duration if max_duration else None
+        # Sent first so the response headers go out straight away
+        yield f'retry: {retry}\n\n'
+        after = self.resume_position(last_event_id)
+        while True:
+            timeout = heartbeat
+            if deadline is not None:
+                timeout = min(heartbeat, deadline - time.monotonic())
+                if timeout <= 0:
+                    return
+            events = self.wait(after, timeout) if after is not None else None
+            if events is None:
+                # The client cannot catch up from the log and must reload the list
+                with self._condition:
+                    after = self._seq
+                yield format_event(self.event_id(after), 'reset', '{}')
+            elif events:
+                after = events[-1][0]
+                events = [(seq, event, data) for seq, event, data, event_owner in events if event_owner == owner]
+                if events:
+                    yield ''.join(format_event(self.event_id(seq), event, data) for seq, event, data in events)
+            else:
+                # Keeps proxies from closing an idle connection
+                yield ': keep-alive\n\n'
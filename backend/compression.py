@@ -0,0 +1,164 @@
+"""Negotiated compression of JSON responses.
+
+Clients that send ``Accept-Encoding`` get JSON and NDJSON responses
+compressed with gzip, or with brotli when the optional ``brotli`` package is
+installed and the client accepts it. Bodies under ``COMPRESSION_MIN_SIZE``
+bytes go out as they are: they would shrink by a few bytes at the cost of
+CPU on every request. Streamed responses, such as ``GET /todos?stream=ndjson``,
+are compressed chunk by chunk and flushed after each one, so clients still
+receive every batch as soon as it is sent. The health checks and the event
+stream are never compressed.
+
+A compressed body is a representation of its own, so its ETag gets the
+encoding appended (``"todos-c42-gzip"``). The suffix is stripped from
+``If-None-Match`` and ``If-Match`` before the views compare them, and a 304
+carries the tag the client sent. Compressed bodies of responses with an ETag
+are cached, so a hot list is compressed once per version rather than once
+per request. The cache key adds a CRC of the body to the ETag, since the id
+of a deleted todo, and so its ETag, can be reused.
+"""
+import gzip
+import zlib
+
+from flask import current_app, g, request
+from werkzeug.datastructures import ETags
+from werkzeug.http import parse_etags
+
+from cache import LRUCache
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip is always available
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson'}
+# Health checks stay cheap, and compressing the event stream would hold back events
+UNCOMPRESSED_ENDPOINTS = {'health_check', 'liveness_check', 'readiness_check', 'todo_events', 'static'}
+# Compressed bodies are kept while they are used; a new version gets a new ETag anyway
+CACHE_TTL = 3600
+
+
+def _as_bytes(chunks):
+    for chunk in chunks:
+        yield chunk.encode() if isinstance(chunk, str) else chunk
+
+
+class GzipEncoding:
+    name = 'gzip'
+
+    def __init__(self, level=6):
+        self.level = level
+
+    def compress(self, data):
+        # mtime=0 gives identical bodies identical output
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    def stream(self, chunks):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+        for chunk in _as_bytes(chunks):
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+
+class BrotliEncoding:
+    name = 'br'
+
+    def __init__(self, quality=4):
+        # Brotli's default quality of 11 suits static files, not per-request bodies
+        self.quality = quality
+
+    def compress(self, data):
+        return brotli.compress(data, quality=self.quality)
+
+    def stream(self, chunks):
+        compressor = brotli.Compressor(quality=self.quality)
+        for chunk in _as_bytes(chunks):
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+
+
+class ResponseCompressor:
+    """Compresses the responses of an app and caches compressed bodies by ETag."""
+
+    def __init__(self, encodings, cache):
+        self.encodings = {encoding.name: encoding for encoding in encodings}
+        self.cache = cache
+        # Bodies actually compressed, as opposed to served from the cache
+        self.compressions = 0
+
+    def strip_etag_suffixes(self):
+        """Let the views compare conditional headers with the ETags they compute."""
+        for header in ('HTTP_IF_NONE_MATCH', 'HTTP_IF_MATCH'):
+            value = request.environ.get(header)
+            if value:
+                etags = parse_etags(value)
+                strong = etags.as_set()
+                weak = etags.as_set(include_weak=True) - strong
+                request.environ[header] = ETags(
+                    [self._strip_encoding(tag, header) for tag in strong],
+                    [self._strip_encoding(tag, header) for tag in weak],
+                    etags.star_tag,
+                ).to_header()
+
+    def _strip_encoding(self, etag, header):
+        for name in self.encodings:
+            if etag.endswith(f'-{name}'):
+                if header == 'HTTP_IF_NONE_MATCH':
+                    g.etag_encoding = name  # A 304 carries the client's tag back
+                return etag[:-len(name) - 1]
+        return etag
+
+    def compress(self, response):
+        if request.endpoint in UNCOMPRESSED_ENDPOINTS:
+            return response
+        if response.status_code == 304:
+            etag, weak = response.get_etag()
+            if etag and g.get('etag_encoding'):
+                response.set_etag(f'{etag}-{g.etag_encoding}', weak)
+                response.vary.add('Accept-Encoding')
+            return response
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES or 'Content-Encoding' in response.headers:
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self.encodings.get(request.accept_encodings.best_match(list(self.encodings)))
+        if encoding is None or response.status_code < 200 or response.status_code == 204:
+            return response
+
+        if response.is_streamed:
+            response.response = encoding.stream(response.response)
+            response.headers.remove('Content-Length')
+            response.headers['Content-Encoding'] = encoding.name
+            return response
+
+        body = response.get_data()
+        if len(body) < current_app.config['COMPRESSION_MIN_SIZE']:
+            return response
+        etag, weak = response.get_etag()
+        cache_key = f'{encoding.name} {etag} {len(body)} {zlib.crc32(body)}' if etag else None
+        cached = self.cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            compressed = cached['body']
+        else:
+            compressed = encoding.compress(body)
+            self.compressions += 1
+            if cache_key:
+                self.cache.set(cache_key, {'body': compressed})
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding.name
+        if etag:
+            response.set_etag(f'{etag}-{encoding.name}', weak)
+        return response
+
+
+def init_compression(app):
+    """Compress the responses of app as configured by the COMPRESSION_* settings; return the compressor."""
+    encodings = [GzipEncoding(app.config['COMPRESSION_GZIP_LEVEL'])]
+    if brotli is not None:
+        # Listed first, so it wins when the client accepts both equally
+        encodings.insert(0, BrotliEncoding(app.config['COMPRESSION_BROTLI_QUALITY']))
+    cache = LRUCache(max_entries=app.config['COMPRESSION_CACHE_MAX_ENTRIES'],
+                     max_bytes=app.config['COMPRESSION_CACHE_MAX_BYTES'], ttl=CACHE_TTL)
+    compressor = ResponseCompressor(encodings, cache)
+    app.before_request(compressor.strip_etag_suffixes)
+    app.after_request(compressor.compress)
+    return compressor
@@ -0,0 +1,119 @@
+"""Group commit: run concurrent single-todo writes in one transaction.
+
+Every commit costs a durable write to the database log (an fsync on
+PostgreSQL, a WAL append on SQLite) and a turn on the single SQLite writer.
+When many small writes arrive together, such as rapid toggles from the
+frontend, ``GroupCommitter`` collects them for a short window and commits
+them together.
+
+Request threads ``submit()`` a write function and block. A background
+thread collects writes until none has arrived for ``window`` seconds, the
+first has waited ``max_latency`` seconds or ``max_batch`` are queued. It
+then runs each write in its own savepoint, so one failed write does not
+undo the others, and commits once. Each caller gets its own write's result
+or exception once the shared commit is durable. With several shards, the
+writes of each shard are committed together in a transaction of their own.
+
+Write functions run on the committer thread without a request context.
+They must read everything they need from the request up front and return
+plain data rather than ORM objects.
+"""
+import queue
+import threading
+import time
+
+
+class _PendingWrite:
+    __slots__ = ('write', 'shard', 'result', 'error', 'done')
+
+    def __init__(self, write, shard):
+        self.write = write
+        self.shard = shard
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class GroupCommitter:
+    def __init__(self, app, store, window=0.002, max_latency=0.01, max_batch=64):
+        self.app = app
+        self.store = store
+        self.window = window
+        self.max_latency = max_latency
+        self.max_batch = max_batch
+        self.batches = 0
+        self.writes = 0
+        self._start_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+
+    def restart_after_fork(self):
+        # Threads do not survive fork(); a worker starts its own on first use
+        self._start_lock = threading.Lock()
+        self._reset()
+
+    def submit(self, write, shard=None):
+        """Run write() on shard in the next group commit and return its result once committed."""
+        pending = _PendingWrite(write, shard)
+        self._queue.put(pending)
+        if self._thread is None:
+            self._start()
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_latency
+            while len(batch) < self.max_batch:
+                timeout = min(self.window, deadline - time.monotonic())
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            by_shard = {}
+            for pending in batch:
+                by_shard.setdefault(pending.shard, []).append(pending)
+            for shard, writes in by_shard.items():
+                self._commit(shard, writes)
+
+    def _commit(self, shard, batch):
+        try:
+            with self.app.app_context():
+                self.store.select_shard(shard)
+                session = self.store.begin_group()
+                try:
+                    for pending in batch:
+                        try:
+                            with session.begin_nested():
+                                pending.result = pending.write()
+                        except Exception as e:
+                            pending.error = e
+                    session.commit()
+                except Exception as e:
+                    session.rollback()
+                    for pending in batch:
+                        pending.error = pending.error or e
+                finally:
+                    self.store.end_group()
+        except Exception as e:
+            # Not even a transaction could be started
+            for pending in batch:
+                pending.error = pending.error or e
+        self.batches += 1
+        self.writes += len(batch)
+        for pending in batch:
+            pending.done.set()
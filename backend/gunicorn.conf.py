@@ -0,0 +1,54 @@
+"""Gunicorn settings for the production server.
+
+Every setting can be overridden through the environment, e.g.
+``WEB_CONCURRENCY=4 GUNICORN_THREADS=8 python app.py``.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+# Worker pool: processes x threads. gthread workers keep slow clients from
+# tying up a whole process. The default response cache (CACHE_BACKEND=memory)
+# lives in each process, so without a shared backend the default is a single
+# worker, and an explicit WEB_CONCURRENCY above 1 turns that cache off.
+cache_backend = os.environ.get('CACHE_BACKEND', 'memory')
+default_workers = 1 if cache_backend == 'memory' else multiprocessing.cpu_count() * 2 + 1
+workers = int(os.environ.get('WEB_CONCURRENCY', default_workers))
+if workers > 1 and cache_backend == 'memory':
+    # Read by create_app() in the preloaded master and every worker
+    os.environ['CACHE_BACKEND'] = 'none'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+
+# Load the app once in the master so workers fork with it already imported,
+# migrated and warmed up; the post_worker_init hook below swaps the inherited
+# database connections for the worker's own.
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+# Recycle workers after a number of requests (with jitter so they do not all
+# restart together) to bound memory growth.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+# Graceful shutdown: on SIGTERM workers finish in-flight requests first.
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_worker_init(worker):
+    """Give each worker its own database connection pool, warmed up before its first request."""
+    from app import init_worker
+    init_worker(worker.wsgi)
+
+
+def worker_exit(server, worker):
+    """Close the worker's database connections and flush its logs on shutdown or recycling."""
+    from app import shutdown_worker
+    if getattr(worker, 'wsgi', None) is not None:
+        shutdown_worker(worker.wsgi)
@@ -0,0 +1,116 @@
+"""Idempotency-Key support for the write endpoints.
+
+A client that may retry a write sends a unique ``Idempotency-Key`` header.
+The first request with a key reserves it, runs, and stores its response.
+Retries with the same key and body get that response replayed, marked with
+``Idempotent-Replayed: true``, without running the write again or touching
+the database. Keys are scoped to the tenant, method and path and expire after
+``IDEMPOTENCY_TTL`` seconds.
+
+* A retry that arrives while the first request is still running gets 409.
+* Reusing a key with a different body gets 422.
+* Server errors (5xx) and aborted requests are not stored, so the client
+  can retry them.
+
+Entries live in the in-process LRU cache by default, which bounds their
+number and size. With several worker processes, set
+``IDEMPOTENCY_BACKEND=redis`` so that every worker sees every key.
+"""
+import functools
+import hashlib
+
+from flask import current_app, jsonify, request
+
+from cache import LRUCache, RedisCache
+from tenancy import current_owner
+
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+# Response headers replayed along with the body
+REPLAYED_HEADERS = ('Content-Type', 'ETag')
+
+
+class IdempotencyStore:
+    """Reservations and stored responses of idempotency keys on a cache backend."""
+
+    def __init__(self, backend, pending_ttl=60):
+        self.backend = backend
+        # A reservation outlives a crashed request only this long
+        self.pending_ttl = pending_ttl
+
+    def begin(self, key, fingerprint):
+        """Reserve key for a request, or return the entry already recorded for it."""
+        while True:
+            if self.backend.add(key, {'body': '', 'fingerprint': fingerprint, 'status': None}, self.pending_ttl):
+                return None
+            entry = self.backend.get(key)
+            if entry is not None:
+                return entry
+            # The entry expired between add() and get(); try to reserve it again
+
+    def complete(self, key, fingerprint, response):
+        self.backend.set(key, {
+            'fingerprint': fingerprint,
+            'status': response.status_code,
+            'body': response.get_data(as_text=True),
+            'headers': {name: response.headers[name] for name in REPLAYED_HEADERS if name in response.headers},
+        })
+
+    def release(self, key):
+        self.backend.delete(key)
+
+
+def create_idempotency_store(config):
+    """Build an IdempotencyStore from the IDEMPOTENCY_* settings in config."""
+    backend_name = config.get('IDEMPOTENCY_BACKEND', 'memory')
+    ttl = config.get('IDEMPOTENCY_TTL', 86400)
+    if backend_name == 'memory':
+        backend = LRUCache(
+            max_entries=config.get('IDEMPOTENCY_MAX_KEYS', 100000),
+            max_bytes=config.get('IDEMPOTENCY_MAX_BYTES', 64 * 1024 * 1024),
+            ttl=ttl,
+        )
+    elif backend_name == 'redis':
+        backend = RedisCache.from_url(config['CACHE_REDIS_URL'], ttl=ttl, prefix='todo-api:idempotency:')
+    else:
+        raise ValueError(f"Unknown IDEMPOTENCY_BACKEND '{backend_name}', expected memory or redis")
+    return IdempotencyStore(backend)
+
+
+def idempotent(store):
+    """Make a view replay its stored response to retries with the same Idempotency-Key."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+            if key is None:
+                return view(*args, **kwargs)
+            if not 0 < len(key) <= MAX_KEY_LENGTH:
+                return jsonify({"error": f"{IDEMPOTENCY_KEY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters"}), 400
+
+            scoped_key = f'{current_owner()} {request.method} {request.path} {key}'
+            fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+            entry = store.begin(scoped_key, fingerprint)
+            if entry is not None:
+                if entry['status'] is None:
+                    return jsonify({"error": f"A request with this {IDEMPOTENCY_KEY_HEADER} is still in progress"}), 409
+                if entry['fingerprint'] != fingerprint:
+                    return jsonify({"error": f"{IDEMPOTENCY_KEY_HEADER} was already used with a different request"}), 422
+                current_app.logger.info('Replayed response for %s', request.path)
+                response = current_app.response_class(entry['body'], status=entry['status'], headers=entry['headers'])
+                response.headers[REPLAYED_HEADER] = 'true'
+                return response
+
+            try:
+                response = current_app.make_response(view(*args, **kwargs))
+            except BaseException:
+                store.release(scoped_key)
+                raise
+            if response.status_code >= 500:
+                store.release(scoped_key)
+            else:
+                store.complete(scoped_key, fingerprint, response)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,261 @@
+"""Background jobs: deferred work that would otherwise block a request.
+
+Endpoints such as ``POST /todos/archive-completed`` queue a job and answer
+``202 Accepted`` right away with its id; ``GET /jobs/<id>`` reports its
+status and progress. Jobs are rows of the ``job`` table in the main
+database, so they survive restarts and every server process sees them.
+
+Each process runs ``JOBS_WORKERS`` worker threads. A worker claims the
+oldest runnable job with a conditional UPDATE, so a job runs once even when
+several processes poll the same database, and runs its handler in an app
+context on the shard of the job's owner. Handlers work in short
+transactions and report progress between them, which also refreshes the
+job's heartbeat. A running job whose heartbeat is older than
+``JOBS_STALE_AFTER`` seconds belonged to a process that died, and is
+queued again.
+
+A failed job is retried until it has run ``JOBS_MAX_ATTEMPTS`` times,
+waiting ``JOBS_RETRY_DELAY`` seconds, doubled after every attempt, in
+between. Handlers must be safe to run again after a partial run. A job
+interrupted by a worker shutdown is queued again without using up an
+attempt.
+
+Workers start with the server worker (``init_worker``), or when a job is
+queued or looked up, never in the gunicorn master. A new job wakes the
+workers of its own process; those of other processes find it within
+``JOBS_POLL_INTERVAL`` seconds.
+"""
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import case, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import Job
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+# Longest error message kept on a job; the full error goes to the log
+MAX_ERROR_LENGTH = 200
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _error_summary(error):
+    """Return the short description of error that GET /jobs/<id> shows.
+
+    Database errors are reduced to their class name, as their text holds
+    the SQL statement and its parameters.
+    """
+    if isinstance(error, SQLAlchemyError):
+        return f'Database error ({type(error).__name__})'
+    lines = str(error).strip().splitlines()
+    message = lines[0] if lines else type(error).__name__
+    return message[:MAX_ERROR_LENGTH]
+
+
+class JobInterrupted(Exception):
+    """Raised by JobContext.report() once the workers are stopping."""
+
+
+class JobContext:
+    """The job a handler runs: its owner, parameters and progress so far."""
+
+    def __init__(self, queue, job):
+        self.queue = queue
+        self.id = job.id
+        self.owner_id = job.owner_id
+        self.params = job.params or {}
+        # Kept from an earlier attempt, so a retried job can resume
+        self.progress = job.progress
+
+    def report(self, progress, total=None):
+        """Record progress, out of total if known, and refresh the heartbeat.
+
+        Commits the session, so call it between the handler's transactions.
+        """
+        if self.queue.stopping:
+            raise JobInterrupted()
+        values = {'progress': progress}
+        if total is not None:
+            values['total'] = total
+        self.progress = progress
+        self.queue._update(self.id, **values)
+
+
+class JobQueue:
+    """Persistent job queue of app, and the worker threads that run its jobs."""
+
+    def __init__(self, app, store, workers=1, max_attempts=3, retry_delay=5, poll_interval=1, stale_after=60):
+        self.app = app
+        self.store = store
+        self.db = store.db
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.handlers = {}
+        # Jobs run to completion or failure by this process
+        self.runs = 0
+        self._start_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+
+    def restart_after_fork(self):
+        # Threads do not survive fork(); a worker starts its own
+        self._start_lock = threading.Lock()
+        self._reset()
+
+    @property
+    def stopping(self):
+        return self._stopped.is_set()
+
+    def register(self, kind, handler):
+        """Run jobs of kind with handler(job), job being a JobContext; its return value is the result."""
+        self.handlers[kind] = handler
+
+    def enqueue(self, kind, owner_id=None, shard=None, params=None):
+        """Queue a job of kind for owner_id and return it as a dict."""
+        if kind not in self.handlers:
+            raise ValueError(f'Unknown job kind: {kind}')
+        now = _now()
+        job = Job(kind=kind, owner_id=owner_id, shard=shard, params=params, status=QUEUED, attempts=0,
+                  max_attempts=self.max_attempts, progress=0, created_at=now, run_after=now)
+        session = self.db.session
+        session.add(job)
+        session.flush()
+        # Taken before the commit, as reading the job back would hold on to the writer
+        queued = job.to_dict()
+        session.commit()
+        self.start()
+        self._wakeup.set()
+        return queued
+
+    def get(self, job_id, owner_id=None):
+        """Return the job if it belongs to owner_id, else None."""
+        self.start()
+        job = self.db.session.get(Job, job_id, bind_arguments=self._read_bind())
+        return job if job is not None and job.owner_id == owner_id else None
+
+    def start(self):
+        """Start the worker threads, once per process."""
+        with self._start_lock:
+            if not self._threads and not self.stopping:
+                self._threads = [
+                    threading.Thread(target=self._run, name=f'job-worker-{number}', daemon=True)
+                    for number in range(self.workers)
+                ]
+                for thread in self._threads:
+                    thread.start()
+
+    def stop(self):
+        """Stop the workers; running jobs are interrupted at their next progress report."""
+        with self._start_lock:
+            threads = self._threads
+            self._stopped.set()
+            self._wakeup.set()
+        for thread in threads:
+            thread.join()
+        self._reset()
+
+    def _run(self):
+        while not self.stopping:
+            try:
+                ran = self.run_next()
+            except Exception:
+                self.app.logger.exception('Job worker failed')
+                ran = False
+            if not ran:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def run_next(self):
+        """Claim the next runnable job and run it; return False if there was none."""
+        with self.app.app_context():
+            self._requeue_stale()
+            job = self._claim()
+            if job is None:
+                return False
+            self._execute(job)
+            return True
+
+    def _read_bind(self):
+        # Jobs live in the main database, whichever shard the session uses
+        engine = self.db.engines.get('reader')
+        return {'bind': engine} if engine is not None else None
+
+    def _claim(self):
+        session = self.db.session
+        while True:
+            now = _now()
+            # Looked up on the read pool, so idle workers never take the write lock
+            job_id = session.execute(
+                select(Job.id).where(Job.status == QUEUED, Job.run_after <= now)
+                .order_by(Job.run_after, Job.id).limit(1),
+                bind_arguments=self._read_bind(),
+            ).scalar()
+            if job_id is None:
+                return None
+            claimed = session.execute(
+                update(Job).where(Job.id == job_id, Job.status == QUEUED)
+                .values(status=RUNNING, attempts=Job.attempts + 1, started_at=now, heartbeat_at=now)
+            ).rowcount
+            session.commit()
+            if claimed:
+                return session.get(Job, job_id)
+            # Another worker got there first
+
+    def _requeue_stale(self):
+        session = self.db.session
+        now = _now()
+        stale = (Job.status == RUNNING) & (Job.heartbeat_at < now - timedelta(seconds=self.stale_after))
+        if session.execute(select(Job.id).where(stale).limit(1), bind_arguments=self._read_bind()).first() is None:
+            return
+        used_up = Job.attempts >= Job.max_attempts
+        session.execute(update(Job).where(stale).values(
+            status=case((used_up, FAILED), else_=QUEUED),
+            error='The worker running the job stopped',
+            run_after=now,
+            finished_at=case((used_up, now), else_=None),
+        ))
+        session.commit()
+        self.app.logger.warning('Took over jobs of a worker that stopped')
+
+    def _execute(self, job):
+        job_id, kind, attempts, max_attempts = job.id, job.kind, job.attempts, job.max_attempts
+        context = JobContext(self, job)
+        self.app.logger.info('Running job %s (%s), attempt %s', job_id, kind, attempts)
+        try:
+            if kind not in self.handlers:
+                raise LookupError(f'Unknown job kind: {kind}')
+            self.store.select_shard(job.shard)
+            result = self.handlers[kind](context)
+        except JobInterrupted:
+            self.db.session.rollback()
+            self.app.logger.info('Job %s interrupted, queued again', job_id)
+            self._update(job_id, status=QUEUED, attempts=Job.attempts - 1, run_after=_now())
+            return
+        except Exception as e:
+            self.db.session.rollback()
+            if attempts < max_attempts:
+                delay = self.retry_delay * 2 ** (attempts - 1)
+                self.app.logger.warning('Job %s failed, retrying in %ss: %s', job_id, delay, e)
+                self._update(job_id, status=QUEUED, error=_error_summary(e), run_after=_now() + timedelta(seconds=delay))
+                return
+            self.app.logger.error('Job %s failed after %s attempts: %s', job_id, attempts, e)
+            self._update(job_id, status=FAILED, error=_error_summary(e), finished_at=_now())
+        else:
+            self.app.logger.info('Job %s (%s) succeeded', job_id, kind)
+            self._update(job_id, status=SUCCEEDED, result=result, error=None, finished_at=_now())
+        self.runs += 1
+
+    def _update(self, job_id, **values):
+        session = self.db.session
+        session.execute(update(Job).where(Job.id == job_id).values(heartbeat_at=_now(), **values))
+        session.commit()
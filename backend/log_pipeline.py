@@ -0,0 +1,211 @@
+"""Non-blocking, structured application logging.
+
+Request threads never touch a file or a stream: ``QueueHandler`` puts each
+record on an in-memory queue and a ``QueueListener`` thread formats it as a
+JSON line and writes it to the rotating log file and stderr. Messages use
+``%``-style arguments and are only rendered by the writer thread, so a log
+call on the hot path costs a filter check and a queue put.
+
+Every record logged while a request is handled carries its request id (taken
+from ``X-Request-ID`` or generated). Success logs can be sampled per route:
+``LOG_SAMPLE_RATE`` sets the default fraction of successful requests whose
+INFO and DEBUG records are kept and ``LOG_SAMPLE_RATES`` overrides it per
+endpoint, e.g. ``get_todos=0.01,get_todo=0.1``. Warnings, errors and the
+access log of failed requests are always kept.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from flask import g, has_request_context, request
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+# Client supplied ids are echoed into logs and headers, so keep them tame
+_VALID_REQUEST_ID = re.compile(r'[A-Za-z0-9._:-]{1,128}')
+# LogRecord attributes that are not user supplied extra fields
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id', 'sampled'}
+
+
+def parse_sample_rates(value):
+    """Parse 'endpoint=rate,...' into a dict of endpoint to sample rate."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        endpoint, _, rate = item.partition('=')
+        rate = float(rate)
+        if not 0 <= rate <= 1:
+            raise ValueError(f"Sample rate for '{endpoint}' must be between 0 and 1")
+        rates[endpoint.strip()] = rate
+    return rates
+
+
+class JsonFormatter(logging.Formatter):
+    """Render a record as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Tag records with the current request id and apply per-request sampling.
+
+    Runs in the logging thread, before the record is queued, because the
+    request context is not available to the writer thread.
+    """
+
+    def filter(self, record):
+        if not has_request_context():
+            return True
+        record.request_id = g.get('request_id')
+        if record.levelno >= logging.WARNING:
+            return True
+        return getattr(record, 'sampled', g.get('log_sampled', True))
+
+
+class AsyncQueueHandler(QueueHandler):
+    """QueueHandler that defers formatting to the writer and never blocks.
+
+    The stock handler renders the message before queueing so records can be
+    pickled; records here stay in-process, so that work moves to the writer
+    thread. When the queue is full the record is dropped and counted.
+    """
+
+    def __init__(self, log_queue, max_size):
+        super().__init__(log_queue)
+        self.max_size = max_size
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        if self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+        else:
+            self.queue.put(record)
+
+
+class LogFileHandler(RotatingFileHandler):
+    """RotatingFileHandler that creates its directory when the first record is written."""
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+class LogPipeline:
+    """Owns the log queue, its handler and the writer thread."""
+
+    def __init__(self, handlers, queue_size=10000):
+        # SimpleQueue is implemented in C and cheaper to put to than Queue
+        self.queue = queue.SimpleQueue()
+        self.handler = AsyncQueueHandler(self.queue, queue_size)
+        self.handler.addFilter(RequestContextFilter())
+        self.handlers = handlers
+        self.listener = None
+
+    def start(self):
+        self.listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self):
+        """Flush queued records and stop the writer thread."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def restart_after_fork(self):
+        # Threads do not survive fork(), so a forked worker needs its own writer
+        if self.listener is not None:
+            self.listener = None
+            self.start()
+
+
+def _sample_request(app):
+    rates = app.config['LOG_SAMPLE_RATES']
+    rate = rates.get(request.endpoint, app.config['LOG_SAMPLE_RATE'])
+    return rate >= 1 or random.random() < rate
+
+
+def init_request_logging(app):
+    """Assign request ids, decide sampling and write one access log per request."""
+
+    @app.before_request
+    def _start_request_log():
+        request_id = request.headers.get(REQUEST_ID_HEADER, '')
+        g.request_id = request_id if _VALID_REQUEST_ID.fullmatch(request_id) else uuid.uuid4().hex
+        g.log_sampled = _sample_request(app)
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _finish_request_log(response):
+        if 'request_id' not in g:
+            return response
+        response.headers[REQUEST_ID_HEADER] = g.request_id
+        app.logger.info(
+            '%s %s %s', request.method, request.path, response.status_code,
+            extra={
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'duration_ms': round((time.perf_counter() - g.request_started) * 1000, 3),
+                # Failed requests are always logged, whatever the sample rate
+                'sampled': g.log_sampled or response.status_code >= 400,
+            },
+        )
+        return response
+
+
+def setup_logging(app):
+    """Route app.logger through a background writer and return the pipeline."""
+    formatter = JsonFormatter()
+
+    # The file, and the logs directory, only appear once something is logged
+    log_dir = app.config.get('LOG_DIR') or os.path.join(app.instance_path, 'logs')
+    file_handler = LogFileHandler(
+        os.path.join(log_dir, 'flask.log'),
+        maxBytes=app.config['LOG_MAX_BYTES'],
+        backupCount=app.config['LOG_BACKUP_COUNT'],
+        delay=True,
+    )
+    # Also log to stderr for container logs
+    console_handler = logging.StreamHandler()
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(formatter)
+
+    pipeline = LogPipeline([file_handler, console_handler], queue_size=app.config['LOG_QUEUE_SIZE'])
+    pipeline.start()
+    atexit.register(pipeline.stop)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=pipeline.restart_after_fork)
+
+    # Apps created by the same module share their logger; the newest one's pipeline takes over
+    for handler in app.logger.handlers[:]:
+        if isinstance(handler, AsyncQueueHandler):
+            app.logger.removeHandler(handler)
+    app.logger.addHandler(pipeline.handler)
+    app.logger.setLevel(app.config['LOG_LEVEL'])
+    # Records go to our handler only, not also to the root logger
+    app.logger.propagate = False
+    return pipeline
@@ -0,0 +1,321 @@
+"""In-process request and database metrics in the Prometheus text format.
+
+Recording has to be cheap enough to leave on for every request, so metrics
+take no lock on the hot path: each thread updates its own shard of every
+metric, and ``/metrics`` merges the shards when it is scraped. A shard is
+only ever written by its own thread; the scrape copies it with a single
+C-level call, which the GIL keeps atomic. When a thread ends, its shard is
+folded into a retired total, so short-lived threads (one per request on
+the development server) do not accumulate shards.
+
+Metrics are per process. Under gunicorn every worker keeps its own, so
+scrape each worker (or run one worker per container) to see them all.
+"""
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Shard:
+    """Holder of a thread's values; it is dropped, and so finalized, when the thread ends."""
+    __slots__ = ('values', '__weakref__')
+
+    def __init__(self):
+        self.values = {}
+
+
+class Metric:
+    """Base class holding one shard of label values per thread."""
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = {}  # id of a live thread's values: the values
+        self._retired = {}  # Totals of the threads that have ended
+        # Reentrant, as a shard may be retired by a thread that holds it
+        self._lock = threading.RLock()
+
+    def _shard(self):
+        try:
+            return self._local.shard.values
+        except AttributeError:
+            shard = self._local.shard = _Shard()
+            # Taken once per thread, not per update
+            with self._lock:
+                self._shards[id(shard.values)] = shard.values
+            weakref.finalize(shard, self._retire, shard.values).atexit = False
+            return shard.values
+
+    def _retire(self, values):
+        with self._lock:
+            self._shards.pop(id(values), None)
+            retired = dict(self._retired)
+            for labels, value in list(values.items()):
+                retired[labels] = self._add(retired.get(labels), value)
+            self._retired = retired
+
+    @staticmethod
+    def _add(total, value):
+        """Return total plus value, without changing either."""
+        return value if total is None else total + value
+
+    def _snapshots(self):
+        with self._lock:
+            shards = list(self._shards.values())
+            retired = self._retired
+        return [list(retired.items())] + [list(shard.items()) for shard in shards]
+
+    def collect(self):
+        """Return the merged {label values: value} of all threads."""
+        merged = {}
+        for snapshot in self._snapshots():
+            for labels, value in snapshot:
+                merged[labels] = self._add(merged.get(labels), value)
+        return merged
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for labels, value in sorted(self.collect().items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+
+class Gauge(Counter):
+    """A value that goes up and down; the sum of what every thread added."""
+    type = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        shard = self._shard()
+        entry = shard.get(labels)
+        if entry is None:
+            # Per-bucket counts (the last one is +Inf), then the sum
+            entry = shard[labels] = [0] * (len(self.buckets) + 1) + [0]
+        entry[bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    @staticmethod
+    def _add(total, entry):
+        return list(entry) if total is None else [a + b for a, b in zip(total, entry)]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for labels, entry in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), entry[:-1]):
+                cumulative += count
+                le = (('le', bound if bound == '+Inf' else _format_value(float(bound))),)
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(float(entry[-1]))}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self._register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self._register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self._register(Histogram(*args, **kwargs))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class AppMetrics:
+    """The HTTP and database metrics of the API."""
+
+    def __init__(self, registry=None):
+        self.registry = registry or Registry()
+        r = self.registry
+        self.requests = r.counter(
+            'http_requests_total', 'HTTP requests handled.', ('method', 'route', 'status'))
+        self.latency = r.histogram(
+            'http_request_duration_seconds', 'Time spent producing a response.', ('method', 'route'))
+        self.in_flight = r.gauge(
+            'http_requests_in_flight', 'Requests currently being handled.', ('route',))
+        self.response_size = r.histogram(
+            'http_response_size_bytes', 'Size of response bodies with a known length.', ('route',),
+            buckets=SIZE_BUCKETS)
+        self.request_queries = r.histogram(
+            'http_request_db_queries', 'Database statements executed per request.', ('route',),
+            buckets=COUNT_BUCKETS)
+        self.request_db_time = r.histogram(
+            'http_request_db_duration_seconds', 'Time spent in database statements per request.', ('route',))
+        self.queries = r.counter(
+            'db_queries_total', 'Database statements executed.', ('engine',))
+        self.query_latency = r.histogram(
+            'db_query_duration_seconds', 'Duration of single database statements.', ('engine',))
+        self.commit_latency = r.histogram(
+            'db_commit_duration_seconds', 'Duration of session commits, flush included.')
+        # Per-thread accumulator for the statements of the current request
+        self._request = threading.local()
+        # (target, event name, listener) registered by instrument_sqlalchemy
+        self._listeners = []
+        # Keys of the start times kept in connection and session info, unique
+        # per instance so two instruments of one engine do not mix them up
+        self._started_key = ('metrics_started', id(self))
+        self._commit_started_key = ('metrics_commit_started', id(self))
+
+    def render(self):
+        return self.registry.render()
+
+    # Database
+
+    def instrument_sqlalchemy(self, app, db):
+        """Time every statement of app's engines and every commit of its sessions.
+
+        The listeners are removed by ``uninstrument_sqlalchemy``, or once app
+        is garbage collected, so apps built side by side in one process each
+        count only their own queries.
+        """
+        with app.app_context():
+            engines = list(db.engines.values())
+        for engine in engines:
+            self._listeners.append((engine, 'before_cursor_execute', self._before_execute))
+            self._listeners.append((engine, 'after_cursor_execute', self._after_execute))
+        # Every app built on the models' db shares its scoped session, so
+        # commits are only timed for the app they run under
+        app_ref = weakref.ref(app)
+        for name, handler in (
+            ('before_commit', self._before_commit),
+            ('after_commit', self._after_commit),
+            ('after_soft_rollback', self._discard_commit),
+        ):
+            self._listeners.append((db.session, name, self._for_app(app_ref, handler)))
+        for target, name, listener in self._listeners:
+            event.listen(target, name, listener)
+        weakref.finalize(app, self.uninstrument_sqlalchemy).atexit = False
+
+    def uninstrument_sqlalchemy(self):
+        """Remove the listeners added by instrument_sqlalchemy."""
+        listeners, self._listeners = self._listeners, []
+        for target, name, listener in listeners:
+            if event.contains(target, name, listener):
+                event.remove(target, name, listener)
+
+    @staticmethod
+    def _for_app(app_ref, handler):
+        def listener(*args):
+            if has_app_context() and current_app._get_current_object() is app_ref():
+                handler(*args)
+        return listener
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info[self._started_key] = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop(self._started_key, None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        engine = conn.engine.url.get_backend_name()
+        self.queries.inc(engine)
+        self.query_latency.observe(elapsed, engine)
+        current = self._request
+        if getattr(current, 'active', False):
+            current.queries += 1
+            current.db_time += elapsed
+
+    def _before_commit(self, session):
+        session.info[self._commit_started_key] = time.perf_counter()
+
+    def _after_commit(self, session):
+        started = session.info.pop(self._commit_started_key, None)
+        if started is not None:
+            self.commit_latency.observe(time.perf_counter() - started)
+
+    def _discard_commit(self, session, previous_transaction):
+        session.info.pop(self._commit_started_key, None)
+
+    # HTTP
+
+    def init_app(self, app):
+        """Record every request of app."""
+
+        @app.before_request
+        def _start_request_metrics():
+            g.metrics_route = request.url_rule.rule if request.url_rule else 'unmatched'
+            g.metrics_started = time.perf_counter()
+            self.in_flight.inc(g.metrics_route)
+            current = self._request
+            current.active = True
+            current.queries = 0
+            current.db_time = 0.0
+
+        @app.after_request
+        def _finish_request_metrics(response):
+            if 'metrics_started' not in g:
+                return response
+            route = g.metrics_route
+            self.requests.inc(request.method, route, str(response.status_code))
+            self.latency.observe(time.perf_counter() - g.metrics_started, request.method, route)
+            if response.content_length is not None:
+                self.response_size.observe(response.content_length, route)
+            current = self._request
+            self.request_queries.observe(current.queries, route)
+            self.request_db_time.observe(current.db_time, route)
+            return response
+
+        @app.teardown_request
+        def _end_request_metrics(exc):
+            if 'metrics_started' in g:
+                self.in_flight.dec(g.metrics_route)
+                self._request.active = False
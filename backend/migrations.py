@@ -0,0 +1,331 @@
+"""Versioned schema migrations.
+
+Each migration is a pair of functions that receive an open connection: one
+brings the schema from the previous version to its own, the other reverts
+it. Applied versions are recorded in
+the ``schema_migrations`` table, and every migration runs in its own
+transaction. Migrations describe tables with their own Core ``Table``
+objects rather than the current models, so they keep working as the models
+evolve, and they stick to DDL that SQLite and PostgreSQL both accept.
+
+Run them with ``flask --app app migrate`` or let ``init_db()`` apply them
+on startup.
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy import (
+    JSON, Boolean, Column, DateTime, Index, Integer, MetaData, String, Table, Text, inspect, select, text,
+)
+
+schema_migrations = Table(
+    'schema_migrations', MetaData(),
+    Column('version', Integer, primary_key=True, autoincrement=False),
+    Column('name', String(100), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+def _columns(connection, table):
+    return {column['name'] for column in inspect(connection).get_columns(table)}
+
+
+def create_todo(connection):
+    # Databases created by the old init_db() already have this table
+    todo = Table(
+        'todo', MetaData(),
+        Column('id', Integer, primary_key=True),
+        Column('task', String(200), nullable=False),
+        Column('completed', Boolean),
+    )
+    todo.create(connection, checkfirst=True)
+
+
+def drop_todo(connection):
+    connection.execute(text('DROP TABLE IF EXISTS todo'))
+
+
+def add_todo_version(connection):
+    if 'version' not in _columns(connection, 'todo'):
+        connection.execute(text('ALTER TABLE todo ADD COLUMN version INTEGER NOT NULL DEFAULT 1'))
+
+
+def drop_todo_version(connection):
+    connection.execute(text('ALTER TABLE todo DROP COLUMN version'))
+
+
+def create_todo_meta(connection):
+    todo_meta = Table(
+        'todo_meta', MetaData(),
+        Column('id', Integer, primary_key=True, autoincrement=False),
+        Column('change_counter', Integer, nullable=False),
+    )
+    todo_meta.create(connection, checkfirst=True)
+
+
+def drop_todo_meta(connection):
+    connection.execute(text('DROP TABLE IF EXISTS todo_meta'))
+
+
+def add_todo_list_indexes(connection):
+    todo = Table('todo', MetaData(), autoload_with=connection)
+    existing = {index['name'] for index in inspect(connection).get_indexes('todo')}
+    for index in (
+        Index('ix_todo_completed_id', todo.c.completed, todo.c.id),
+        Index('ix_todo_task_id', todo.c.task, todo.c.id),
+    ):
+        if index.name not in existing:
+            index.create(connection)
+
+
+def drop_todo_list_indexes(connection):
+    connection.execute(text('DROP INDEX IF EXISTS ix_todo_completed_id'))
+    connection.execute(text('DROP INDEX IF EXISTS ix_todo_task_id'))
+
+
+def create_todo_search(connection):
+    """Full-text index over todo.task.
+
+    SQLite gets an FTS5 table kept in sync by triggers. It stores its own
+    copy of the text, so the triggers stay correct for rows the backfill has
+    not reached yet; todo_search_state records how far the incremental
+    backfill of pre-existing rows has got. PostgreSQL gets a GIN expression
+    index instead. Other databases fall back to LIKE scans.
+    """
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        connection.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS todo_fts USING fts5(task, tokenize = 'unicode61 remove_diacritics 2')"
+        ))
+        connection.execute(text(
+            'CREATE TRIGGER IF NOT EXISTS todo_fts_insert AFTER INSERT ON todo BEGIN '
+            'INSERT INTO todo_fts (rowid, task) VALUES (new.id, new.task); END'
+        ))
+        connection.execute(text(
+            'CREATE TRIGGER IF NOT EXISTS todo_fts_update AFTER UPDATE OF task ON todo BEGIN '
+            'UPDATE todo_fts SET task = new.task WHERE rowid = new.id; END'
+        ))
+        connection.execute(text(
+            'CREATE TRIGGER IF NOT EXISTS todo_fts_delete AFTER DELETE ON todo BEGIN '
+            'DELETE FROM todo_fts WHERE rowid = old.id; END'
+        ))
+        connection.execute(text(
+            'CREATE TABLE IF NOT EXISTS todo_search_state ('
+            'id INTEGER PRIMARY KEY, backfill_cursor INTEGER NOT NULL, backfill_target INTEGER NOT NULL)'
+        ))
+        # Rows up to the current maximum id predate the triggers and are backfilled in batches
+        connection.execute(text(
+            'INSERT INTO todo_search_state (id, backfill_cursor, backfill_target) '
+            'SELECT 1, 0, COALESCE(MAX(id), 0) FROM todo'
+        ))
+    elif dialect == 'postgresql':
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_todo_task_fts ON todo USING GIN (to_tsvector('simple', task))"
+        ))
+
+
+def drop_todo_search(connection):
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        for trigger in ('todo_fts_insert', 'todo_fts_update', 'todo_fts_delete'):
+            connection.execute(text(f'DROP TRIGGER IF EXISTS {trigger}'))
+        connection.execute(text('DROP TABLE IF EXISTS todo_fts'))
+        connection.execute(text('DROP TABLE IF EXISTS todo_search_state'))
+    elif dialect == 'postgresql':
+        connection.execute(text('DROP INDEX IF EXISTS ix_todo_task_fts'))
+
+
+def add_todo_revisions(connection):
+    """Revision column and tombstones for delta sync (GET /todos/changes).
+
+    Existing rows start at the current change counter, so the first token
+    handed out covers them.
+    """
+    if 'revision' not in _columns(connection, 'todo'):
+        connection.execute(text('ALTER TABLE todo ADD COLUMN revision INTEGER NOT NULL DEFAULT 0'))
+        connection.execute(text(
+            'UPDATE todo SET revision = COALESCE((SELECT change_counter FROM todo_meta WHERE id = 1), 0)'
+        ))
+    if 'pruned_revision' not in _columns(connection, 'todo_meta'):
+        connection.execute(text('ALTER TABLE todo_meta ADD COLUMN pruned_revision INTEGER NOT NULL DEFAULT 0'))
+    todo = Table('todo', MetaData(), autoload_with=connection)
+    if 'ix_todo_revision_id' not in {index['name'] for index in inspect(connection).get_indexes('todo')}:
+        Index('ix_todo_revision_id', todo.c.revision, todo.c.id).create(connection)
+    todo_tombstone = Table(
+        'todo_tombstone', MetaData(),
+        Column('id', Integer, primary_key=True),
+        Column('todo_id', Integer, nullable=False),
+        Column('revision', Integer, nullable=False),
+        Column('deleted_at', DateTime, nullable=False),
+        Index('ix_todo_tombstone_revision_todo_id', 'revision', 'todo_id'),
+    )
+    todo_tombstone.create(connection, checkfirst=True)
+
+
+def drop_todo_revisions(connection):
+    connection.execute(text('DROP TABLE IF EXISTS todo_tombstone'))
+    connection.execute(text('DROP INDEX IF EXISTS ix_todo_revision_id'))
+    connection.execute(text('ALTER TABLE todo_meta DROP COLUMN pruned_revision'))
+    connection.execute(text('ALTER TABLE todo DROP COLUMN revision'))
+
+
+def add_tenants(connection):
+    """Tenants with API keys, and an owner on todos and tombstones.
+
+    Existing todos keep a NULL owner and form the anonymous list. The list
+    and revision indexes are rebuilt with the owner leading, so queries
+    scoped to one tenant scan only its rows.
+    """
+    tenant = Table(
+        'tenant', MetaData(),
+        Column('id', Integer, primary_key=True),
+        Column('name', String(100), nullable=False),
+        Column('api_key_hash', String(64), nullable=False, unique=True),
+        Column('shard', Integer, nullable=False, server_default='0'),
+        Column('created_at', DateTime, nullable=False),
+    )
+    tenant.create(connection, checkfirst=True)
+    for table in ('todo', 'todo_tombstone'):
+        if 'owner_id' not in _columns(connection, table):
+            connection.execute(text(f'ALTER TABLE {table} ADD COLUMN owner_id INTEGER'))
+    for name in ('ix_todo_completed_id', 'ix_todo_task_id', 'ix_todo_revision_id',
+                 'ix_todo_tombstone_revision_todo_id'):
+        connection.execute(text(f'DROP INDEX IF EXISTS {name}'))
+    todo = Table('todo', MetaData(), autoload_with=connection)
+    todo_tombstone = Table('todo_tombstone', MetaData(), autoload_with=connection)
+    existing = {index['name'] for table in ('todo', 'todo_tombstone') for index in inspect(connection).get_indexes(table)}
+    for index in (
+        Index('ix_todo_owner_id_id', todo.c.owner_id, todo.c.id),
+        Index('ix_todo_owner_completed_id', todo.c.owner_id, todo.c.completed, todo.c.id),
+        Index('ix_todo_owner_task_id', todo.c.owner_id, todo.c.task, todo.c.id),
+        Index('ix_todo_owner_revision_id', todo.c.owner_id, todo.c.revision, todo.c.id),
+        Index('ix_todo_tombstone_owner_revision_todo_id',
+              todo_tombstone.c.owner_id, todo_tombstone.c.revision, todo_tombstone.c.todo_id),
+    ):
+        if index.name not in existing:
+            index.create(connection)
+
+
+def drop_tenants(connection):
+    for name in ('ix_todo_owner_id_id', 'ix_todo_owner_completed_id', 'ix_todo_owner_task_id',
+                 'ix_todo_owner_revision_id', 'ix_todo_tombstone_owner_revision_todo_id'):
+        connection.execute(text(f'DROP INDEX IF EXISTS {name}'))
+    connection.execute(text('ALTER TABLE todo_tombstone DROP COLUMN owner_id'))
+    connection.execute(text('ALTER TABLE todo DROP COLUMN owner_id'))
+    connection.execute(text('DROP TABLE IF EXISTS tenant'))
+    todo = Table('todo', MetaData(), autoload_with=connection)
+    todo_tombstone = Table('todo_tombstone', MetaData(), autoload_with=connection)
+    Index('ix_todo_completed_id', todo.c.completed, todo.c.id).create(connection)
+    Index('ix_todo_task_id', todo.c.task, todo.c.id).create(connection)
+    Index('ix_todo_revision_id', todo.c.revision, todo.c.id).create(connection)
+    Index('ix_todo_tombstone_revision_todo_id', todo_tombstone.c.revision, todo_tombstone.c.todo_id).create(connection)
+
+
+def create_jobs(connection):
+    """Persistent queue of background jobs (see jobs.py)."""
+    job = Table(
+        'job', MetaData(),
+        Column('id', Integer, primary_key=True),
+        Column('kind', String(50), nullable=False),
+        Column('owner_id', Integer),
+        Column('shard', String(20)),
+        Column('params', JSON),
+        Column('status', String(20), nullable=False),
+        Column('attempts', Integer, nullable=False),
+        Column('max_attempts', Integer, nullable=False),
+        Column('progress', Integer, nullable=False),
+        Column('total', Integer),
+        Column('result', JSON),
+        Column('error', Text),
+        Column('created_at', DateTime, nullable=False),
+        Column('run_after', DateTime, nullable=False),
+        Column('started_at', DateTime),
+        Column('heartbeat_at', DateTime),
+        Column('finished_at', DateTime),
+        Index('ix_job_status_run_after_id', 'status', 'run_after', 'id'),
+    )
+    job.create(connection, checkfirst=True)
+
+
+def drop_jobs(connection):
+    connection.execute(text('DROP TABLE IF EXISTS job'))
+
+
+def create_todo_archive(connection):
+    """Cold table that archived todos move to, keeping the todo table small."""
+    todo_archive = Table(
+        'todo_archive', MetaData(),
+        Column('id', Integer, primary_key=True),
+        Column('todo_id', Integer, nullable=False),
+        Column('task', String(200), nullable=False),
+        Column('completed', Boolean),
+        Column('owner_id', Integer),
+        Column('version', Integer, nullable=False),
+        Column('revision', Integer, nullable=False),
+        Column('archived_at', DateTime, nullable=False),
+        Index('ix_todo_archive_todo_id', 'todo_id'),
+        Index('ix_todo_archive_owner_id_todo_id', 'owner_id', 'todo_id'),
+    )
+    todo_archive.create(connection, checkfirst=True)
+
+
+def drop_todo_archive(connection):
+    connection.execute(text('DROP TABLE IF EXISTS todo_archive'))
+
+
+MIGRATIONS = [
+    (1, 'create_todo', create_todo, drop_todo),
+    (2, 'add_todo_version', add_todo_version, drop_todo_version),
+    (3, 'create_todo_meta', create_todo_meta, drop_todo_meta),
+    (4, 'add_todo_list_indexes', add_todo_list_indexes, drop_todo_list_indexes),
+    (5, 'create_todo_search', create_todo_search, drop_todo_search),
+    (6, 'add_todo_revisions', add_todo_revisions, drop_todo_revisions),
+    (7, 'add_tenants', add_tenants, drop_tenants),
+    (8, 'create_jobs', create_jobs, drop_jobs),
+    (9, 'create_todo_archive', create_todo_archive, drop_todo_archive),
+]
+
+
+def current_version(connection):
+    if not inspect(connection).has_table('schema_migrations'):
+        return 0
+    return connection.execute(select(schema_migrations.c.version).order_by(
+        schema_migrations.c.version.desc()).limit(1)).scalar() or 0
+
+
+def upgrade(engine, target=None):
+    """Apply pending migrations up to target (default: latest) and return their names."""
+    with engine.begin() as connection:
+        schema_migrations.create(connection, checkfirst=True)
+    applied = []
+    for version, name, migrate, _ in MIGRATIONS:
+        if target is not None and version > target:
+            break
+        with engine.begin() as connection:
+            if current_version(connection) >= version:
+                continue
+            migrate(connection)
+            connection.execute(schema_migrations.insert().values(
+                version=version, name=name, applied_at=datetime.now(timezone.utc)))
+        applied.append(name)
+    return applied
+
+
+def downgrade(engine, target=0):
+    """Revert applied migrations down to target and return their names.
+
+    Reverting everything (target=0) also drops the migration history.
+    """
+    reverted = []
+    for version, name, _, revert in reversed(MIGRATIONS):
+        if version <= target:
+            break
+        with engine.begin() as connection:
+            if current_version(connection) < version:
+                continue
+            revert(connection)
+            connection.execute(schema_migrations.delete().where(schema_migrations.c.version == version))
+        reverted.append(name)
+    if target == 0:
+        with engine.begin() as connection:
+            schema_migrations.drop(connection, checkfirst=True)
+    return reverted
@@ -0,0 +1,170 @@
+import sqlalchemy as sa
+from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+
+
+class ShardSession(Session):
+    """Session that sends todo queries to the shard engine named in ``info['shard']``.
+
+    With ``DB_SHARDS`` each tenant's todos live in their own SQLite file
+    (see storage.py). The store sets the shard for the request; tenants and
+    jobs themselves always stay in the main database.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        shard = self.info.get('shard')
+        if bind is None and shard is not None and not (mapper is not None and sa.inspect(mapper).class_ in (Tenant, Job)):
+            bind = self._db.engines[shard]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': ShardSession})
+
+def todo_etag(todo_id, version):
+    return f'todo-{todo_id}-v{version}'
+
+class Tenant(db.Model):
+    """A user or organisation owning todos, authenticated by an API key."""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    # SHA-256 of the API key; the key itself is only shown once
+    api_key_hash = db.Column(db.String(64), nullable=False, unique=True)
+    # Number of the database file holding the tenant's todos (0 is the main database)
+    shard = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    created_at = db.Column(db.DateTime, nullable=False)
+
+class TodoMeta(db.Model):
+    """Single-row table holding the change counter of the whole todo collection."""
+    __tablename__ = 'todo_meta'
+    id = db.Column(db.Integer, primary_key=True)
+    change_counter = db.Column(db.Integer, nullable=False, default=0)
+    # Tombstones up to this revision have been compacted away
+    pruned_revision = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+def current_revision():
+    """SQL expression for the change counter, the revision of rows written in this transaction.
+
+    The store bumps the counter before a transaction writes any todo, so
+    every row written by one transaction gets the same, newest revision.
+    """
+    return db.select(TodoMeta.change_counter).where(TodoMeta.id == 1).scalar_subquery()
+
+# Todo Model
+class Todo(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    task = db.Column(db.String(200), nullable=False)
+    completed = db.Column(db.Boolean, default=False)
+    # Tenant the todo belongs to; NULL for the anonymous list
+    owner_id = db.Column(db.Integer, nullable=True)
+    # Incremented by SQLAlchemy on every ORM update; backs ETags and If-Match
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    # Change counter value of the last transaction that wrote the row; backs /todos/changes
+    revision = db.Column(db.Integer, nullable=False, default=current_revision(), onupdate=current_revision(),
+                         server_default='0')
+
+    __mapper_args__ = {'version_id_col': version}
+    # Every query is scoped to one owner, so the owner leads each index
+    __table_args__ = (
+        # Serve a tenant's list in id order as an index range scan
+        db.Index('ix_todo_owner_id_id', 'owner_id', 'id'),
+        # Serve completed filters and sorts in id order as index range scans
+        db.Index('ix_todo_owner_completed_id', 'owner_id', 'completed', 'id'),
+        # Serve task prefix filters and task sorts, with id as the keyset tiebreaker
+        db.Index('ix_todo_owner_task_id', 'owner_id', 'task', 'id'),
+        # Serve changes-since queries as index range scans
+        db.Index('ix_todo_owner_revision_id', 'owner_id', 'revision', 'id'),
+    )
+
+    @property
+    def etag(self):
+        return todo_etag(self.id, self.version)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'task': self.task,
+            'completed': self.completed
+        }
+
+
+class TodoTombstone(db.Model):
+    """Record of a deleted todo, kept until compaction so delta sync clients learn of the delete."""
+    __tablename__ = 'todo_tombstone'
+    id = db.Column(db.Integer, primary_key=True)
+    todo_id = db.Column(db.Integer, nullable=False)
+    owner_id = db.Column(db.Integer, nullable=True)
+    revision = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_todo_tombstone_owner_revision_todo_id', 'owner_id', 'revision', 'todo_id'),
+    )
+
+
+class TodoArchive(db.Model):
+    """Cold storage for archived todos, moved out of the todo table by the archive-completed job."""
+    __tablename__ = 'todo_archive'
+    id = db.Column(db.Integer, primary_key=True)
+    # The id the todo had in the todo table. SQLite reuses the ids of deleted
+    # rows, so a todo id can be archived more than once.
+    todo_id = db.Column(db.Integer, nullable=False)
+    task = db.Column(db.String(200), nullable=False)
+    completed = db.Column(db.Boolean)
+    owner_id = db.Column(db.Integer, nullable=True)
+    version = db.Column(db.Integer, nullable=False)
+    revision = db.Column(db.Integer, nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_todo_archive_todo_id', 'todo_id'),
+        db.Index('ix_todo_archive_owner_id_todo_id', 'owner_id', 'todo_id'),
+    )
+
+
+class Job(db.Model):
+    """Deferred work run by the background job workers (see jobs.py)."""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    # Tenant the job acts for, and the shard holding its todos
+    owner_id = db.Column(db.Integer, nullable=True)
+    shard = db.Column(db.String(20), nullable=True)
+    params = db.Column(db.JSON, nullable=True)
+    # queued, running, succeeded or failed
+    status = db.Column(db.String(20), nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=True)
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    # A queued job is not run before this time; retries wait here
+    run_after = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    # Refreshed while the job runs, so jobs of a dead worker can be taken over
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # Serve the workers' search for the next runnable job
+        db.Index('ix_job_status_run_after_id', 'status', 'run_after', 'id'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'total': self.total,
+            'attempts': self.attempts,
+            'result': self.result,
+            'error': self.error,
+            'created_at': _isoformat(self.created_at),
+            'finished_at': _isoformat(self.finished_at),
+        }
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
@@ -0,0 +1,183 @@
+"""Cached readiness probe behind ``GET /readyz``.
+
+``GET /livez`` only shows that the process answers requests and does no
+I/O. ``GET /readyz`` tells a load balancer or orchestrator whether this
+replica should get traffic. Probes from many replicas every few seconds
+would add database load, and would queue behind writers exactly when the
+database is struggling, so ``/readyz`` never touches the database. A
+background thread measures it every ``READINESS_REFRESH_INTERVAL`` seconds
+and each probe reads the last result. An interval of 0 measures on every
+probe instead.
+
+A refresh measures:
+
+* ``database``: a read from the read pool, and how long it took.
+* ``pool_saturation``: the share of pooled connections in use, averaged
+  over samples taken through the interval (see ``TodoStore.pool_usage``).
+* ``write_lock_wait_ms``: how long it takes to get the lock writers queue
+  on (see ``TodoStore.write_lock_wait``).
+* ``disk_free_mb``: free space on the disk of an SQLite database.
+* ``replication_lag_seconds``: how far a PostgreSQL read replica is behind.
+
+Measurements that do not apply to the storage backend are left out. The
+replica is ready while each is within its ``READINESS_*`` threshold, so it
+sheds load before it falls over. A result older than a few intervals fails
+too, as the refresh itself is stuck.
+"""
+import operator
+import threading
+import time
+from collections import deque
+
+# Pool usage is sampled this many times per refresh interval
+POOL_SAMPLES = 5
+# A result is stale once it is this many intervals old
+STALE_AFTER_INTERVALS = 3
+
+# name: (measurement, config key of the threshold, comparison the value must pass)
+LIMITS = {
+    'pool_saturation': ('_pool_saturation', 'READINESS_MAX_POOL_SATURATION', operator.le),
+    'write_lock_wait_ms': ('_write_lock_wait_ms', 'READINESS_MAX_WRITE_LOCK_WAIT_MS', operator.le),
+    'disk_free_mb': ('_disk_free_mb', 'READINESS_MIN_DISK_FREE_MB', operator.ge),
+    'replication_lag_seconds': ('_replication_lag', 'READINESS_MAX_REPLICATION_LAG', operator.le),
+}
+
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 3)
+
+
+class ReadinessProbe:
+    """Measures the database of app in the background and keeps the last result."""
+
+    def __init__(self, app, store):
+        self.app = app
+        self.store = store
+        self.refreshes = 0
+        self._start_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.result = None
+        self._refreshed = threading.Event()
+        self._stopped = threading.Event()
+        self._samples = deque(maxlen=POOL_SAMPLES)
+        self._thread = None
+
+    def restart_after_fork(self):
+        # Threads do not survive fork(), and the master's result describes its own pools
+        self._start_lock = threading.Lock()
+        self._reset()
+
+    def start(self):
+        """Start refreshing in the background, once per process."""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='readiness-probe', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._start_lock:
+            thread = self._thread
+            self._stopped.set()
+        if thread is not None:
+            thread.join()
+        self._reset()
+
+    def status(self):
+        """Return (ready, report) from the last result, without I/O once the first one exists."""
+        interval = self.app.config['READINESS_REFRESH_INTERVAL']
+        if interval <= 0:
+            result = self.refresh()
+        else:
+            if self._thread is None:
+                self.start()
+            self._refreshed.wait(STALE_AFTER_INTERVALS * interval)
+            result = self.result
+        if result is None:
+            return False, {'status': 'not ready', 'checks': {}, 'failing': ['stale'], 'age_seconds': None}
+        age = time.monotonic() - result['checked_at']
+        failing = list(result['failing'])
+        if 0 < interval * STALE_AFTER_INTERVALS < age:
+            failing.append('stale')
+        report = {
+            'status': 'not ready' if failing else 'ready',
+            'checks': result['checks'],
+            'failing': failing,
+            'age_seconds': round(age, 3),
+        }
+        return not failing, report
+
+    def refresh(self):
+        """Measure the database now, keep the result and return it."""
+        checks = {}
+        with self.app.app_context():
+            self._sample_pools()
+            started = time.perf_counter()
+            try:
+                self.store.ping()
+            except Exception as e:
+                self.app.logger.error('Readiness probe failed: %s', e)
+                checks['database'] = {'ok': False, 'error': str(e)}
+            else:
+                checks['database'] = {'ok': True, 'latency_ms': _elapsed_ms(started)}
+                for name, (measure, threshold_key, passes) in LIMITS.items():
+                    threshold = self.app.config[threshold_key]
+                    try:
+                        value = getattr(self, measure)()
+                    except Exception as e:
+                        self.app.logger.error('Readiness probe could not measure %s: %s', name, e)
+                        checks[name] = {'ok': False, 'error': str(e)}
+                        continue
+                    if value is not None:
+                        checks[name] = {'ok': passes(value, threshold), 'value': value, 'threshold': threshold}
+        result = {
+            'checks': checks,
+            'failing': [name for name, check in checks.items() if not check['ok']],
+            'checked_at': time.monotonic(),
+        }
+        self.result = result
+        self.refreshes += 1
+        self._refreshed.set()
+        return result
+
+    def _run(self):
+        tick = 0
+        while True:
+            try:
+                if tick % POOL_SAMPLES == 0:
+                    self.refresh()
+                else:
+                    with self.app.app_context():
+                        self._sample_pools()
+            except Exception:
+                self.app.logger.exception('Readiness probe failed')
+            tick += 1
+            if self._stopped.wait(self.app.config['READINESS_REFRESH_INTERVAL'] / POOL_SAMPLES):
+                return
+
+    # Measurements, run in an app context
+
+    def _sample_pools(self):
+        usage = self.store.pool_usage().values()
+        if usage:
+            self._samples.append(max(in_use / capacity for in_use, capacity in usage))
+
+    def _pool_saturation(self):
+        if not self._samples:
+            return None
+        return round(sum(self._samples) / len(self._samples), 3)
+
+    def _write_lock_wait_ms(self):
+        # Waiting twice the threshold is enough to know the check fails
+        timeout = 2 * self.app.config['READINESS_MAX_WRITE_LOCK_WAIT_MS'] / 1000
+        wait = self.store.write_lock_wait(timeout)
+        return round(wait * 1000, 3) if wait is not None else None
+
+    def _disk_free_mb(self):
+        free = self.store.disk_free()
+        return free // (1024 * 1024) if free is not None else None
+
+    def _replication_lag(self):
+        lag = self.store.replication_lag()
+        return round(lag, 3) if lag is not None else None
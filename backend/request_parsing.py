@@ -0,0 +1,144 @@
+"""Request parsing and validation shared by both API variants.
+
+Nothing here depends on the web framework: functions take plain mappings
+and header values, so app.py (Flask) and asgi_app.py (Starlette) accept and
+reject exactly the same requests with the same messages.
+"""
+import base64
+import json
+
+from storage import SORT_COLUMNS
+
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+
+def collection_etag(change_counter, owner_id=None):
+    # Change counters are per shard, so a tenant's ETag names the tenant too
+    if owner_id is not None:
+        return f'todos-t{owner_id}-c{change_counter}'
+    return f'todos-c{change_counter}'
+
+
+def parse_positive_int(name, value):
+    """Parse an optional positive integer query parameter."""
+    if value is None:
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be a positive integer")
+    if number < 1:
+        raise ValueError(f"'{name}' must be a positive integer")
+    return number
+
+
+def parse_bool(name, value):
+    """Parse an optional true/false query parameter."""
+    if value is None:
+        return None
+    if value.lower() in ('true', '1'):
+        return True
+    if value.lower() in ('false', '0'):
+        return False
+    raise ValueError(f"'{name}' must be true or false")
+
+
+def encode_cursor(sort, todo):
+    """Return the next-page cursor for the last todo of a page.
+
+    Id-sorted pages keep using the plain id; other sorts need the sort value
+    too, packed into an opaque token.
+    """
+    if sort == 'id':
+        return str(todo.id)
+    payload = json.dumps([getattr(todo, sort), todo.id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(sort, value):
+    if value is None:
+        return None
+    if sort == 'id':
+        return parse_positive_int('after', value)
+    try:
+        sort_value, todo_id = json.loads(base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("'after' is not a valid cursor")
+    return sort_value, todo_id
+
+
+def format_change_token(revision, todo_id=None):
+    """Return the GET /todos/changes token for a (revision, id) position.
+
+    A bare revision means every change up to and including it was
+    delivered; a page that ends inside a revision adds the last id.
+    """
+    return str(revision) if todo_id is None else f'{revision}-{todo_id}'
+
+
+def parse_change_token(value):
+    """Parse a change token into a (revision, id or None) position."""
+    if value is None:
+        return None
+    revision, separator, todo_id = value.partition('-')
+    if not revision.isdigit() or (separator and not todo_id.isdigit()):
+        raise ValueError("'since' is not a valid change token")
+    return int(revision), int(todo_id) if separator else None
+
+
+def parse_list_params(args):
+    """Parse the filter, sort and pagination query parameters of GET /todos."""
+    sort = args.get('sort', 'id')
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"'sort' must be one of: {', '.join(SORT_COLUMNS)}")
+    order = args.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        raise ValueError("'order' must be asc or desc")
+    return {
+        'completed': parse_bool('completed', args.get('completed')),
+        'prefix': args.get('prefix') or None,
+        'contains': args.get('contains') or None,
+        'sort': sort,
+        'order': order,
+        'after': decode_cursor(sort, args.get('after')),
+        'limit': parse_positive_int('limit', args.get('limit')),
+    }
+
+
+def parse_stream_format(args, best_accept):
+    """Return the streaming format asked for via ?stream= or the best Accept match, if any."""
+    stream = args.get('stream')
+    if stream is not None:
+        if stream not in STREAM_FORMATS:
+            raise ValueError(f"'stream' must be one of: {', '.join(STREAM_FORMATS)}")
+        return stream
+    if best_accept == STREAM_FORMATS['ndjson']:
+        return 'ndjson'
+    return None
+
+
+def validate_todo_input(data):
+    """Return an error message if data is not a valid new todo, else None."""
+    if not data:
+        return "No data provided"
+    if not isinstance(data, dict) or 'task' not in data:
+        return "Task field is required"
+    if not isinstance(data['task'], str) or not data['task'].strip():
+        return "Task must be a non-empty string"
+    if 'completed' in data and not isinstance(data['completed'], bool):
+        return "Completed must be a boolean"
+    return None
+
+
+def validate_todo_update(data):
+    """Return an error message if data is not a valid todo update, else None."""
+    if not isinstance(data, dict):
+        return "Update must be an object"
+    if 'task' in data and (not isinstance(data['task'], str) or not data['task'].strip()):
+        return "Task must be a non-empty string"
+    if 'completed' in data and not isinstance(data['completed'], bool):
+        return "Completed must be a boolean"
+    return None
@@ -0,0 +1,193 @@
+"""Snapshot export and import of a tenant's todos.
+
+``GET /todos/export`` streams every todo of the caller, and
+``POST /todos/import`` loads such a snapshot back in one transaction. The
+``export-todos`` and ``import-todos`` commands do the same from the command
+line. Both directions work on batches of ``SNAPSHOT_BATCH_SIZE`` rows, so
+memory stays bounded by the batch size rather than the snapshot size.
+
+Two formats are available:
+
+* ``ndjson`` - one ``{"completed", "id", "task"}`` object per line, the
+  lines ``GET /todos?stream=ndjson`` sends. Easy to produce and inspect.
+* ``columnar`` - a compact binary format. After the 8 byte ``TODOCOL1``
+  magic come frames of up to one batch each: a little-endian ``<II`` header
+  holding the row count and the payload size, then the zlib-compressed
+  columns of the batch - the ids as deltas (int64), the UTF-8 byte length of
+  each task (uint32), one completed byte per row and the task bytes laid
+  end to end. A frame of zero rows ends the snapshot, so a truncated upload
+  is rejected instead of imported in part.
+
+Readers yield lists of ``(task, completed)`` rows, validated like the body
+of ``POST /todos``. Ids are kept in a snapshot for reference only: imported
+todos get new ids, in snapshot order, as ids are unique across tenants.
+"""
+import json
+import struct
+import sys
+import zlib
+from array import array
+from itertools import islice
+
+from request_parsing import validate_todo_input
+
+try:
+    import orjson
+except ImportError:  # Optional speedup
+    orjson = None
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'columnar': 'application/vnd.todo-columnar',
+}
+
+MAGIC = b'TODOCOL1'
+FRAME_HEADER = struct.Struct('<II')
+# Limits on what a reader accepts, so a hostile snapshot cannot exhaust memory
+MAX_FRAME_ROWS = 1_000_000
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+MAX_LINE_BYTES = 64 * 1024
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+
+class SnapshotError(ValueError):
+    """Raised for a snapshot that is malformed or holds an invalid todo."""
+
+
+def parse_format(value, media_type=None):
+    """Return the snapshot format called value, else the one of media_type, else ndjson."""
+    if value is None:
+        return next((name for name, known in FORMATS.items() if known == media_type), 'ndjson')
+    if value not in FORMATS:
+        raise ValueError(f"'format' must be one of: {', '.join(FORMATS)}")
+    return value
+
+
+def _little_endian(column):
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column
+
+
+# Writing
+
+def write_snapshot(snapshot_format, batches, encoder):
+    """Encode lists of (id, task, completed) rows as a snapshot, yielding one chunk per batch."""
+    if snapshot_format == 'ndjson':
+        for rows in batches:
+            yield encoder.ndjson(rows)
+        return
+    yield MAGIC
+    for rows in batches:
+        if rows:
+            yield encode_frame(rows)
+    yield FRAME_HEADER.pack(0, 0)
+
+
+def encode_frame(rows):
+    """Encode (id, task, completed) rows as one columnar frame."""
+    ids = array('q')
+    previous = 0
+    for todo_id, _, _ in rows:
+        ids.append(todo_id - previous)
+        previous = todo_id
+    tasks = [task.encode('utf-8') for _, task, _ in rows]
+    lengths = array('I', map(len, tasks))
+    completed = bytes(bool(row[2]) for row in rows)
+    body = b''.join((_little_endian(ids).tobytes(), _little_endian(lengths).tobytes(), completed, *tasks))
+    # Level 1: the columns compress well already, and exports are streamed as they are encoded
+    payload = zlib.compress(body, 1)
+    return FRAME_HEADER.pack(len(rows), len(payload)) + payload
+
+
+# Reading
+
+def read_snapshot(snapshot_format, stream, batch_size):
+    """Yield lists of at most batch_size (task, completed) rows read from the binary stream."""
+    rows = _ndjson_rows(stream) if snapshot_format == 'ndjson' else _columnar_rows(stream)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _validated(item, where):
+    error = validate_todo_input(item)
+    if error:
+        raise SnapshotError(f'{where}: {error}')
+    return item['task'], item.get('completed', False)
+
+
+def _ndjson_rows(stream):
+    number = 0
+    while True:
+        line = stream.readline(MAX_LINE_BYTES)
+        if not line:
+            return
+        number += 1
+        if len(line) == MAX_LINE_BYTES and not line.endswith(b'\n'):
+            raise SnapshotError(f'Line {number}: longer than {MAX_LINE_BYTES} bytes')
+        if not line.strip():
+            continue
+        try:
+            item = _loads(line)
+        except ValueError:
+            raise SnapshotError(f'Line {number}: not valid JSON')
+        yield _validated(item, f'Line {number}')
+
+
+def _read_exactly(stream, size):
+    chunks = []
+    while size:
+        chunk = stream.read(size)
+        if not chunk:
+            raise SnapshotError('Snapshot is truncated')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _columnar_rows(stream):
+    if _read_exactly(stream, len(MAGIC)) != MAGIC:
+        raise SnapshotError('Not a columnar todo snapshot')
+    number = 0
+    while True:
+        count, size = FRAME_HEADER.unpack(_read_exactly(stream, FRAME_HEADER.size))
+        if count == 0:
+            return
+        if count > MAX_FRAME_ROWS or size > MAX_FRAME_BYTES:
+            raise SnapshotError(f'Frame of {count} rows and {size} bytes exceeds the limits')
+        for task, completed in _decode_frame(count, _read_exactly(stream, size)):
+            number += 1
+            yield _validated({'task': task, 'completed': completed}, f'Row {number}')
+
+
+def _decode_frame(count, payload):
+    """Return the (task, completed) rows of a frame; its ids are not needed."""
+    decompressor = zlib.decompressobj()
+    try:
+        body = decompressor.decompress(payload, MAX_FRAME_BYTES)
+    except zlib.error:
+        raise SnapshotError('Frame is corrupt')
+    lengths_at, completed_at = 8 * count, 12 * count
+    tasks_at = completed_at + count
+    if decompressor.unconsumed_tail or not decompressor.eof or len(body) < tasks_at:
+        raise SnapshotError('Frame is corrupt')
+    lengths = array('I')
+    lengths.frombytes(body[lengths_at:completed_at])
+    _little_endian(lengths)
+    completed = body[completed_at:tasks_at]
+    if tasks_at + sum(lengths) != len(body) or max(completed) > 1:
+        raise SnapshotError('Frame is corrupt')
+    rows = []
+    position = tasks_at
+    for length, done in zip(lengths, completed):
+        try:
+            task = body[position:position + length].decode('utf-8')
+        except UnicodeDecodeError:
+            raise SnapshotError('Frame holds a task that is not UTF-8')
+        rows.append((task, bool(done)))
+        position += length
+    return rows
@@ -0,0 +1,890 @@
+"""Todo persistence behind a storage interface.
+
+``TodoStore`` holds every query the API runs against the todo tables. The
+backends share the SQLAlchemy code and differ in how they configure and
+reach the database:
+
+* ``SQLiteTodoStore`` - a single database file tuned by a storage profile,
+  with a writer pool and a read-only pool (see storage_profiles.py).
+* ``ServerTodoStore`` - a client/server database such as PostgreSQL, with a
+  sized connection pool and an optional read replica.
+
+``create_store()`` picks the backend from the ``DATABASE_URL`` scheme.
+
+Todos belong to an owner, the id of a tenant or None for the anonymous
+list, and every query is scoped to one owner. With ``DB_SHARDS`` the
+SQLite backend keeps each tenant's todos in one of several database files,
+so tenants on different files do not wait on each other's write lock.
+"""
+import os
+import shutil
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import DateTime, delete, event, exists, func, insert, literal, select, text, tuple_, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.pool import QueuePool
+
+import migrations
+import storage_profiles
+from models import Tenant, Todo, TodoArchive, TodoMeta, TodoTombstone, current_revision
+
+
+# Columns GET /todos can sort by
+SORT_COLUMNS = {'id': Todo.id, 'task': Todo.task, 'completed': Todo.completed}
+
+
+class ConflictError(Exception):
+    """Raised when a todo changed between being read and being written."""
+
+
+class TodoStore:
+    """Storage interface for todos, implemented on Flask-SQLAlchemy.
+
+    Reads go through ``read_bind()`` so a backend can serve them from a
+    separate pool. Every committed transaction that changed todos bumps the
+    collection change counter and is reported to the listeners registered
+    with ``on_commit`` as ``listener(changed_ids, everything, shard)``.
+
+    ``select_shard()`` picks the database of the tenant being served for
+    the rest of the session; None is the main database.
+    """
+
+    name = None
+    shards = 1
+
+    def __init__(self, db):
+        self.db = db
+        self._commit_listeners = []
+
+    def configure(self, app):
+        """Set engine options in app.config before the engines are created."""
+
+    def init_engines(self, app):
+        """Hook run once the engines exist."""
+
+    def settings(self):
+        """Describe the active configuration for /health."""
+        return {"dialect": self.db.engine.dialect.name}
+
+    def read_bind(self):
+        """bind_arguments that route a read query to the read pool, if any."""
+        shard = self.db.session.info.get('shard')
+        engine = self.db.engines.get(f'{shard}-reader' if shard else 'reader')
+        return {'bind': engine} if engine is not None else None
+
+    def migrate(self):
+        return migrations.upgrade(self.db.engine)
+
+    # Tenants and shards
+
+    def shard_names(self):
+        """Return the name of every shard, None being the main database."""
+        return [None]
+
+    def shard_name(self, number):
+        return f'shard{number}' if number else None
+
+    def select_shard(self, shard):
+        """Send the todo queries of the current session to shard."""
+        self.db.session.info['shard'] = shard
+
+    def create_tenant(self, name, api_key_hash):
+        """Create a tenant on the next shard in turn and return it."""
+        session = self.db.session
+        tenant = Tenant(name=name, api_key_hash=api_key_hash, created_at=datetime.now(timezone.utc))
+        session.add(tenant)
+        session.flush()
+        tenant.shard = tenant.id % self.shards
+        session.commit()
+        return tenant
+
+    def find_tenant(self, api_key_hash):
+        """Return the (id, shard name) of the tenant with this API key hash, or None."""
+        # Tenants live in the main database, whichever shard the session uses
+        engine = self.db.engines.get('reader')
+        row = self.db.session.execute(
+            select(Tenant.id, Tenant.shard).where(Tenant.api_key_hash == api_key_hash),
+            bind_arguments={'bind': engine} if engine is not None else None,
+        ).one_or_none()
+        return (row.id, self.shard_name(row.shard)) if row is not None else None
+
+    def warm_up(self):
+        """Run the common reads and a rolled back write once.
+
+        This configures the mappers and fills the engines' compiled statement
+        caches, so the first requests do not pay for it. On PostgreSQL the
+        write uses up one id of the todo sequence.
+        """
+        self.change_counter()
+        self.list_rows(limit=1)
+        self.get(0)
+        self.get_validators(0)
+        self.find_tenant('')
+        session = self.begin_group()
+        try:
+            todo = self.create('Warm-up')
+            self.update(todo, {'completed': True})
+            self.delete(todo)
+        finally:
+            self.end_group()
+            session.rollback()
+
+    # Reads
+
+    def ping(self):
+        self.db.session.execute(select(Todo.id).limit(1), bind_arguments=self.read_bind())
+
+    def change_counter(self):
+        """Return the collection change counter without touching the todo table."""
+        return self.db.session.execute(
+            select(TodoMeta.change_counter).where(TodoMeta.id == 1), bind_arguments=self.read_bind()
+        ).scalar() or 0
+
+    def get(self, todo_id, owner_id=None):
+        todo = self.db.session.get(Todo, todo_id, bind_arguments=self.read_bind())
+        return todo if todo is not None and todo.owner_id == owner_id else None
+
+    def get_validators(self, todo_id, owner_id=None):
+        """Return the (version, revision) of a todo, which change on every write to it, or None."""
+        return self.db.session.execute(
+            select(Todo.version, Todo.revision).where(Todo.id == todo_id, Todo.owner_id == owner_id),
+            bind_arguments=self.read_bind(),
+        ).one_or_none()
+
+    def build_list_query(self, *entities, owner_id=None, completed=None, prefix=None, contains=None,
+                         sort='id', order='asc', after=None, limit=None):
+        """Build a filtered, sorted keyset query over the todos of owner_id.
+
+        ``after`` is the cursor of the last row already returned: an id when
+        sorting by id, else a ``(sort value, id)`` pair. Every sort is
+        tiebroken on id so the order is total and each page resumes exactly
+        where the previous one ended, using the (owner, id),
+        (owner, completed, id) and (owner, task, id) indexes.
+        """
+        column = SORT_COLUMNS[sort]
+        descending = order == 'desc'
+        query = select(*entities).where(Todo.owner_id == owner_id)
+        if completed is not None:
+            query = query.where(Todo.completed == completed)
+        if prefix:
+            query = query.where(*self._prefix_conditions(prefix))
+        if contains:
+            query = query.where(Todo.task.icontains(contains, autoescape=True))
+        if after is not None:
+            key = Todo.id if sort == 'id' else tuple_(column, Todo.id)
+            query = query.where(key < after if descending else key > after)
+        ordering = [column, Todo.id] if sort != 'id' else [Todo.id]
+        query = query.order_by(*(col.desc() if descending else col.asc() for col in ordering))
+        if limit is not None:
+            query = query.limit(limit)
+        return query
+
+    def _prefix_conditions(self, prefix):
+        """Return the conditions matching tasks that start with prefix, case-sensitively."""
+        # The range lets the (task, id) index serve the match; LIKE keeps it
+        # exact. The range assumes tasks sort by code point, as SQLite's
+        # default BINARY collation does.
+        conditions = [Todo.task >= prefix, _starts_with(prefix)]
+        if ord(prefix[-1]) < 0x10FFFF:
+            conditions.append(Todo.task < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+        return conditions
+
+    def list_rows(self, after=None, limit=None, **filters):
+        """Return a page of todos as (id, task, completed) rows; see build_list_query for the filters.
+
+        The list endpoints only serialize the columns, so no ORM objects are
+        hydrated.
+        """
+        query = self.build_list_query(Todo.id, Todo.task, Todo.completed, after=after, limit=limit, **filters)
+        return self.db.session.execute(query, bind_arguments=self.read_bind()).all()
+
+    def iter_row_batches(self, after=None, batch_size=1000, **filters):
+        """Yield lists of (id, task, completed) rows from a server-side cursor.
+
+        Only plain column tuples are fetched, so no ORM objects are built and
+        memory stays bounded by the batch size regardless of table size. They
+        come straight from a Core connection, skipping the ORM's per-row
+        result processing, which dominates the cost of large exports.
+        """
+        query = self.build_list_query(Todo.id, Todo.task, Todo.completed, after=after, **filters)
+        connection = self.db.session.connection(bind_arguments=self.read_bind())
+        yield from connection.execute(query.execution_options(yield_per=batch_size)).partitions()
+
+    def list_changes(self, since=None, limit=1000, owner_id=None):
+        """Return up to limit todos and deletes of owner_id after position since, in (revision, id) order.
+
+        ``since`` is a ``(revision, id)`` position from a change token; an id
+        of None means every change of that revision was delivered. Changed
+        todos come back as dicts with their revision, deletes as
+        ``{'id', 'revision', 'deleted': True}`` from the tombstones. Without
+        since, every todo is returned and no tombstones.
+        """
+        todos = select(Todo.id, Todo.task, Todo.completed, Todo.revision).where(Todo.owner_id == owner_id)
+        if since is not None:
+            todos = todos.where(self._after_position(Todo.revision, Todo.id, since))
+        todos = todos.order_by(Todo.revision, Todo.id).limit(limit)
+        changes = [
+            {'id': row.id, 'task': row.task, 'completed': row.completed, 'revision': row.revision}
+            for row in self.db.session.execute(todos, bind_arguments=self.read_bind())
+        ]
+        if since is None:
+            return changes
+        tombstones = select(TodoTombstone.todo_id, TodoTombstone.revision).where(
+            TodoTombstone.owner_id == owner_id,
+            self._after_position(TodoTombstone.revision, TodoTombstone.todo_id, since),
+            # A todo whose id was reused is reported by its current row instead
+            ~exists().where(Todo.id == TodoTombstone.todo_id),
+        ).order_by(TodoTombstone.revision, TodoTombstone.todo_id).limit(limit)
+        changes.extend(
+            {'id': row.todo_id, 'revision': row.revision, 'deleted': True}
+            for row in self.db.session.execute(tombstones, bind_arguments=self.read_bind())
+        )
+        changes.sort(key=lambda change: (change['revision'], change['id']))
+        return changes[:limit]
+
+    @staticmethod
+    def _after_position(revision_column, id_column, since):
+        revision, todo_id = since
+        if todo_id is None:
+            return revision_column > revision
+        return tuple_(revision_column, id_column) > (revision, todo_id)
+
+    def pruned_revision(self):
+        """Return the revision up to which tombstones have been compacted."""
+        return self.db.session.execute(
+            select(TodoMeta.pruned_revision).where(TodoMeta.id == 1), bind_arguments=self.read_bind()
+        ).scalar() or 0
+
+    def search(self, q, limit, offset=0, owner_id=None):
+        """Return the todos of owner_id matching q as dicts with a highlight and a relevance score.
+
+        The generic implementation is an unindexed substring scan; backends
+        override it with their full-text index.
+        """
+        terms = q.split()
+        query = select(Todo.id, Todo.task, Todo.completed).where(Todo.owner_id == owner_id).order_by(Todo.id)
+        for term in terms:
+            query = query.where(Todo.task.icontains(term, autoescape=True))
+        rows = self.db.session.execute(query.limit(limit).offset(offset), bind_arguments=self.read_bind())
+        return [dict(row._mapping, highlight=row.task, score=0.0) for row in rows]
+
+    def search_index_pending(self):
+        """Return how many existing todos the full-text index has yet to cover."""
+        return 0
+
+    def backfill_search_index(self, batch_size):
+        """Index the next batch of rows that predate the index; True once done."""
+        return True
+
+    def reset_search_index(self):
+        """Queue every existing todo for re-indexing by the backfill."""
+
+    # Readiness (see readiness.py)
+
+    def pool_usage(self):
+        """Return {engine name: (connections checked out, pool capacity)} of the bounded pools."""
+        usage = {}
+        for name, engine in self.db.engines.items():
+            pool = engine.pool
+            # QueuePool has no public accessor for max_overflow; -1 means unbounded
+            if isinstance(pool, QueuePool) and pool._max_overflow >= 0:
+                usage[name or 'default'] = (pool.checkedout(), pool.size() + pool._max_overflow)
+        return usage
+
+    def write_lock_wait(self, timeout):
+        """Return the seconds it takes to get the write lock, or None where it is not measured.
+
+        Waits of more than timeout seconds are given up and reported as
+        they stand.
+        """
+        return None
+
+    def disk_free(self):
+        """Return the free bytes on the database's disk, or None where it is not known."""
+        return None
+
+    def replication_lag(self):
+        """Return the seconds the read replica is behind, or None without one."""
+        return None
+
+    # Writes
+
+    def get_for_update(self, todo_id, owner_id=None):
+        """Load a todo through the writer session so it can be changed."""
+        todo = self.db.session.get(Todo, todo_id)
+        return todo if todo is not None and todo.owner_id == owner_id else None
+
+    def create(self, task, completed=False, owner_id=None):
+        todo = Todo(task=task, completed=completed, owner_id=owner_id)
+        self.db.session.add(todo)
+        self._commit()
+        return todo
+
+    def update(self, todo, changes):
+        for key, value in changes.items():
+            setattr(todo, key, value)
+        self._commit()
+        return todo
+
+    def delete(self, todo):
+        self.db.session.delete(todo)
+        self._commit()
+
+    def bulk_create(self, rows, owner_id=None):
+        """Insert rows for owner_id with one executemany INSERT and a single commit."""
+        created = self.db.session.execute(
+            insert(Todo).returning(Todo.id, Todo.task, Todo.completed, sort_by_parameter_order=True),
+            [dict(row, owner_id=owner_id) for row in rows],
+        ).all()
+        self.db.session.commit()
+        return [{'id': row.id, 'task': row.task, 'completed': row.completed} for row in created]
+
+    def import_rows(self, batches, owner_id=None):
+        """Insert lists of (task, completed) rows for owner_id, all in one transaction.
+
+        Each batch is one executemany INSERT that returns nothing, so memory
+        stays bounded by the batch size. An error in any batch, including one
+        raised while reading it, rolls back the whole import. Returns the
+        number of todos imported.
+        """
+        session = self.db.session
+        imported = 0
+        try:
+            # Core INSERTs skip the ORM's per-row work and its change tracking,
+            # so the import records its change the way an ORM bulk INSERT would
+            self._bump_change_counter(session)
+            session.info.setdefault('todo_changes', set())
+            with self._bulk_load(session):
+                for rows in batches:
+                    session.execute(Todo.__table__.insert(), [
+                        {'task': task, 'completed': completed, 'owner_id': owner_id} for task, completed in rows
+                    ])
+                    imported += len(rows)
+            session.commit()
+        except BaseException:
+            session.rollback()
+            raise
+        return imported
+
+    @contextmanager
+    def _bulk_load(self, session):
+        """Wrap the inserts of an import, for backends that defer per-row work until after them."""
+        yield
+
+    def bulk_update(self, items, owner_id=None):
+        """Apply partial updates keyed by id to the todos of owner_id in one transaction.
+
+        Returns the resulting todos by id; ids that do not exist are absent.
+        """
+        session = self.db.session
+        ids = {item['id'] for item in items}
+        versions = dict(session.execute(
+            select(Todo.id, Todo.version).where(Todo.id.in_(ids), Todo.owner_id == owner_id)
+        ).all())
+        rows = {}
+        for item in items:
+            if item['id'] in versions and len(item) > 1:
+                # Later items for the same id override earlier ones
+                row = rows.setdefault(item['id'], {'id': item['id'], 'version': versions[item['id']]})
+                row.update((key, item[key]) for key in ('task', 'completed') if key in item)
+        if rows:
+            # ORM bulk UPDATE by primary key runs as executemany statements and
+            # bumps each row's version, matching what a single update does
+            try:
+                session.execute(update(Todo), list(rows.values()))
+            except StaleDataError:
+                # A row changed after its version was read
+                session.rollback()
+                raise ConflictError()
+        self._commit()
+        return {
+            row.id: {'id': row.id, 'task': row.task, 'completed': row.completed}
+            for row in session.execute(
+                select(Todo.id, Todo.task, Todo.completed).where(Todo.id.in_(versions))
+            )
+        }
+
+    def bulk_delete(self, ids, owner_id=None):
+        """Delete the given ids of owner_id in one transaction and return those that existed."""
+        session = self.db.session
+        existing = set(session.scalars(select(Todo.id).where(Todo.id.in_(ids), Todo.owner_id == owner_id)))
+        if existing:
+            session.execute(delete(Todo).where(Todo.id.in_(existing)))
+        session.commit()
+        return existing
+
+    def compact_tombstones(self, older_than):
+        """Delete the tombstones of todos deleted before older_than and return how many went.
+
+        Tokens from before the newest pruned revision can no longer be
+        served, as their client may have missed one of the pruned deletes.
+        """
+        session = self.db.session
+        pruned = session.execute(
+            select(func.max(TodoTombstone.revision)).where(TodoTombstone.deleted_at < older_than)
+        ).scalar()
+        if pruned is None:
+            return 0
+        meta = TodoMeta.__table__
+        # Every remaining tombstone is newer than the previous prune, so this only moves forward
+        session.execute(meta.update().where(meta.c.id == 1).values(pruned_revision=pruned))
+        count = session.execute(delete(TodoTombstone).where(TodoTombstone.revision <= pruned)).rowcount
+        session.commit()
+        return count
+
+    def count_completed(self, owner_id=None):
+        completed = self.build_list_query(Todo.id, owner_id=owner_id, completed=True).subquery()
+        return self.db.session.execute(select(func.count()).select_from(completed)).scalar()
+
+    def archive_completed(self, owner_id=None, batch_size=1000):
+        """Move up to batch_size completed todos of owner_id to todo_archive in one transaction.
+
+        Returns the ids moved. Removing them from the todo table records
+        tombstones and invalidates caches like any other bulk delete.
+        """
+        session = self.db.session
+        ids = session.scalars(self.build_list_query(Todo.id, owner_id=owner_id, completed=True, limit=batch_size)).all()
+        if ids:
+            archived_at = literal(datetime.now(timezone.utc), DateTime)
+            session.execute(insert(TodoArchive).from_select(
+                ['todo_id', 'task', 'completed', 'owner_id', 'version', 'revision', 'archived_at'],
+                select(Todo.id, Todo.task, Todo.completed, Todo.owner_id, Todo.version, Todo.revision, archived_at)
+                .where(Todo.id.in_(ids)),
+            ))
+            session.execute(delete(Todo).where(Todo.id.in_(ids)))
+        session.commit()
+        return ids
+
+    def _commit(self):
+        session = self.db.session
+        try:
+            if session.info.get('group_commit'):
+                # Committed together with the rest of the group (see group_commit.py)
+                session.flush()
+            else:
+                session.commit()
+        except StaleDataError:
+            # Another transaction updated the row after it was loaded; in a
+            # group commit only the write's savepoint is rolled back
+            if not session.info.get('group_commit'):
+                session.rollback()
+            raise ConflictError()
+
+    def begin_group(self):
+        """Start the transaction of a group commit and return its session."""
+        session = self.db.session
+        session.info['group_commit'] = True
+        # Writing before the first savepoint makes the transaction real: SQLite's
+        # driver would otherwise let releasing that savepoint commit on its own
+        self._bump_change_counter(session)
+        return session
+
+    def end_group(self):
+        self.db.session.info.pop('group_commit', None)
+
+    # Change tracking
+
+    def on_commit(self, listener):
+        self._commit_listeners.append(listener)
+
+    def install_change_tracking(self, app):
+        """Track changed todo ids on the sessions of app and report them after commit."""
+        session = self.db.session
+        for name, handler in (
+            ('before_flush', self._track_pending_flush),
+            ('after_flush', self._track_flush),
+            ('do_orm_execute', self._track_bulk_statement),
+            ('after_commit', self._notify_commit),
+            ('after_rollback', self._discard_changes),
+        ):
+            event.listen(session, name, self._for_app(app, handler))
+
+    @staticmethod
+    def _for_app(app, handler):
+        # Every app built on the models' db shares its session events, so a
+        # store only follows the sessions of the app it belongs to
+        def listener(*args):
+            if current_app._get_current_object() is app:
+                handler(*args)
+        return listener
+
+    def _track_pending_flush(self, session, flush_context, instances):
+        """Bump the counter before todos are written, so they get the new revision."""
+        if not any(isinstance(obj, Todo) for obj in (*session.new, *session.dirty, *session.deleted)):
+            return
+        self._bump_change_counter(session)
+        deleted = [obj.id for obj in session.deleted if isinstance(obj, Todo)]
+        if deleted:
+            self._record_tombstones(session, Todo.id.in_(deleted))
+
+    def _track_flush(self, session, flush_context):
+        ids = {obj.id for obj in (*session.new, *session.dirty, *session.deleted) if isinstance(obj, Todo)}
+        if ids:
+            session.info.setdefault('todo_changes', set()).update(ids)
+            self._bump_change_counter(session)
+
+    def _track_bulk_statement(self, orm_execute_state):
+        if orm_execute_state.is_select or orm_execute_state.bind_mapper is not Todo.__mapper__:
+            return
+        session = orm_execute_state.session
+        changed = session.info.setdefault('todo_changes', set())
+        self._bump_change_counter(session)
+        if orm_execute_state.is_delete:
+            self._record_tombstones(session, orm_execute_state.statement.whereclause)
+        if orm_execute_state.is_insert:
+            return  # New rows only affect list responses
+        params = orm_execute_state.parameters
+        if isinstance(params, list) and all('id' in row for row in params):
+            changed.update(row['id'] for row in params)  # Bulk UPDATE by primary key
+        else:
+            session.info['todo_changes_all'] = True
+
+    def _bump_change_counter(self, session):
+        """Increment the collection change counter once per transaction."""
+        if session.info.get('todo_counter_bumped'):
+            return
+        session.info['todo_counter_bumped'] = True
+        meta = TodoMeta.__table__
+        connection = session.connection()
+        result = connection.execute(
+            meta.update().where(meta.c.id == 1).values(change_counter=meta.c.change_counter + 1)
+        )
+        if result.rowcount == 0:
+            connection.execute(meta.insert().values(id=1, change_counter=1))
+
+    def _record_tombstones(self, session, condition):
+        """Record tombstones for the todos matching condition, before they are deleted."""
+        rows = select(Todo.id, Todo.owner_id, current_revision(), literal(datetime.now(timezone.utc), DateTime))
+        if condition is not None:
+            rows = rows.where(condition)
+        session.connection().execute(
+            insert(TodoTombstone).from_select(['todo_id', 'owner_id', 'revision', 'deleted_at'], rows)
+        )
+
+    def _notify_commit(self, session):
+        session.info.pop('todo_counter_bumped', None)
+        changed = session.info.pop('todo_changes', None)
+        everything = session.info.pop('todo_changes_all', False)
+        if changed is not None or everything:
+            for listener in self._commit_listeners:
+                listener(changed or set(), everything, session.info.get('shard'))
+
+    def _discard_changes(self, session):
+        # The rollback may have undone the counter bump, so the next write bumps it again
+        session.info.pop('todo_counter_bumped', None)
+        if session.in_nested_transaction():
+            return  # Only a savepoint; the writes before it still commit
+        session.info.pop('todo_changes', None)
+        session.info.pop('todo_changes_all', None)
+
+
+class SQLiteTodoStore(TodoStore):
+    """SQLite backend tuned by a storage profile (see storage_profiles.py)."""
+
+    name = 'sqlite'
+
+    def __init__(self, db):
+        super().__init__(db)
+        self.profile, self.profile_settings = storage_profiles.load_profile()
+        self.db_file = None
+
+    def configure(self, app):
+        self.db_file = storage_profiles.sqlite_file_path(app.config['SQLALCHEMY_DATABASE_URI'], app.instance_path)
+        if not self.db_file:
+            return  # In-memory databases keep Flask-SQLAlchemy's single static connection
+        self.shards = int(os.environ.get('DB_SHARDS', 1))
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = storage_profiles.engine_options(self.profile_settings)
+        read_pool = os.environ.get('DB_READ_POOL', 'true').lower() == 'true'
+        binds = {}
+        if read_pool:
+            binds['reader'] = storage_profiles.reader_bind(self.db_file, self.profile_settings)
+        for number in range(1, self.shards):
+            # Each shard is a database file of its own, with its own pools and write lock
+            shard, path = self.shard_name(number), shard_file_path(self.db_file, number)
+            binds[shard] = dict(storage_profiles.engine_options(self.profile_settings), url=f'sqlite:///{path}')
+            if read_pool:
+                binds[f'{shard}-reader'] = storage_profiles.reader_bind(path, self.profile_settings)
+        if binds:
+            app.config['SQLALCHEMY_BINDS'] = binds
+
+    def init_engines(self, app):
+        if not self.db_file:
+            return
+        with app.app_context():
+            for name, engine in self.db.engines.items():
+                read_only = name is not None and name.endswith('reader')
+                storage_profiles.install_pragmas(engine, self.profile_settings, read_only=read_only)
+
+    def shard_names(self):
+        return [self.shard_name(number) for number in range(self.shards)]
+
+    def migrate(self):
+        applied = super().migrate()
+        for shard in self.shard_names()[1:]:
+            migrations.upgrade(self.db.engines[shard])
+        return applied
+
+    def pool_usage(self):
+        usage = super().pool_usage()
+        # Writers queue on the writer pool by design (see storage_profiles.py); their
+        # wait is write_lock_wait(). Without a read pool, reads share the writer pool.
+        readers = {name: value for name, value in usage.items() if name.endswith('reader')}
+        return readers or usage
+
+    def write_lock_wait(self, timeout):
+        """Time BEGIN IMMEDIATE on each database file, from a connection outside the pools."""
+        if not self.db_file:
+            return None
+        waits = []
+        for number in range(self.shards):
+            path = shard_file_path(self.db_file, number) if number else self.db_file
+            connection = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+            try:
+                started = time.perf_counter()
+                try:
+                    connection.execute('BEGIN IMMEDIATE')
+                    connection.execute('ROLLBACK')
+                except sqlite3.OperationalError as e:
+                    if 'locked' not in str(e):
+                        raise
+                waits.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+        return max(waits)
+
+    def disk_free(self):
+        if not self.db_file:
+            return None
+        return shutil.disk_usage(os.path.dirname(self.db_file)).free
+
+    def settings(self):
+        if not self.db_file:
+            return {"dialect": "sqlite", "profile": None}
+        return {
+            "dialect": "sqlite",
+            "profile": self.profile,
+            "pragmas": {name: self.profile_settings[name] for name in storage_profiles.PRAGMAS},
+            "writer_pool_size": self.profile_settings['writer_pool_size'],
+            "read_pool_size": self.profile_settings['read_pool_size'] if 'reader' in self.db.engines else None,
+            "shards": self.shards,
+        }
+
+
+    def search(self, q, limit, offset=0, owner_id=None):
+        match = fts5_query(q)
+        if not match:
+            return []
+        rows = self.db.session.execute(text(
+            "SELECT todo.id, todo.task, todo.completed, "
+            "highlight(todo_fts, 0, '<mark>', '</mark>') AS highlight, bm25(todo_fts) AS rank "
+            "FROM todo_fts JOIN todo ON todo.id = todo_fts.rowid "
+            "WHERE todo_fts MATCH :match AND todo.owner_id IS :owner_id "
+            "ORDER BY rank, todo.id LIMIT :limit OFFSET :offset"
+        ), {'match': match, 'owner_id': owner_id, 'limit': limit, 'offset': offset},
+            bind_arguments=self.read_bind())
+        # bm25() is lower-is-better; flip it so higher scores rank first
+        return [
+            {'id': row.id, 'task': row.task, 'completed': bool(row.completed),
+             'highlight': row.highlight, 'score': -row.rank}
+            for row in rows
+        ]
+
+    def search_index_pending(self):
+        state = self.db.session.execute(text(
+            'SELECT backfill_cursor, backfill_target FROM todo_search_state WHERE id = 1'
+        ), bind_arguments=self.read_bind()).one_or_none()
+        if state is None or state.backfill_cursor >= state.backfill_target:
+            return 0
+        return self.db.session.execute(text(
+            'SELECT COUNT(*) FROM todo WHERE id > :cursor AND id <= :target'
+        ), {'cursor': state.backfill_cursor, 'target': state.backfill_target},
+            bind_arguments=self.read_bind()).scalar()
+
+    def backfill_search_index(self, batch_size):
+        """Index the next batch_size pre-existing rows in one short transaction."""
+        session = self.db.session
+        state = session.execute(text(
+            'SELECT backfill_cursor, backfill_target FROM todo_search_state WHERE id = 1'
+        )).one_or_none()
+        if state is None or state.backfill_cursor >= state.backfill_target:
+            return True
+        last_id = session.execute(text(
+            'SELECT MAX(id) FROM (SELECT id FROM todo WHERE id > :cursor AND id <= :target '
+            'ORDER BY id LIMIT :batch_size)'
+        ), {'cursor': state.backfill_cursor, 'target': state.backfill_target, 'batch_size': batch_size}).scalar()
+        if last_id is None:
+            last_id = state.backfill_target
+        else:
+            # REPLACE keeps rows the triggers indexed meanwhile consistent
+            session.execute(text(
+                'INSERT OR REPLACE INTO todo_fts (rowid, task) '
+                'SELECT id, task FROM todo WHERE id > :cursor AND id <= :last_id'
+            ), {'cursor': state.backfill_cursor, 'last_id': last_id})
+        # MAX() keeps the cursor monotonic when several workers backfill at once
+        session.execute(text(
+            'UPDATE todo_search_state SET backfill_cursor = MAX(backfill_cursor, :last_id) WHERE id = 1'
+        ), {'last_id': last_id})
+        session.commit()
+        return last_id >= state.backfill_target
+
+    @contextmanager
+    def _bulk_load(self, session):
+        """Leave the full-text indexing of imported todos to the search backfill.
+
+        The insert trigger would index the todos one row at a time inside the
+        import. It is dropped for the import's transaction instead, and the
+        backfill target moved past the new rows, so the backfill indexes them
+        in batches afterwards. A rolled back import restores the trigger.
+        """
+        trigger = session.execute(text(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'todo_fts_insert'"
+        )).scalar()
+        if trigger is None:
+            yield
+            return
+        # The change counter is written already, so the DROP joins the open transaction
+        session.execute(text('DROP TRIGGER todo_fts_insert'))
+        yield
+        session.execute(text(trigger))
+        session.execute(text(
+            'UPDATE todo_search_state SET backfill_target = (SELECT COALESCE(MAX(id), 0) FROM todo) WHERE id = 1'
+        ))
+
+    def reset_search_index(self):
+        """Queue every existing todo for re-indexing by the backfill."""
+        session = self.db.session
+        session.execute(text(
+            'UPDATE todo_search_state SET backfill_cursor = 0, '
+            'backfill_target = (SELECT COALESCE(MAX(id), 0) FROM todo) WHERE id = 1'
+        ))
+        session.commit()
+
+
+def _starts_with(prefix):
+    escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return Todo.task.like(escaped + '%', escape='\\')
+
+
+def shard_file_path(db_file, number):
+    """Return the path of shard number next to the main database file: todos.db -> todos.shard1.db."""
+    root, ext = os.path.splitext(db_file)
+    return f'{root}.shard{number}{ext}'
+
+
+def fts5_query(q):
+    """Turn free text into a safe FTS5 query.
+
+    Every word becomes a quoted phrase so FTS5 operators in user input are
+    matched literally; words are ANDed and the last one matches as a prefix
+    for search-as-you-type.
+    """
+    terms = ['"' + term.replace('"', '""') + '"' for term in q.split()]
+    if not terms:
+        return ''
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+class ServerTodoStore(TodoStore):
+    """Client/server database backend (PostgreSQL or compatible).
+
+    Any number of processes and nodes can share the database. Reads go to
+    ``DATABASE_READ_URL`` when a read replica is configured.
+    """
+
+    name = 'server'
+
+    def __init__(self, db):
+        super().__init__(db)
+        self.pool_size = int(os.environ.get('DB_POOL_SIZE', 10))
+        self.max_overflow = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+
+    def configure(self, app):
+        options = {
+            'pool_size': self.pool_size,
+            'max_overflow': self.max_overflow,
+            'pool_pre_ping': True,
+            'pool_recycle': 1800,
+        }
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+        read_url = os.environ.get('DATABASE_READ_URL')
+        if read_url:
+            app.config['SQLALCHEMY_BINDS'] = {'reader': dict(options, url=normalize_url(read_url))}
+
+    def search(self, q, limit, offset=0, owner_id=None):
+        if self.db.engine.dialect.name != 'postgresql':
+            return super().search(q, limit, offset, owner_id)
+        # Served by the ix_todo_task_fts GIN expression index
+        rows = self.db.session.execute(text(
+            "SELECT id, task, completed, "
+            "ts_headline('simple', task, query, 'StartSel=<mark>, StopSel=</mark>, HighlightAll=true') AS highlight, "
+            "ts_rank(to_tsvector('simple', task), query) AS score "
+            "FROM todo, plainto_tsquery('simple', :q) AS query "
+            "WHERE to_tsvector('simple', task) @@ query AND owner_id IS NOT DISTINCT FROM :owner_id "
+            "ORDER BY score DESC, id LIMIT :limit OFFSET :offset"
+        ), {'q': q, 'owner_id': owner_id, 'limit': limit, 'offset': offset}, bind_arguments=self.read_bind())
+        return [dict(row._mapping, score=float(row.score)) for row in rows]
+
+    def _prefix_conditions(self, prefix):
+        # A range would follow the database collation, which need not sort by
+        # code point (PostgreSQL's en_US.UTF-8 ignores case and punctuation
+        # at first) and could drop matching tasks; LIKE compares exactly
+        return [_starts_with(prefix)]
+
+    def write_lock_wait(self, timeout):
+        """Time locking the change counter row, which every committing write updates."""
+        if self.db.engine.dialect.name != 'postgresql':
+            return None
+        with self.db.engine.connect() as connection:
+            connection.execute(select(func.set_config('lock_timeout', f'{int(timeout * 1000)}ms', True)))
+            started = time.perf_counter()
+            try:
+                connection.execute(select(TodoMeta.id).where(TodoMeta.id == 1).with_for_update())
+            except OperationalError as e:
+                if getattr(e.orig, 'pgcode', None) != '55P03':  # lock_not_available
+                    raise
+            wait = time.perf_counter() - started
+            connection.rollback()
+        return wait
+
+    def replication_lag(self):
+        engine = self.db.engines.get('reader')
+        if engine is None or engine.dialect.name != 'postgresql':
+            return None
+        # A replica that has replayed everything it received is not behind, however old its last write
+        return float(self.db.session.execute(text(
+            "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+            "THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+        ), bind_arguments={'bind': engine}).scalar() or 0)
+
+    def settings(self):
+        return {
+            "dialect": self.db.engine.dialect.name,
+            "pool_size": self.pool_size,
+            "max_overflow": self.max_overflow,
+            "read_replica": 'reader' in self.db.engines,
+        }
+
+
+def normalize_url(url):
+    # Hosting providers commonly hand out postgres:// URLs, which SQLAlchemy no longer accepts
+    if url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def create_store(app, db):
+    """Configure db for app.config['SQLALCHEMY_DATABASE_URI'] and return its store."""
+    url = normalize_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    store = SQLiteTodoStore(db) if url.startswith('sqlite') else ServerTodoStore(db)
+    store.configure(app)
+    db.init_app(app)
+    store.init_engines(app)
+    store.install_change_tracking(app)
+    return store
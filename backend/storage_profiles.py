@@ -0,0 +1,113 @@
+"""SQLite tuning profiles.
+
+A profile bundles the PRAGMAs applied to every new SQLite connection with the
+connection pool sizes. ``DB_PROFILE`` selects one per environment and the
+individual ``DB_*`` variables override single values.
+
+With a file database the app runs two pools: a small writer pool (SQLite
+allows a single writer at a time, so writers queue on the pool instead of
+spinning on SQLITE_BUSY) and a larger read-only pool that readers use, so a
+long read never holds a connection a writer needs. In WAL mode readers and
+the writer do not block each other.
+"""
+import os
+
+from sqlalchemy import event
+
+PROFILES = {
+    'production': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -65536,  # 64 MiB (negative values are KiB)
+        'mmap_size': 268435456,  # 256 MiB
+        'busy_timeout': 5000,
+        'temp_store': 'MEMORY',
+        'writer_pool_size': 1,
+        'read_pool_size': 16,
+    },
+    'development': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -16384,
+        'mmap_size': 67108864,
+        'busy_timeout': 5000,
+        'temp_store': 'MEMORY',
+        'writer_pool_size': 1,
+        'read_pool_size': 4,
+    },
+    'testing': {
+        'journal_mode': 'WAL',
+        'synchronous': 'OFF',
+        'cache_size': -2000,
+        'mmap_size': 0,
+        'busy_timeout': 5000,
+        'temp_store': 'MEMORY',
+        'writer_pool_size': 1,
+        'read_pool_size': 4,
+    },
+}
+
+PRAGMAS = ('journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'busy_timeout', 'temp_store')
+
+
+def load_profile(environ=os.environ):
+    """Return the active profile name and settings, applying DB_* overrides."""
+    default = environ.get('FLASK_ENV') if environ.get('FLASK_ENV') in PROFILES else 'production'
+    name = environ.get('DB_PROFILE', default)
+    if name not in PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE '{name}', expected one of: {', '.join(PROFILES)}")
+    settings = dict(PROFILES[name])
+    for key, value in settings.items():
+        override = environ.get(f'DB_{key.upper()}')
+        if override is not None:
+            settings[key] = type(value)(override)
+    return name, settings
+
+
+def sqlite_file_path(uri, instance_path):
+    """Return the absolute path of a file SQLite URI, or None for other databases.
+
+    Relative paths are resolved against the instance folder, as Flask-SQLAlchemy does.
+    """
+    prefix = 'sqlite:///'
+    if not uri.startswith(prefix):
+        return None
+    path = uri[len(prefix):].split('?', 1)[0]
+    if not path or path == ':memory:' or path.startswith('file:'):
+        return None
+    return path if os.path.isabs(path) else os.path.join(instance_path, path)
+
+
+def engine_options(settings):
+    """SQLAlchemy engine options for the writer pool."""
+    return {
+        'pool_size': settings['writer_pool_size'],
+        'max_overflow': 0,
+        'pool_timeout': 30,
+    }
+
+
+def reader_bind(path, settings):
+    """Flask-SQLAlchemy bind config for the read-only pool of a database file."""
+    return {
+        'url': f'sqlite:///file:{path}?mode=ro&uri=true',
+        'pool_size': settings['read_pool_size'],
+        'max_overflow': settings['read_pool_size'],
+        'pool_timeout': 30,
+    }
+
+
+def install_pragmas(engine, settings, read_only=False):
+    """Apply the profile PRAGMAs to every new connection of engine."""
+    pragmas = [
+        (name, settings[name]) for name in PRAGMAS
+        # The journal mode is a property of the database file set by the writer
+        if not (read_only and name == 'journal_mode')
+    ]
+
+    @event.listens_for(engine, 'connect')
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
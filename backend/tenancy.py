@@ -0,0 +1,138 @@
+"""API key authentication and per-tenant rate limiting.
+
+Each tenant owns its own todos and authenticates with an API key, sent as
+``Authorization: Bearer <key>`` or ``X-API-Key: <key>``. Only the SHA-256
+of a key is stored; ``flask --app app create-tenant NAME`` prints a new key
+once. Requests without a key use the anonymous list, unless
+``AUTH_REQUIRED`` is set.
+
+Every tenant (and the anonymous list, as one more tenant) gets a token
+bucket of ``RATE_LIMIT_PER_SECOND`` requests with bursts of up to
+``RATE_LIMIT_BURST``; requests beyond it get 429 with a ``Retry-After``
+header. Buckets live in process memory, so each worker process enforces
+the limit on its own.
+"""
+import hashlib
+import math
+import secrets
+import threading
+import time
+
+from flask import g, jsonify, request
+
+from cache import LRUCache
+
+API_KEY_HEADER = 'X-API-Key'
+# Endpoints served without authentication or rate limiting
+PUBLIC_ENDPOINTS = {'health_check', 'liveness_check', 'readiness_check', 'metrics', 'static'}
+
+
+def generate_api_key():
+    return secrets.token_urlsafe(32)
+
+
+def hash_api_key(api_key):
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+def request_api_key():
+    """Return the API key sent with the current request, or None."""
+    auth = request.headers.get('Authorization', '')
+    scheme, _, token = auth.partition(' ')
+    if scheme.lower() == 'bearer' and token.strip():
+        return token.strip()
+    return request.headers.get(API_KEY_HEADER) or None
+
+
+def current_owner():
+    """Return the tenant id the current request acts for; None for the anonymous list."""
+    return g.get('owner_id')
+
+
+class TokenBucket:
+    """Tokens left in one tenant's bucket and when it was last refilled."""
+
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, burst, now):
+        self.tokens = burst
+        self.updated = now
+
+
+class RateLimiter:
+    """Allow each key rate requests per second on average, in bursts of up to burst."""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        """Take a token from key's bucket; return 0 if allowed, else the seconds until one is available."""
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.burst, now)
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                return 0
+            return (1 - bucket.tokens) / self.rate
+
+
+def init_tenancy(app, store):
+    """Authenticate and rate limit every request to the todo endpoints of app."""
+    # Resolved keys are remembered briefly, so most requests skip the tenant lookup
+    resolved = LRUCache(max_entries=app.config['AUTH_KEY_CACHE_SIZE'], ttl=app.config['AUTH_KEY_CACHE_TTL'])
+    limiter = None
+    if app.config['RATE_LIMIT_PER_SECOND'] > 0:
+        limiter = RateLimiter(app.config['RATE_LIMIT_PER_SECOND'], app.config['RATE_LIMIT_BURST'])
+
+    @app.before_request
+    def authenticate():
+        if request.endpoint in PUBLIC_ENDPOINTS or request.method == 'OPTIONS':
+            return None
+        api_key = request_api_key()
+        owner_id, shard = None, None
+        if api_key is not None:
+            key_hash = hash_api_key(api_key)
+            entry = resolved.get(key_hash)
+            tenant = entry['tenant'] if entry is not None else store.find_tenant(key_hash)
+            if entry is None and tenant is not None:
+                resolved.set(key_hash, {'body': '', 'tenant': tenant})
+            if tenant is None:
+                app.logger.warning('Rejected request with an unknown API key')
+                return _unauthorized('Invalid API key')
+            owner_id, shard = tenant
+        elif app.config['AUTH_REQUIRED']:
+            return _unauthorized('An API key is required')
+
+        if limiter is not None:
+            retry_after = limiter.acquire(owner_id)
+            if retry_after:
+                app.logger.warning('Rate limited tenant %s', owner_id)
+                response = jsonify({"error": "Rate limit exceeded"})
+                response.status_code = 429
+                response.headers['Retry-After'] = str(math.ceil(retry_after))
+                return response
+        g.owner_id = owner_id
+        g.shard = shard
+        store.select_shard(shard)
+        return None
+
+    @app.after_request
+    def vary_on_api_key(response):
+        # Responses differ per tenant, so shared caches must key them by the credentials
+        response.vary.update(('Authorization', API_KEY_HEADER))
+        return response
+
+
+def _unauthorized(message):
+    response = jsonify({"error": message})
+    response.status_code = 401
+    response.headers['WWW-Authenticate'] = 'Bearer'
+    return response
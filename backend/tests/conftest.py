@@ -1,10 +1,100 @@
 import sys
 import os
+import tempfile
+import json as jsonlib
+from urllib.parse import urlencode
 import pytest
 
 # Add the project root to the Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from app import app as flask_app, db as sqlalchemy_db
+
+# Point the app at a throwaway database before it is created
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'todos.db')}")
+os.environ.setdefault('DB_PROFILE', 'testing')
+# Keep test runs from writing and rotating the logs of the working tree
+os.environ.setdefault('LOG_DIR', tempfile.mkdtemp())
+from app import create_app, db as sqlalchemy_db, idempotency_store, store, todo_cache
+import migrations
+
+flask_app = create_app({"TESTING": True})
+
+# API_VARIANT=asgi runs the API tests against asgi_app.py instead of app.py
+API_VARIANT = os.environ.get('API_VARIANT', 'flask')
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'flask_only: exercises endpoints or internals only app.py has')
+
+
+def pytest_collection_modifyitems(config, items):
+    if API_VARIANT == 'flask':
+        return
+    skip = pytest.mark.skip(reason=f'not served by the {API_VARIANT} variant')
+    for item in items:
+        if item.get_closest_marker('flask_only'):
+            item.add_marker(skip)
+
+
+class AsgiResponse:
+    """A Starlette test response with the Flask test response attributes the tests use."""
+
+    def __init__(self, response):
+        self.response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.data = response.content
+        self.content_type = response.headers.get('content-type', '')
+        self.mimetype = self.content_type.split(';')[0].strip()
+
+    @property
+    def json(self):
+        return self.response.json() if self.mimetype == 'application/json' else None
+
+    def get_data(self, as_text=False):
+        return self.response.text if as_text else self.data
+
+
+class AsgiClient:
+    """Drive asgi_app.py through the Flask test client's call signature."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def open(self, path, method='GET', data=None, json=None, content_type=None, headers=None,
+             query_string=None):
+        headers = dict(headers or {})
+        if json is not None:
+            data = jsonlib.dumps(json)
+            content_type = content_type or 'application/json'
+        if content_type:
+            headers['Content-Type'] = content_type
+        if query_string:
+            path += '?' + (query_string if isinstance(query_string, str) else urlencode(query_string))
+        return AsgiResponse(self.client.request(method, path, content=data, headers=headers))
+
+    def get(self, path, **kwargs):
+        return self.open(path, 'GET', **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.open(path, 'POST', **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.open(path, 'PUT', **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.open(path, 'PATCH', **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.open(path, 'DELETE', **kwargs)
+
+
+@pytest.fixture(scope='session')
+def asgi_client():
+    """A client for asgi_app.py, kept open so its lifespan runs once."""
+    from starlette.testclient import TestClient
+    from asgi_app import app as asgi_app
+    with TestClient(asgi_app, base_url='http://localhost') as client:
+        yield AsgiClient(client)
 
 @pytest.fixture(autouse=True)
 def app():
@@ -15,22 +105,30 @@ def app():
         "FLASK_ENV": "testing"  # Ensure we're in testing mode
     })
 
-    # Set up the database for each test
+    # Set up the database for each test through the schema migrations
     with flask_app.app_context():
-        sqlalchemy_db.create_all()
+        store.migrate()
         yield flask_app
+        flask_app.extensions['todo_api']['job_queue'].stop()  # Let no job run on the dropped tables
         sqlalchemy_db.session.remove()  # Clear any active sessions
-        sqlalchemy_db.drop_all()  # Drop all tables
+        migrations.downgrade(sqlalchemy_db.engine)  # Drop all tables
+        todo_cache.clear()  # Forget responses cached from the dropped tables
+        idempotency_store.backend.clear()  # Forget responses stored for idempotency keys
+        flask_app.extensions['todo_api']['compressor'].cache.clear()  # And compressed bodies
 
 @pytest.fixture
-def client(app):
-    """Test client fixture."""
+def client(app, request):
+    """Test client fixture for the API variant under test."""
+    if API_VARIANT == 'asgi':
+        return request.getfixturevalue('asgi_client')
     return app.test_client()
 
 @pytest.fixture
 def db(app):
     """Database fixture that ensures empty state."""
-    sqlalchemy_db.session.begin_nested()  # Create a savepoint
+    if API_VARIANT == 'flask':
+        # A savepoint pins SQLite's read snapshot, which would hide the ASGI app's writes
+        sqlalchemy_db.session.begin_nested()  # Create a savepoint
     yield sqlalchemy_db
     sqlalchemy_db.session.rollback()  # Rollback to the savepoint
     sqlalchemy_db.session.remove()  # Remove the session
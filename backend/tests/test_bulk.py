@@ -0,0 +1,68 @@
+import pytest
+from app import Todo
+
+pytestmark = pytest.mark.flask_only
+
+def test_bulk_add_todos(client, db):
+    """Test POST /todos/bulk creates every item in order."""
+    response = client.post('/todos/bulk', json={'todos': [
+        {'task': 'First'},
+        {'task': 'Second', 'completed': True},
+    ]})
+    assert response.status_code == 201
+    results = response.json['results']
+    assert [r['status'] for r in results] == [201, 201]
+    assert [r['todo']['task'] for r in results] == ['First', 'Second']
+    assert results[1]['todo']['completed'] is True
+    assert Todo.query.count() == 2
+
+def test_bulk_add_rejects_whole_batch(client, db):
+    """Test one invalid item rejects the batch and writes nothing."""
+    response = client.post('/todos/bulk', json={'todos': [
+        {'task': 'Valid'},
+        {'task': '   '},
+        {'completed': True},
+    ]})
+    assert response.status_code == 400
+    assert [r['index'] for r in response.json['results']] == [1, 2]
+    assert Todo.query.count() == 0
+
+def test_bulk_add_enforces_max_batch_size(client, app):
+    """Test batches larger than TODOS_BULK_MAX_ITEMS are refused."""
+    app.config['TODOS_BULK_MAX_ITEMS'] = 2
+    try:
+        response = client.post('/todos/bulk', json={'todos': [{'task': 't'}] * 3})
+    finally:
+        app.config['TODOS_BULK_MAX_ITEMS'] = 1000
+    assert response.status_code == 413
+
+def test_bulk_update_todos(client, db):
+    """Test PATCH /todos/bulk updates existing items and reports missing ones."""
+    created = client.post('/todos/bulk', json={'todos': [{'task': 'A'}, {'task': 'B'}]}).json['results']
+    first_id, second_id = (r['todo']['id'] for r in created)
+
+    response = client.patch('/todos/bulk', json={'todos': [
+        {'id': first_id, 'completed': True},
+        {'id': second_id, 'task': 'B2'},
+        {'id': 999, 'task': 'Missing'},
+    ]})
+    assert response.status_code == 200
+    results = response.json['results']
+    assert [r['status'] for r in results] == [200, 200, 404]
+    assert results[0]['todo'] == {'id': first_id, 'task': 'A', 'completed': True}
+    assert results[1]['todo'] == {'id': second_id, 'task': 'B2', 'completed': False}
+
+def test_bulk_delete_todos(client, db):
+    """Test DELETE /todos/bulk removes existing items in one request."""
+    created = client.post('/todos/bulk', json={'todos': [{'task': 'A'}, {'task': 'B'}]}).json['results']
+    ids = [r['todo']['id'] for r in created]
+
+    response = client.delete('/todos/bulk', json={'ids': ids + [999]})
+    assert response.status_code == 200
+    assert [r['status'] for r in response.json['results']] == [204, 204, 404]
+    assert Todo.query.count() == 0
+
+def test_add_todo_rejects_non_boolean_completed(client):
+    """Test POST /todos shares the bulk validation rules."""
+    response = client.post('/todos', json={'task': 'Task', 'completed': 'yes'})
+    assert response.status_code == 400
@@ -0,0 +1,171 @@
+import pytest
+from sqlalchemy import text
+from app import Todo, store, todo_cache
+from cache import LRUCache, RedisCache, TodoCache
+
+def _entry(body):
+    return {'body': body, 'headers': {}}
+
+# Unit tests for the cache backends
+
+def test_lru_cache_evicts_least_recently_used():
+    """Test LRUCache evicts the oldest entry once max_entries is exceeded."""
+    cache = LRUCache(max_entries=2)
+    cache.set('a', _entry('1'))
+    cache.set('b', _entry('2'))
+    cache.get('a')
+    cache.set('c', _entry('3'))
+    assert cache.get('b') is None
+    assert cache.get('a') == _entry('1')
+    assert cache.stats()['evictions'] == 1
+
+def test_lru_cache_evicts_by_size():
+    """Test LRUCache keeps the total body size under max_bytes."""
+    cache = LRUCache(max_bytes=10)
+    cache.set('a', _entry('x' * 6))
+    cache.set('b', _entry('y' * 6))
+    assert cache.get('a') is None
+    assert cache.stats()['bytes'] == 6
+
+def test_lru_cache_expires_entries():
+    """Test LRUCache drops entries older than the TTL."""
+    now = [0.0]
+    cache = LRUCache(ttl=5, clock=lambda: now[0])
+    cache.set('a', _entry('1'))
+    now[0] = 6.0
+    assert cache.get('a') is None
+    assert cache.stats()['expirations'] == 1
+
+def test_todo_cache_skips_set_after_concurrent_invalidation():
+    """Test a read that raced a commit cannot store stale data."""
+    cache = TodoCache(LRUCache())
+    key = cache.todo_key(1)
+    epoch = cache.epoch()
+    cache.invalidate([1])
+    cache.set(key, _entry('stale'), epoch)
+    assert cache.get(key) is None
+
+class FakeRedis:
+    """Local stand-in for a Redis client."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+    def scan_iter(self, match):
+        return [key for key in self.data if key.startswith(match.rstrip('*'))]
+
+def test_redis_cache_round_trip_and_invalidation():
+    """Test TodoCache works unchanged on a Redis-compatible backend."""
+    cache = TodoCache(RedisCache(FakeRedis()))
+    list_key = cache.list_key('all')
+    cache.set(list_key, _entry('[]'), cache.epoch())
+    assert cache.get(list_key) == _entry('[]')
+    cache.invalidate([1])
+    assert cache.get(cache.list_key('all')) is None
+
+def test_redis_epoch_is_shared_between_workers():
+    """Test a read racing another worker's commit cannot store stale data through Redis."""
+    redis = FakeRedis()
+    reader, writer = TodoCache(RedisCache(redis)), TodoCache(RedisCache(redis))
+    key = reader.todo_key(1)
+    epoch = reader.epoch()
+    writer.invalidate([1])
+    reader.set(key, _entry('stale'), epoch)
+    assert reader.get(key) is None
+
+def test_todo_cache_rejects_entries_that_differ_from_expected():
+    """Test get() treats an entry whose validators changed as a miss."""
+    cache = TodoCache(LRUCache())
+    cache.set('todo', dict(_entry('{}'), version=1), cache.epoch())
+    assert cache.get('todo', version=1) is not None
+    assert cache.get('todo', version=2) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+# Integration tests
+
+@pytest.mark.flask_only
+def test_get_todo_served_from_cache(client, db):
+    """Test repeated GET /todos/<id> hits the cache."""
+    todo_id = client.post('/todos', json={'task': 'Cached'}).json['id']
+    client.get(f'/todos/{todo_id}')
+    response = client.get(f'/todos/{todo_id}')
+    assert response.json['task'] == 'Cached'
+    assert client.get('/cache/stats').json['hits'] == 1
+
+@pytest.mark.flask_only
+def test_update_invalidates_cached_todo(client, db):
+    """Test PUT /todos/<id> invalidates the cached item and list."""
+    todo_id = client.post('/todos', json={'task': 'Before'}).json['id']
+    client.get(f'/todos/{todo_id}')
+    client.get('/todos')
+
+    client.put(f'/todos/{todo_id}', json={'task': 'After'})
+    assert client.get(f'/todos/{todo_id}').json['task'] == 'After'
+    assert client.get('/todos').json[0]['task'] == 'After'
+
+@pytest.mark.flask_only
+def test_delete_invalidates_cached_todo(client, db):
+    """Test DELETE /todos/<id> makes the cached item 404."""
+    todo_id = client.post('/todos', json={'task': 'Doomed'}).json['id']
+    client.get(f'/todos/{todo_id}')
+    client.delete(f'/todos/{todo_id}')
+    assert client.get(f'/todos/{todo_id}').status_code == 404
+
+@pytest.mark.flask_only
+def test_bulk_writes_invalidate_cache(client, db):
+    """Test the bulk endpoints invalidate cached items and lists."""
+    ids = [r['todo']['id'] for r in client.post('/todos/bulk', json={'todos': [{'task': 'A'}]}).json['results']]
+    assert len(client.get('/todos').json) == 1
+    client.get(f'/todos/{ids[0]}')
+
+    client.patch('/todos/bulk', json={'todos': [{'id': ids[0], 'task': 'A2'}]})
+    assert client.get(f'/todos/{ids[0]}').json['task'] == 'A2'
+
+    client.delete('/todos/bulk', json={'ids': ids})
+    assert client.get(f'/todos/{ids[0]}').status_code == 404
+    assert client.get('/todos').json == []
+
+@pytest.mark.flask_only
+def test_orm_commit_outside_endpoints_invalidates(client, db):
+    """Test any committed ORM change to a Todo invalidates the cache."""
+    todo_id = client.post('/todos', json={'task': 'Old'}).json['id']
+    client.get(f'/todos/{todo_id}')
+    db.session.get(Todo, todo_id).task = 'New'
+    db.session.commit()
+    assert client.get(f'/todos/{todo_id}').json['task'] == 'New'
+    assert todo_cache.stats()['backend'] == 'memory'
+
+@pytest.mark.flask_only
+def test_write_by_another_process_is_not_served_from_cache(client):
+    """Test cached items and lists are not served once another process changed the todo."""
+    todo_id = client.post('/todos', json={'task': 'Mine'}).json['id']
+    client.get(f'/todos/{todo_id}')
+    client.get('/todos')
+
+    # A write committed outside this process's session, so no invalidation runs here
+    store.db.session.remove()  # Test requests share the session; free the writer
+    with store.db.engine.begin() as connection:
+        connection.execute(text('UPDATE todo_meta SET change_counter = change_counter + 1'))
+        connection.execute(text(
+            "UPDATE todo SET task = 'Theirs', version = version + 1, "
+            'revision = (SELECT change_counter FROM todo_meta) WHERE id = :id'
+        ), {'id': todo_id})
+
+    response = client.get(f'/todos/{todo_id}')
+    assert response.json['task'] == 'Theirs'
+    assert response.headers['ETag'] == f'"todo-{todo_id}-v2"'
+    assert client.get('/todos').json[0]['task'] == 'Theirs'
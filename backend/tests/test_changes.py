@@ -0,0 +1,104 @@
+import os
+import pytest
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, text, tuple_
+from app import Todo
+from models import TodoTombstone
+from request_parsing import parse_change_token
+
+pytestmark = pytest.mark.flask_only
+
+def _changes(client, since=None, **params):
+    if since is not None:
+        params['since'] = since
+    return client.get('/todos/changes', query_string=params)
+
+def test_full_sync_returns_every_todo_and_a_token(client, db):
+    """Test a request without since returns all todos with their revisions."""
+    client.post('/todos/bulk', json={'todos': [{'task': 'A'}, {'task': 'B'}]})
+    client.post('/todos', json={'task': 'C'})
+    response = _changes(client)
+    assert response.status_code == 200
+    assert [(change['task'], change['revision']) for change in response.json['changes']] == [
+        ('A', 1), ('B', 1), ('C', 2)]
+    assert response.json['token'] == '2'
+    assert response.json['has_more'] is False
+
+def test_changes_since_token(client, db):
+    """Test only rows written after the token come back, deletes as tombstones."""
+    second = client.post('/todos', json={'task': 'Drop'}).json['id']
+    first = client.post('/todos', json={'task': 'Keep'}).json['id']
+    token = _changes(client).json['token']
+
+    client.put(f'/todos/{first}', json={'completed': True})
+    client.delete(f'/todos/{second}')
+    third = client.post('/todos/bulk', json={'todos': [{'task': 'New'}]}).json['results'][0]['todo']['id']
+    response = _changes(client, token)
+    assert response.json['changes'] == [
+        {'id': first, 'task': 'Keep', 'completed': True, 'revision': 3},
+        {'id': second, 'revision': 4, 'deleted': True},
+        {'id': third, 'task': 'New', 'completed': False, 'revision': 5},
+    ]
+    assert _changes(client, response.json['token']).json['changes'] == []
+
+def test_bulk_writes_set_revisions_and_tombstones(client, db):
+    """Test bulk updates and deletes are visible to delta sync."""
+    ids = [item['todo']['id'] for item in client.post(
+        '/todos/bulk', json={'todos': [{'task': 'A'}, {'task': 'B'}, {'task': 'C'}]}).json['results']]
+    token = _changes(client).json['token']
+    client.patch('/todos/bulk', json={'todos': [{'id': ids[0], 'task': 'A2'}]})
+    client.delete('/todos/bulk', json={'ids': ids[1:]})
+    changes = _changes(client, token).json['changes']
+    assert changes == [
+        {'id': ids[0], 'task': 'A2', 'completed': False, 'revision': 2},
+        {'id': ids[1], 'revision': 3, 'deleted': True},
+        {'id': ids[2], 'revision': 3, 'deleted': True},
+    ]
+
+def test_changes_page_within_a_revision(client, db):
+    """Test paging through one large transaction resumes at the right row."""
+    client.post('/todos/bulk', json={'todos': [{'task': f'Task {n}'} for n in range(5)]})
+    seen, token = [], '0'
+    while True:
+        response = _changes(client, token, limit=2)
+        seen += [change['task'] for change in response.json['changes']]
+        token = response.json['token']
+        if not response.json['has_more']:
+            break
+    assert seen == [f'Task {n}' for n in range(5)]
+    assert token == '1'
+
+def test_invalid_change_token(client):
+    """Test malformed tokens are rejected."""
+    for token in ('abc', '1-', '-3', '1-x'):
+        assert _changes(client, token).status_code == 400
+    assert parse_change_token('7-3') == (7, 3)
+    assert parse_change_token('7') == (7, None)
+
+def test_compaction_prunes_tombstones_and_expires_old_tokens(client, db, app):
+    """Test compacted tombstones are gone and tokens from before them get 410."""
+    ids = [client.post('/todos', json={'task': task}).json['id'] for task in ('A', 'B')]
+    old_token = _changes(client).json['token']
+    client.delete(f'/todos/{ids[0]}')
+    recent_token = _changes(client).json['token']
+    client.delete(f'/todos/{ids[1]}')
+    db.session.execute(TodoTombstone.__table__.update().where(TodoTombstone.todo_id == ids[0]).values(
+        deleted_at=datetime.now(timezone.utc) - timedelta(days=60)))
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['compact-tombstones'])
+    assert 'Pruned 1 tombstones' in result.output
+    assert db.session.query(TodoTombstone).count() == 1
+    assert _changes(client, old_token).status_code == 410
+    assert _changes(client, recent_token).json['changes'] == [{'id': ids[1], 'revision': 4, 'deleted': True}]
+
+@pytest.mark.skipif(not os.environ['DATABASE_URL'].startswith('sqlite'), reason='Checks SQLite query plans')
+def test_changes_query_uses_revision_index(db):
+    """Test resuming after a change token seeks into the (owner, revision, id) index."""
+    query = select(Todo.id).where(Todo.owner_id == 3, tuple_(Todo.revision, Todo.id) > (5, 1)).order_by(
+        Todo.revision, Todo.id)
+    sql = query.compile(db.engine, compile_kwargs={'literal_binds': True})
+    with db.engine.connect() as connection:
+        plan = ' '.join(row[-1] for row in connection.execute(text(f'EXPLAIN QUERY PLAN {sql}')))
+    assert 'ix_todo_owner_revision_id' in plan
+    assert 'TEMP B-TREE' not in plan
@@ -0,0 +1,82 @@
+import gzip
+import pytest
+from compression import GzipEncoding
+
+GZIP = {'Accept-Encoding': 'gzip'}
+
+def _add_todos(client, count=40):
+    for n in range(count):
+        client.post('/todos', json={'task': f'Todo number {n}, long enough to make the list worth compressing'})
+
+def test_large_list_is_compressed(client):
+    """Test a list above the size threshold is gzipped for clients that accept it."""
+    _add_todos(client)
+    response = client.get('/todos', headers=GZIP)
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+def test_small_and_health_responses_are_not_compressed(client):
+    """Test small bodies and the health check go out uncompressed."""
+    client.post('/todos', json={'task': 'Small'})
+    assert 'Content-Encoding' not in client.get('/todos', headers=GZIP).headers
+    assert 'Content-Encoding' not in client.get('/health', headers=GZIP).headers
+
+@pytest.mark.flask_only
+def test_compressed_list_keeps_body_and_revalidates(client):
+    """Test the gzipped list decodes to the plain one and its own ETag gets a 304."""
+    _add_todos(client)
+    plain = client.get('/todos')
+    assert 'Content-Encoding' not in plain.headers
+    compressed = client.get('/todos', headers=GZIP)
+    assert gzip.decompress(compressed.data) == plain.data
+    assert int(compressed.headers['Content-Length']) == len(compressed.data) < len(plain.data)
+    assert compressed.headers['ETag'] == plain.headers['ETag'][:-1] + '-gzip"'
+
+    revalidated = client.get('/todos', headers={**GZIP, 'If-None-Match': compressed.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert revalidated.headers['ETag'] == compressed.headers['ETag']
+    assert client.get('/todos', headers={'If-None-Match': plain.headers['ETag']}).status_code == 304
+
+@pytest.mark.flask_only
+def test_if_match_accepts_compressed_etag(app, client, monkeypatch):
+    """Test a todo can be updated with the ETag of its compressed representation."""
+    monkeypatch.setitem(app.config, 'COMPRESSION_MIN_SIZE', 0)
+    todo_id = client.post('/todos', json={'task': 'Tiny'}).json['id']
+    etag = client.get(f'/todos/{todo_id}', headers=GZIP).headers['ETag']
+    assert etag.endswith('-gzip"')
+    assert client.put(f'/todos/{todo_id}', json={'completed': True}, headers={'If-Match': etag}).status_code == 200
+    assert client.put(f'/todos/{todo_id}', json={'completed': False}, headers={'If-Match': etag}).status_code == 412
+
+@pytest.mark.flask_only
+def test_stream_is_compressed_per_chunk(app, client, monkeypatch):
+    """Test a streamed list is gzipped as it is sent, one flushed chunk per batch."""
+    _add_todos(client, 5)
+    monkeypatch.setitem(app.config, 'TODOS_STREAM_BATCH_SIZE', 2)
+    response = client.get('/todos?stream=ndjson', headers=GZIP, buffered=False)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    chunks = [chunk for chunk in response.response if chunk]
+    assert len(chunks) == 4  # Three batches, then the gzip trailer
+    assert gzip.decompress(b''.join(chunks)).count(b'\n') == 5
+
+@pytest.mark.flask_only
+def test_compressed_bodies_are_cached(app, client):
+    """Test a hot list is compressed once per version."""
+    compressor = app.extensions['todo_api']['compressor']
+    _add_todos(client)
+    before = compressor.compressions
+    first = client.get('/todos', headers=GZIP)
+    assert client.get('/todos', headers=GZIP).data == first.data
+    assert compressor.compressions == before + 1
+
+    client.post('/todos', json={'task': 'One more'})
+    client.get('/todos', headers=GZIP)
+    assert compressor.compressions == before + 2
+
+def test_gzip_stream_matches_whole_body():
+    """Test the flushed stream decodes to the same bytes as a one-shot compress."""
+    encoding = GzipEncoding()
+    chunks = [b'{"id":1}\n', '{"id":2}\n', b'']
+    assert gzip.decompress(b''.join(encoding.stream(chunks))) == gzip.decompress(encoding.compress(b'{"id":1}\n{"id":2}\n'))
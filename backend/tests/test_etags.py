@@ -0,0 +1,90 @@
+import pytest
+from sqlalchemy import event, text
+from app import Todo
+from models import TodoMeta
+
+def test_get_todo_returns_strong_etag(client, db):
+    """Test GET /todos/<id> sends an ETag derived from the row version."""
+    todo_id = client.post('/todos', json={'task': 'Tagged'}).json['id']
+    response = client.get(f'/todos/{todo_id}')
+    assert response.headers['ETag'] == f'"todo-{todo_id}-v1"'
+
+def test_get_todo_not_modified(client, db):
+    """Test If-None-Match on GET /todos/<id> returns 304 with an empty body."""
+    todo_id = client.post('/todos', json={'task': 'Tagged'}).json['id']
+    etag = client.get(f'/todos/{todo_id}').headers['ETag']
+
+    response = client.get(f'/todos/{todo_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+def test_update_changes_todo_etag(client, db):
+    """Test PUT /todos/<id> bumps the version and therefore the ETag."""
+    todo_id = client.post('/todos', json={'task': 'Tagged'}).json['id']
+    etag = client.get(f'/todos/{todo_id}').headers['ETag']
+    update = client.put(f'/todos/{todo_id}', json={'completed': True})
+    assert update.headers['ETag'] == f'"todo-{todo_id}-v2"'
+
+    response = client.get(f'/todos/{todo_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.json['completed'] is True
+
+def test_collection_not_modified_until_write(client, db):
+    """Test the collection ETag follows the table change counter."""
+    client.post('/todos', json={'task': 'One'})
+    etag = client.get('/todos').headers['ETag']
+
+    assert client.get('/todos', headers={'If-None-Match': etag}).status_code == 304
+    client.post('/todos', json={'task': 'Two'})
+    response = client.get('/todos', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+@pytest.mark.flask_only
+def test_change_counter_bumped_once_per_transaction(client, db):
+    """Test a bulk insert increments the change counter exactly once."""
+    client.post('/todos/bulk', json={'todos': [{'task': 'A'}, {'task': 'B'}]})
+    assert db.session.get(TodoMeta, 1).change_counter == 1
+
+def test_update_with_stale_if_match_fails(client, db):
+    """Test PUT with an outdated If-Match is rejected with 412."""
+    todo_id = client.post('/todos', json={'task': 'Original'}).json['id']
+    etag = client.get(f'/todos/{todo_id}').headers['ETag']
+    client.put(f'/todos/{todo_id}', json={'task': 'First writer'})
+
+    response = client.put(f'/todos/{todo_id}', json={'task': 'Second writer'}, headers={'If-Match': etag})
+    assert response.status_code == 412
+    assert db.session.get(Todo, todo_id).task == 'First writer'
+
+def test_delete_with_matching_if_match(client, db):
+    """Test DELETE succeeds when If-Match matches the current ETag."""
+    todo_id = client.post('/todos', json={'task': 'Doomed'}).json['id']
+    etag = client.get(f'/todos/{todo_id}').headers['ETag']
+
+    response = client.delete(f'/todos/{todo_id}', headers={'If-Match': etag})
+    assert response.status_code == 204
+
+@pytest.mark.flask_only
+def test_bulk_update_bumps_versions(client, db):
+    """Test PATCH /todos/bulk increments the version of each updated row."""
+    todo_id = client.post('/todos', json={'task': 'A'}).json['id']
+    client.patch('/todos/bulk', json={'todos': [{'id': todo_id, 'task': 'B'}]})
+    assert client.get(f'/todos/{todo_id}').headers['ETag'] == f'"todo-{todo_id}-v2"'
+
+@pytest.mark.flask_only
+def test_bulk_update_conflict_returns_412(client, db):
+    """Test PATCH /todos/bulk answers 412 when a row changes between its version read and the UPDATE."""
+    todo_id = client.post('/todos', json={'task': 'A'}).json['id']
+
+    def concurrent_update(orm_execute_state):
+        if orm_execute_state.is_update:
+            orm_execute_state.session.connection().execute(
+                text('UPDATE todo SET version = version + 1 WHERE id = :id'), {'id': todo_id})
+
+    event.listen(db.session, 'do_orm_execute', concurrent_update)
+    try:
+        response = client.patch('/todos/bulk', json={'todos': [{'id': todo_id, 'task': 'B'}]})
+    finally:
+        event.remove(db.session, 'do_orm_execute', concurrent_update)
+    assert response.status_code == 412
+    assert client.get(f'/todos/{todo_id}').json['task'] == 'A'
@@ -0,0 +1,119 @@
+import json
+import pytest
+from change_feed import ChangeFeed
+
+def _parse(chunk):
+    """Return the (id, event, data) of each event in a stream chunk."""
+    events = []
+    for block in chunk.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n') if not line.startswith(':'))
+        if 'event' in fields:
+            events.append((fields['id'], fields['event'], json.loads(fields['data'])))
+    return events
+
+# Unit tests for the change feed
+
+def test_new_stream_starts_with_reset():
+    """Test a client without Last-Event-ID is told to load the list first."""
+    feed = ChangeFeed()
+    feed.publish('create', {'id': 1, 'task': 'Old', 'completed': False})
+    stream = feed.stream(heartbeat=0)
+    assert next(stream) == 'retry: 3000\n\n'
+    assert _parse(next(stream)) == [(feed.event_id(1), 'reset', {})]
+    assert next(stream) == ': keep-alive\n\n'
+
+def test_stream_resumes_after_last_event_id():
+    """Test a reconnecting client gets exactly the events it missed, in order."""
+    feed = ChangeFeed()
+    feed.publish('create', {'id': 1, 'task': 'A', 'completed': False})
+    seen = feed.event_id(1)
+    feed.publish('update', {'id': 1, 'task': 'A', 'completed': True})
+    feed.publish('delete', {'id': 1})
+    stream = feed.stream(seen, heartbeat=0)
+    next(stream)
+    assert [(event, data) for _, event, data in _parse(next(stream))] == [
+        ('update', {'id': 1, 'task': 'A', 'completed': True}),
+        ('delete', {'id': 1}),
+    ]
+
+def test_unresumable_ids_get_reset():
+    """Test evicted, foreign and malformed ids fall back to a reset event."""
+    feed = ChangeFeed(max_events=2)
+    for todo_id in range(1, 5):
+        feed.publish('delete', {'id': todo_id})
+    for last_event_id in (feed.event_id(1), 'deadbeef-3', 'garbage', feed.event_id(99)):
+        assert feed.resume_position(last_event_id) is None
+    assert feed.resume_position(feed.event_id(2)) == 2
+    stream = feed.stream(feed.event_id(1), heartbeat=0)
+    next(stream)
+    assert _parse(next(stream)) == [(feed.event_id(4), 'reset', {})]
+
+def test_slow_client_is_reset_when_log_overflows():
+    """Test a stream that fell behind the bounded log resets instead of skipping events."""
+    feed = ChangeFeed(max_events=2)
+    feed.publish('delete', {'id': 1})
+    stream = feed.stream(feed.event_id(1), heartbeat=0)
+    next(stream)
+    for todo_id in range(2, 6):
+        feed.publish('delete', {'id': todo_id})
+    assert _parse(next(stream)) == [(feed.event_id(5), 'reset', {})]
+
+def test_stream_ends_after_max_duration():
+    """Test a stream stops once its time is up, so the client reconnects and frees the thread."""
+    feed = ChangeFeed()
+    stream = feed.stream(heartbeat=0.01, max_duration=0.05)
+    assert len(list(stream)) >= 2  # retry, reset, then keep-alives until the limit
+
+def test_open_streams_are_capped():
+    """Test no more than max_streams slots are handed out at once."""
+    feed = ChangeFeed(max_streams=2)
+    assert feed.open_stream() and feed.open_stream()
+    assert not feed.open_stream()
+    feed.close_stream()
+    assert feed.open_stream()
+
+# API tests
+
+@pytest.mark.flask_only
+def test_events_endpoint_streams_deltas(client, db):
+    """Test GET /todos/events sends a delta for each write endpoint."""
+    response = client.get('/todos/events', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    chunks = (chunk.decode() for chunk in response.response)
+    try:
+        next(chunks)
+        assert _parse(next(chunks))[0][1] == 'reset'
+
+        todo_id = client.post('/todos', json={'task': 'Live'}).json['id']
+        client.put(f'/todos/{todo_id}', json={'completed': True})
+        client.delete(f'/todos/{todo_id}')
+        bulk = client.post('/todos/bulk', json={'todos': [{'task': 'Bulk'}]}).json['results'][0]['todo']
+        events = []
+        while len(events) < 4:
+            events += [(event, data) for _, event, data in _parse(next(chunks))]
+    finally:
+        response.close()
+    assert events == [
+        ('create', {'id': todo_id, 'task': 'Live', 'completed': False}),
+        ('update', {'id': todo_id, 'task': 'Live', 'completed': True}),
+        ('delete', {'id': todo_id}),
+        ('create', bulk),
+    ]
+
+@pytest.mark.flask_only
+def test_events_endpoint_refuses_streams_beyond_the_cap(app, client, monkeypatch):
+    """Test a stream beyond EVENTS_MAX_STREAMS gets 503 with Retry-After, and closing one frees its slot."""
+    feed = app.extensions['todo_api']['change_feed']
+    monkeypatch.setattr(feed, 'max_streams', 1)
+    first = client.get('/todos/events', buffered=False)
+    try:
+        refused = client.get('/todos/events', buffered=False)
+        assert refused.status_code == 503
+        assert int(refused.headers['Retry-After']) == app.config['EVENTS_MAX_STREAM_SECONDS']
+    finally:
+        first.close()
+    second = client.get('/todos/events', buffered=False)
+    assert second.status_code == 200
+    second.close()
+    assert feed.open_streams == 0
@@ -0,0 +1,94 @@
+import os
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from app import Todo, store
+from storage import ServerTodoStore
+
+requires_sqlite = pytest.mark.skipif(
+    not os.environ['DATABASE_URL'].startswith('sqlite'), reason='Checks SQLite query plans'
+)
+
+def _add_todos(db, *tasks):
+    db.session.add_all([Todo(task=task, completed=completed) for task, completed in tasks])
+    db.session.commit()
+
+def test_filter_by_completed(client, db):
+    """Test GET /todos?completed= returns only matching todos."""
+    _add_todos(db, ('Done', True), ('Open', False), ('Also open', False))
+
+    response = client.get('/todos?completed=false')
+    assert [todo['task'] for todo in response.json] == ['Open', 'Also open']
+    assert client.get('/todos?completed=nope').status_code == 400
+
+def test_filter_by_prefix_is_exact(client, db):
+    """Test the prefix filter is case-sensitive and treats wildcards literally."""
+    _add_todos(db, ('Buy milk', False), ('buy bread', False), ('Build API', False), ('Buy_ink', False))
+
+    assert [t['task'] for t in client.get('/todos?prefix=Buy').json] == ['Buy milk', 'Buy_ink']
+    assert [t['task'] for t in client.get('/todos?prefix=Buy_').json] == ['Buy_ink']
+
+def test_server_prefix_filter_ignores_collation_order(db):
+    """Test the server backend matches prefixes with LIKE alone, as its collation need not sort by code point."""
+    _add_todos(db, ('Buy milk', False), ('buy bread', False), ('Buy_ink', False), ('Buyer', False))
+    query = ServerTodoStore(db).build_list_query(Todo.task, prefix='Buy_')
+    sql = str(query.compile(dialect=postgresql.dialect()))
+    assert 'LIKE' in sql and '>' not in sql and '<' not in sql
+    assert db.session.scalars(query).all() == ['Buy_ink']
+
+def test_filter_by_substring(client, db):
+    """Test the contains filter matches anywhere in the task, ignoring case."""
+    _add_todos(db, ('Write REPORT', False), ('Read report', True), ('Call mom', False))
+
+    response = client.get('/todos?contains=report&completed=false')
+    assert [todo['task'] for todo in response.json] == ['Write REPORT']
+
+def test_sort_by_task_descending(client, db):
+    """Test GET /todos?sort=task&order=desc orders by task."""
+    _add_todos(db, ('b', False), ('c', False), ('a', False))
+
+    response = client.get('/todos?sort=task&order=desc')
+    assert [todo['task'] for todo in response.json] == ['c', 'b', 'a']
+
+def test_sorted_pages_follow_cursor(client, db):
+    """Test keyset pages under a non-id sort cover every row exactly once."""
+    _add_todos(db, *[(task, False) for task in ['d', 'b', 'a', 'b', 'c']])
+
+    seen = []
+    url = '/todos?sort=task&limit=2'
+    while url:
+        response = client.get(url)
+        seen.extend(todo['task'] for todo in response.json)
+        cursor = response.headers.get('X-Next-Cursor')
+        url = f'/todos?sort=task&limit=2&after={cursor}' if cursor else None
+    assert seen == ['a', 'b', 'b', 'c', 'd']
+
+def test_invalid_sort_and_cursor(client):
+    """Test unknown sort columns and malformed cursors are rejected."""
+    assert client.get('/todos?sort=priority').status_code == 400
+    assert client.get('/todos?sort=task&after=%%%').status_code == 400
+
+def _query_plan(db, query):
+    sql = query.compile(db.engine, compile_kwargs={'literal_binds': True})
+    with db.engine.connect() as connection:
+        return ' '.join(row[-1] for row in connection.execute(text(f'EXPLAIN QUERY PLAN {sql}')))
+
+@requires_sqlite
+def test_completed_filter_uses_index(db):
+    """Test completed filters are served by the (owner, completed, id) index."""
+    plan = _query_plan(db, store.build_list_query(Todo, completed=False, after=10, limit=50))
+    assert plan.startswith('SEARCH todo USING INDEX ix_todo_owner_completed_id')
+
+@requires_sqlite
+def test_prefix_filter_and_task_sort_use_index(db):
+    """Test prefix filters and task sorts are served by the (owner, task, id) index."""
+    plan = _query_plan(db, store.build_list_query(Todo, prefix='Buy', sort='task', limit=50))
+    assert 'ix_todo_owner_task_id' in plan
+    assert 'TEMP B-TREE' not in plan
+
+@requires_sqlite
+def test_sorted_keyset_page_uses_index(db):
+    """Test resuming a task-sorted page seeks into the index instead of sorting."""
+    plan = _query_plan(db, store.build_list_query(Todo, sort='task', order='desc', after=('m', 5), limit=50))
+    assert 'ix_todo_owner_task_id' in plan
+    assert 'TEMP B-TREE' not in plan
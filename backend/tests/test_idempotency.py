@@ -0,0 +1,94 @@
+import threading
+import pytest
+from app import idempotency_store, store
+from group_commit import GroupCommitter
+from idempotency import REPLAYED_HEADER
+
+pytestmark = pytest.mark.flask_only
+
+def _post(client, key, task='Retry me'):
+    return client.post('/todos', json={'task': task}, headers={'Idempotency-Key': key})
+
+def test_retry_replays_stored_response(client):
+    """Test a retried create returns the first response without writing again."""
+    first = _post(client, 'create-1')
+    assert first.status_code == 201
+    assert REPLAYED_HEADER not in first.headers
+
+    retry = _post(client, 'create-1')
+    assert retry.status_code == 201
+    assert retry.headers[REPLAYED_HEADER] == 'true'
+    assert retry.json == first.json
+    assert len(client.get('/todos').json) == 1
+
+def test_replayed_update_keeps_etag(client):
+    """Test a retried update replays the body and ETag of the first response."""
+    todo_id = client.post('/todos', json={'task': 'A'}).json['id']
+    headers = {'Idempotency-Key': 'update-1'}
+    first = client.put(f'/todos/{todo_id}', json={'completed': True}, headers=headers)
+    retry = client.put(f'/todos/{todo_id}', json={'completed': True}, headers=headers)
+    assert retry.headers[REPLAYED_HEADER] == 'true'
+    assert retry.headers['ETag'] == first.headers['ETag']
+    assert client.get(f'/todos/{todo_id}').headers['ETag'] == first.headers['ETag']
+
+def test_key_reused_with_different_body(client):
+    """Test reusing a key for a different request is rejected."""
+    _post(client, 'create-2', 'First')
+    response = _post(client, 'create-2', 'Second')
+    assert response.status_code == 422
+    assert [todo['task'] for todo in client.get('/todos').json] == ['First']
+
+def test_key_in_progress_gets_conflict(client):
+    """Test a retry arriving while the first request runs is told to wait."""
+    idempotency_store.begin('None POST /todos in-flight', 'other')
+    assert _post(client, 'in-flight').status_code == 409
+
+def test_failed_requests_are_not_stored(client):
+    """Test client and server errors are handled so that the right ones can be retried."""
+    assert client.post('/todos', json={}, headers={'Idempotency-Key': 'bad'}).status_code == 400
+    assert client.post('/todos', json={}, headers={'Idempotency-Key': 'bad'}).headers[REPLAYED_HEADER] == 'true'
+    assert _post(client, 'x' * 256).status_code == 400
+
+def test_group_commit_combines_concurrent_writes(app, client):
+    """Test concurrent writes share commits and each caller gets its own result."""
+    committer = GroupCommitter(app, store._get_current_object(), window=0.05, max_latency=0.5)
+    results = [None] * 8
+
+    def work(n):
+        results[n] = committer.submit(lambda: store.create(f'Task {n}', False).to_dict())
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert committer.writes == 8
+    assert committer.batches < 8
+    assert sorted(result['task'] for result in results) == [f'Task {n}' for n in range(8)]
+    assert len(client.get('/todos').json) == 8
+
+def test_group_commit_isolates_failed_writes(app, client):
+    """Test a write that fails in a group is rolled back alone."""
+    committer = GroupCommitter(app, store._get_current_object(), window=0.05, max_latency=0.5)
+    errors = {}
+
+    def work(name, write):
+        try:
+            committer.submit(write)
+        except ValueError as e:
+            errors[name] = e
+
+    def failing_write():
+        store.create('Rolled back', False)
+        raise ValueError('boom')
+
+    threads = [threading.Thread(target=work, args=('ok', lambda: store.create('Kept', False).id)),
+               threading.Thread(target=work, args=('failing', failing_write))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert list(errors) == ['failing']
+    assert [todo['task'] for todo in client.get('/todos').json] == ['Kept']
@@ -0,0 +1,144 @@
+import time
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import text
+from app import store
+from models import Job, TodoArchive, db
+from tenancy import generate_api_key, hash_api_key
+
+pytestmark = pytest.mark.flask_only
+
+def _wait_for(client, location, headers=None, timeout=5):
+    """Poll a job until it has finished and return it."""
+    deadline = time.monotonic() + timeout
+    while True:
+        db.session.rollback()  # Test requests share the session; look past its read snapshot
+        job = client.get(location, headers=headers).json
+        if job['status'] in ('succeeded', 'failed') or time.monotonic() > deadline:
+            return job
+        time.sleep(0.02)
+
+@pytest.fixture
+def job_queue(app, monkeypatch):
+    """The app's job queue without worker threads; tests run its jobs with run_next()."""
+    queue = app.extensions['todo_api']['job_queue']
+    monkeypatch.setattr(queue, 'workers', 0)
+    monkeypatch.setattr(queue, 'retry_delay', 0)
+    return queue
+
+def test_archive_completed_moves_todos_to_archive(client):
+    """Test completed todos leave the list for the archive table in a background job."""
+    ids = [client.post('/todos', json={'task': f'Task {n}', 'completed': n % 2 == 0}).json['id'] for n in range(5)]
+    token = client.get('/todos/changes').json['token']
+
+    response = client.post('/todos/archive-completed')
+    assert response.status_code == 202
+    assert response.json['status'] == 'queued'
+    assert response.headers['Location'] == f"/jobs/{response.json['id']}"
+
+    job = _wait_for(client, response.headers['Location'])
+    assert job['status'] == 'succeeded'
+    assert (job['progress'], job['total'], job['result']) == (3, 3, {'archived': 3})
+    assert [todo['id'] for todo in client.get('/todos').json] == [ids[1], ids[3]]
+    assert sorted(row.todo_id for row in db.session.scalars(db.select(TodoArchive))) == [ids[0], ids[2], ids[4]]
+    # Delta sync clients learn that the archived todos are gone
+    changes = client.get('/todos/changes', query_string={'since': token}).json['changes']
+    assert sorted(change['id'] for change in changes if change['deleted']) == [ids[0], ids[2], ids[4]]
+
+def test_archive_runs_in_batches(app, client, monkeypatch):
+    """Test the archive moves one batch per transaction and reports progress."""
+    monkeypatch.setitem(app.config, 'ARCHIVE_BATCH_SIZE', 2)
+    client.post('/todos/bulk', json={'todos': [{'task': f'Done {n}', 'completed': True} for n in range(5)]})
+    commits = []
+    store.on_commit(lambda changed, everything, shard: commits.append(everything))
+    try:
+        job = _wait_for(client, client.post('/todos/archive-completed').headers['Location'])
+    finally:
+        store._commit_listeners.pop()
+    assert (job['progress'], job['total']) == (5, 5)
+    assert len(commits) == 3
+    assert client.get('/todos').json == []
+
+def test_archive_publishes_one_reset_event(app, client, monkeypatch):
+    """Test archiving several batches sends event streams a single reset instead of a delete per todo."""
+    monkeypatch.setitem(app.config, 'ARCHIVE_BATCH_SIZE', 2)
+    client.post('/todos/bulk', json={'todos': [{'task': f'Done {n}', 'completed': True} for n in range(5)]})
+    feed = app.extensions['todo_api']['change_feed']
+    after = feed._seq
+    assert _wait_for(client, client.post('/todos/archive-completed').headers['Location'])['status'] == 'succeeded'
+    assert [(event, owner) for _, event, _, owner in feed.wait(after, 0)] == [('reset', None)]
+
+def test_archive_keeps_todos_whose_id_was_reused(client):
+    """Test a todo can be archived under an id that an archived todo had before."""
+    first = client.post('/todos', json={'task': 'Done', 'completed': True}).json['id']
+    assert _wait_for(client, client.post('/todos/archive-completed').headers['Location'])['status'] == 'succeeded'
+    # SQLite hands the id of the archived (deleted) last row out again
+    second = client.post('/todos', json={'task': 'Done again', 'completed': True}).json['id']
+    assert _wait_for(client, client.post('/todos/archive-completed').headers['Location'])['status'] == 'succeeded'
+    archived = db.session.scalars(db.select(TodoArchive).order_by(TodoArchive.id))
+    assert [(row.todo_id, row.task) for row in archived] == [(first, 'Done'), (second, 'Done again')]
+
+def test_jobs_are_scoped_to_their_owner(client):
+    """Test a tenant neither sees the jobs of others nor has its todos archived by them."""
+    api_key = generate_api_key()
+    store.create_tenant('alice', hash_api_key(api_key))
+    alice = {'X-API-Key': api_key}
+    client.post('/todos', json={'task': 'Hers', 'completed': True}, headers=alice)
+
+    location = client.post('/todos/archive-completed').headers['Location']
+    assert client.get(location, headers=alice).status_code == 404
+    assert _wait_for(client, location)['result'] == {'archived': 0}
+    assert [todo['task'] for todo in client.get('/todos', headers=alice).json] == ['Hers']
+
+def test_failed_job_is_retried(app, job_queue):
+    """Test a job that fails is run again until it succeeds or runs out of attempts."""
+    failures = {'flaky': 1, 'broken': 10}
+
+    def handler(job):
+        if failures[job.params['name']]:
+            failures[job.params['name']] -= 1
+            raise RuntimeError('boom')
+        return {'ok': True}
+
+    job_queue.register('test', handler)
+    flaky = job_queue.enqueue('test', params={'name': 'flaky'})['id']
+    broken = job_queue.enqueue('test', params={'name': 'broken'})['id']
+    while job_queue.run_next():
+        pass
+
+    db.session.expire_all()
+    assert (db.session.get(Job, flaky).status, db.session.get(Job, flaky).attempts) == ('succeeded', 2)
+    assert db.session.get(Job, flaky).result == {'ok': True}
+    assert (db.session.get(Job, broken).status, db.session.get(Job, broken).attempts) == ('failed', 3)
+    assert db.session.get(Job, broken).error == 'boom'
+
+def test_failed_job_error_leaves_out_sql(app, job_queue):
+    """Test a job failing on a database error reports the kind of error, not the statement."""
+    job_queue.register('test', lambda job: db.session.execute(text('SELECT secret FROM missing_table')))
+    job_id = job_queue.enqueue('test')['id']
+    while job_queue.run_next():
+        pass
+
+    db.session.expire_all()
+    job = db.session.get(Job, job_id)
+    assert job.status == 'failed'
+    # OperationalError on SQLite, ProgrammingError on PostgreSQL
+    assert job.error.startswith('Database error (') and 'missing_table' not in job.error
+
+def test_job_of_a_dead_worker_is_taken_over(app, job_queue):
+    """Test a running job whose heartbeat stopped is queued again and completed."""
+    job_queue.register('test', lambda job: {'resumed_from': job.progress})
+    job_id = job_queue.enqueue('test')['id']
+    job = db.session.get(Job, job_id)
+    stopped = datetime.now(timezone.utc) - timedelta(minutes=5)
+    job.status, job.attempts, job.progress, job.heartbeat_at = 'running', 1, 7, stopped
+    db.session.commit()
+
+    assert job_queue.run_next()
+    db.session.expire_all()
+    job = db.session.get(Job, job_id)
+    assert (job.status, job.attempts, job.result) == ('succeeded', 2, {'resumed_from': 7})
+
+def test_unknown_job_is_not_found(client):
+    """Test looking up a job that does not exist."""
+    assert client.get('/jobs/999').status_code == 404
@@ -0,0 +1,53 @@
+import random
+import pytest
+from benchmarks.loadtest import MIXES, OPERATIONS, Workload, compare, parse_mix, percentile, summarize
+
+def _report(p95_ms, rps, errors=0):
+    stats = {'requests': 100, 'errors': errors, 'rps': rps, 'p95_ms': p95_ms}
+    return {'operations': {'get_todo': stats}, 'overall': stats}
+
+def test_percentile_interpolates():
+    """Test percentiles interpolate between the closest ranks."""
+    values = [1, 2, 3, 4]
+    assert percentile(values, 50) == 2.5
+    assert percentile(values, 100) == 4
+    assert percentile([], 95) is None
+
+def test_summarize_reports_milliseconds():
+    """Test the summary has throughput and latency percentiles in milliseconds."""
+    summary = summarize([0.001, 0.002, 0.003], errors=1, elapsed=2)
+    assert summary['requests'] == 3
+    assert summary['rps'] == 1.5
+    assert summary['p50_ms'] == 2.0
+    assert summary['max_ms'] == 3.0
+
+def test_compare_flags_regressions():
+    """Test the gate fails on slower latency, lower throughput or errors."""
+    baseline = _report(p95_ms=10, rps=100)
+    assert compare(baseline, _report(p95_ms=10.5, rps=95)) == []
+    assert len(compare(baseline, _report(p95_ms=12, rps=100))) == 1
+    assert len(compare(baseline, _report(p95_ms=10, rps=80))) == 1
+    assert len(compare(baseline, _report(p95_ms=10, rps=100, errors=5))) == 1
+
+def test_parse_mix():
+    """Test mixes are chosen by name or given as weights."""
+    assert parse_mix('read-heavy') == MIXES['read-heavy']
+    assert parse_mix('get_todo=3,create=1') == {'get_todo': 3.0, 'create': 1.0}
+    with pytest.raises(ValueError):
+        parse_mix('explode=1')
+
+@pytest.mark.flask_only
+def test_workload_requests_are_served(client, db):
+    """Test every operation of the workload maps to a working endpoint."""
+    client.post('/todos/bulk', json={'todos': [{'task': f'Buy milk {n}'} for n in range(5)]})
+    workload = Workload({operation: 1 for operation in OPERATIONS}, min_id=1, max_id=5)
+    rng = random.Random(0)
+    created, seen = [], set()
+    for _ in range(200):
+        operation, method, path, body, accepted = workload.next_request(rng, created)
+        response = client.open(path, method=method, json=body)
+        assert response.status_code in accepted, (operation, path)
+        if operation == 'create':
+            created.append(response.json['id'])
+        seen.add(operation)
+    assert seen == set(OPERATIONS)
@@ -0,0 +1,86 @@
+import json
+import logging
+import queue
+import pytest
+from log_pipeline import AsyncQueueHandler, JsonFormatter, LogPipeline, parse_sample_rates
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+@pytest.fixture
+def captured_logs(app):
+    """Route app.logger through a pipeline; calling the fixture drains it and returns the records."""
+    handler = ListHandler()
+    pipeline = LogPipeline([handler])
+    pipeline.start()
+    app.logger.addHandler(pipeline.handler)
+
+    def drain():
+        pipeline.stop()
+        return handler.records
+
+    yield drain
+    app.logger.removeHandler(pipeline.handler)
+    pipeline.stop()
+
+def _access_logs(records):
+    return [record for record in records if hasattr(record, 'status')]
+
+def test_json_formatter_renders_fields():
+    """Test records become JSON lines with lazily formatted messages and extras."""
+    record = logging.makeLogRecord({
+        'msg': 'Returning %s todos', 'args': (3,), 'levelname': 'INFO', 'name': 'app',
+        'request_id': 'abc', 'status': 200,
+    })
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry['message'] == 'Returning 3 todos'
+    assert entry['request_id'] == 'abc'
+    assert entry['status'] == 200
+
+def test_queue_handler_drops_instead_of_blocking():
+    """Test a full queue drops records rather than blocking the caller."""
+    handler = AsyncQueueHandler(queue.SimpleQueue(), max_size=1)
+    logger = logging.getLogger('test_queue_handler')
+    logger.addHandler(handler)
+    logger.propagate = False
+    logger.warning('first')
+    logger.warning('second')
+    assert handler.dropped == 1
+
+@pytest.mark.flask_only
+def test_request_id_is_echoed_and_logged(client, captured_logs):
+    """Test every request gets an X-Request-ID that tags its log records."""
+    response = client.get('/todos', headers={'X-Request-ID': 'req-123'})
+    assert response.headers['X-Request-ID'] == 'req-123'
+
+    generated = client.get('/todos', headers={'X-Request-ID': 'bad id!'}).headers['X-Request-ID']
+    assert generated != 'bad id!' and len(generated) == 32
+
+    access = _access_logs(captured_logs())
+    assert [record.request_id for record in access] == ['req-123', generated]
+    assert access[0].status == 200 and access[0].endpoint == 'get_todos'
+
+@pytest.mark.flask_only
+def test_success_logs_are_sampled_per_route(app, client, captured_logs, monkeypatch):
+    """Test a zero sample rate drops a route's success logs but keeps failures."""
+    monkeypatch.setitem(app.config, 'LOG_SAMPLE_RATES', {'get_todo': 0.0})
+    todo_id = client.post('/todos', json={'task': 'Sampled'}).json['id']
+    client.get(f'/todos/{todo_id}')
+    client.get('/todos/999')
+
+    records = captured_logs()
+    statuses = [(record.endpoint, record.status) for record in _access_logs(records)]
+    assert statuses == [('add_todo', 201), ('get_todo', 404)]
+    assert not any(record.getMessage() == f'Returning todo {todo_id}' for record in records)
+
+def test_parse_sample_rates():
+    """Test LOG_SAMPLE_RATES parsing and validation."""
+    assert parse_sample_rates('get_todos=0.01, get_todo=1') == {'get_todos': 0.01, 'get_todo': 1.0}
+    assert parse_sample_rates(None) == {}
+    with pytest.raises(ValueError):
+        parse_sample_rates('get_todos=2')
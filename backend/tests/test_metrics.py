@@ -0,0 +1,144 @@
+import pytest
+import re
+import threading
+from sqlalchemy import create_engine, text
+from app import app_metrics
+from metrics import AppMetrics, Registry
+
+def _sample(text, name, **labels):
+    """Return the value of one sample in a Prometheus text exposition, or 0."""
+    for line in text.splitlines():
+        match = re.match(r'^(\w+)(?:\{(.*)\})? (\S+)$', line)
+        if not match or match.group(1) != name:
+            continue
+        found = dict(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', match.group(2) or ''))
+        if found == {key: str(value) for key, value in labels.items()}:
+            return float(match.group(3))
+    return 0.0
+
+# Unit tests for the registry
+
+def test_counter_merges_thread_shards():
+    """Test each thread's increments are summed at scrape time."""
+    registry = Registry()
+    counter = registry.counter('jobs_total', 'Jobs.', ('kind',))
+
+    def work():
+        for _ in range(1000):
+            counter.inc('a')
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counter.inc('b', amount=2)
+    text = registry.render()
+    assert '# TYPE jobs_total counter' in text
+    assert _sample(text, 'jobs_total', kind='a') == 4000
+    assert _sample(text, 'jobs_total', kind='b') == 2
+
+def test_histogram_renders_cumulative_buckets():
+    """Test histogram buckets are cumulative and include +Inf, sum and count."""
+    registry = Registry()
+    histogram = registry.histogram('size', 'Sizes.', buckets=(1, 10))
+    for value in (0.5, 5, 50):
+        histogram.observe(value)
+    text = registry.render()
+    assert _sample(text, 'size_bucket', le='1.0') == 1
+    assert _sample(text, 'size_bucket', le='10.0') == 2
+    assert _sample(text, 'size_bucket', le='+Inf') == 3
+    assert _sample(text, 'size_sum') == 55.5
+    assert _sample(text, 'size_count') == 3
+
+def test_finished_threads_leave_no_shards():
+    """Test the counts of ended threads are kept while their shards are dropped."""
+    registry = Registry()
+    counter = registry.counter('requests_total', 'Requests.')
+    histogram = registry.histogram('size', 'Sizes.', buckets=(1, 10))
+
+    def work():
+        counter.inc()
+        histogram.observe(5)
+
+    for _ in range(200):
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+    assert len(counter._shards) == len(histogram._shards) == 0
+    text = registry.render()
+    assert _sample(text, 'requests_total') == 200
+    assert _sample(text, 'size_bucket', le='10.0') == 200
+    assert _sample(text, 'size_sum') == 1000
+
+# Integration tests
+
+@pytest.mark.flask_only
+def test_metrics_record_requests(client, db):
+    """Test /metrics reports request counts, latency and per-request queries."""
+    before = app_metrics.render()
+    client.get('/todos')
+    client.get('/todos/12345')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
+    text = response.get_data(as_text=True)
+
+    def delta(name, **labels):
+        return _sample(text, name, **labels) - _sample(before, name, **labels)
+
+    assert delta('http_requests_total', method='GET', route='/todos', status='200') == 1
+    assert delta('http_requests_total', method='GET', route='/todos/<int:id>', status='404') == 1
+    assert delta('http_request_duration_seconds_count', method='GET', route='/todos') == 1
+    assert delta('http_request_db_queries_count', route='/todos') == 1
+    assert delta('http_request_db_queries_sum', route='/todos') >= 1
+    assert delta('db_queries_total', engine='sqlite') >= 2
+    # Only the /metrics request itself is still in flight
+    assert _sample(text, 'http_requests_in_flight', route='/todos') == 0
+    assert _sample(text, 'http_requests_in_flight', route='/metrics') == 1
+
+@pytest.mark.flask_only
+def test_metrics_record_rejected_requests(client, db):
+    """Test requests turned away by authentication are counted too."""
+    before = app_metrics.render()
+    assert client.get('/todos', headers={'X-API-Key': 'not-a-key'}).status_code == 401
+    text = client.get('/metrics').get_data(as_text=True)
+
+    def delta(name, **labels):
+        return _sample(text, name, **labels) - _sample(before, name, **labels)
+
+    assert delta('http_requests_total', method='GET', route='/todos', status='401') == 1
+    assert delta('http_request_duration_seconds_count', method='GET', route='/todos') == 1
+
+@pytest.mark.flask_only
+def test_database_metrics_cover_only_their_app(app, db):
+    """Test an app's metrics ignore engines of other apps and stop counting once removed."""
+    metrics = AppMetrics()
+    metrics.instrument_sqlalchemy(app, db)
+
+    def queries():
+        return metrics.queries.collect().get(('sqlite',), 0)
+
+    try:
+        db.session.execute(text('SELECT 1'))
+        counted = queries()
+        assert counted >= 1
+        other = create_engine('sqlite://')
+        with other.connect() as connection:
+            connection.execute(text('SELECT 1'))
+        other.dispose()
+        assert queries() == counted
+    finally:
+        metrics.uninstrument_sqlalchemy()
+    db.session.execute(text('SELECT 1'))
+    assert queries() == counted
+
+@pytest.mark.flask_only
+def test_metrics_record_commits_and_sizes(client, db):
+    """Test writes record commit latency and responses record their size."""
+    before = app_metrics.render()
+    client.post('/todos', json={'task': 'Measured'})
+    text = client.get('/metrics').get_data(as_text=True)
+    assert _sample(text, 'db_commit_duration_seconds_count') > _sample(before, 'db_commit_duration_seconds_count')
+    assert (_sample(text, 'http_response_size_bytes_count', route='/todos')
+            == _sample(before, 'http_response_size_bytes_count', route='/todos') + 1)
@@ -0,0 +1,73 @@
+import pytest
+import json
+from app import Todo
+
+def _add_todos(db, count):
+    db.session.add_all([Todo(task=f'Task {i}') for i in range(1, count + 1)])
+    db.session.commit()
+
+def test_get_todos_first_page(client, db):
+    """Test GET /todos?limit= returns a page and a next cursor."""
+    _add_todos(db, 5)
+
+    response = client.get('/todos?limit=2')
+    assert response.status_code == 200
+    assert [todo['task'] for todo in response.json] == ['Task 1', 'Task 2']
+    assert response.headers['X-Next-Cursor'] == str(response.json[-1]['id'])
+    assert 'rel="next"' in response.headers['Link']
+
+def test_get_todos_follows_cursor_to_last_page(client, db):
+    """Test walking every page with the after cursor."""
+    _add_todos(db, 5)
+
+    seen = []
+    url = '/todos?limit=2'
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        seen.extend(todo['task'] for todo in response.json)
+        cursor = response.headers.get('X-Next-Cursor')
+        url = f'/todos?limit=2&after={cursor}' if cursor else None
+
+    assert seen == [f'Task {i}' for i in range(1, 6)]
+
+def test_get_todos_invalid_limit(client):
+    """Test GET /todos rejects a non-positive limit."""
+    response = client.get('/todos?limit=0')
+    assert response.status_code == 400
+    assert 'limit' in response.json['error']
+
+@pytest.mark.flask_only
+def test_get_todos_limit_is_capped(client, db, app):
+    """Test the page size never exceeds TODOS_MAX_PAGE_SIZE."""
+    _add_todos(db, 3)
+    app.config['TODOS_MAX_PAGE_SIZE'] = 2
+    try:
+        response = client.get('/todos?limit=100')
+    finally:
+        app.config['TODOS_MAX_PAGE_SIZE'] = 1000
+    assert len(response.json) == 2
+    assert 'X-Next-Cursor' in response.headers
+
+def test_stream_todos_ndjson(client, db):
+    """Test GET /todos?stream=ndjson emits one todo per line."""
+    _add_todos(db, 3)
+
+    response = client.get('/todos?stream=ndjson')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line)['task'] for line in lines] == ['Task 1', 'Task 2', 'Task 3']
+
+def test_stream_todos_json_array_matches_list(client, db):
+    """Test the chunked JSON array stream matches the regular list body."""
+    _add_todos(db, 3)
+
+    streamed = client.get('/todos?stream=json')
+    assert streamed.status_code == 200
+    assert json.loads(streamed.get_data(as_text=True)) == client.get('/todos').json
+
+def test_stream_todos_empty(client):
+    """Test streaming an empty table yields an empty JSON array."""
+    response = client.get('/todos?stream=json')
+    assert response.get_data(as_text=True) == '[]'
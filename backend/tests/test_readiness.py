@@ -0,0 +1,98 @@
+import os
+import sqlite3
+import time
+import pytest
+from app import store
+
+requires_sqlite = pytest.mark.skipif(
+    not os.environ['DATABASE_URL'].startswith('sqlite'), reason='Holds the SQLite write lock'
+)
+
+@pytest.fixture
+def probe(app, monkeypatch):
+    """The app's readiness probe, measuring on every /readyz request."""
+    monkeypatch.setitem(app.config, 'READINESS_REFRESH_INTERVAL', 0)
+    probe = app.extensions['todo_api']['readiness_probe']
+    yield probe
+    probe.stop()
+
+def test_livez(client):
+    """Test the liveness check answers with no database involved."""
+    response = client.get('/livez')
+    assert response.status_code == 200
+    assert response.json == {'status': 'alive'}
+
+@pytest.mark.flask_only
+def test_readyz_reports_checks(client, probe):
+    """Test a healthy replica is ready and reports what was measured."""
+    response = client.get('/readyz')
+    assert response.status_code == 200
+    assert response.json['status'] == 'ready'
+    assert response.json['failing'] == []
+    checks = response.json['checks']
+    assert checks['database']['ok'] is True
+    if os.environ['DATABASE_URL'].startswith('sqlite'):
+        assert {'pool_saturation', 'write_lock_wait_ms', 'disk_free_mb'} <= set(checks)
+        assert 'replication_lag_seconds' not in checks
+
+@pytest.mark.flask_only
+def test_database_failure_only_fails_readiness(client, probe, monkeypatch):
+    """Test an unreachable database takes the replica out of rotation but keeps it alive."""
+    def ping():
+        raise RuntimeError('database is gone')
+    monkeypatch.setattr(store._get_current_object(), 'ping', ping)
+    response = client.get('/readyz')
+    assert response.status_code == 503
+    assert response.json['failing'] == ['database']
+    assert client.get('/livez').status_code == 200
+
+@pytest.mark.flask_only
+def test_readyz_serves_cached_result(app, client, probe, monkeypatch):
+    """Test probes read the background result instead of querying the database."""
+    monkeypatch.setitem(app.config, 'READINESS_REFRESH_INTERVAL', 60)
+    before = probe.refreshes
+    assert client.get('/readyz').status_code == 200
+    assert client.get('/readyz').status_code == 200
+    assert probe.refreshes == before + 1
+
+@pytest.mark.flask_only
+def test_thresholds_shed_load(app, client, probe, monkeypatch):
+    """Test a saturated pool or a full disk makes the replica not ready."""
+    monkeypatch.setattr(store._get_current_object(), 'pool_usage', lambda: {'reader': (16, 16)})
+    monkeypatch.setattr(store._get_current_object(), 'disk_free', lambda: 10 * 1024 * 1024)
+    response = client.get('/readyz')
+    assert response.status_code == 503
+    assert response.json['checks']['pool_saturation'] == {'ok': False, 'value': 1.0, 'threshold': 0.9}
+    assert response.json['checks']['disk_free_mb'] == {'ok': False, 'value': 10, 'threshold': 100}
+
+    monkeypatch.setitem(app.config, 'READINESS_MAX_POOL_SATURATION', 1.0)
+    monkeypatch.setitem(app.config, 'READINESS_MIN_DISK_FREE_MB', 10)
+    assert client.get('/readyz').status_code == 200
+
+@pytest.mark.flask_only
+@requires_sqlite
+def test_held_write_lock_fails_readiness(app, client, probe, monkeypatch):
+    """Test writers stuck behind the write lock make the replica not ready."""
+    monkeypatch.setitem(app.config, 'READINESS_MAX_WRITE_LOCK_WAIT_MS', 50)
+    holder = sqlite3.connect(store.db_file, isolation_level=None)
+    holder.execute('BEGIN IMMEDIATE')
+    try:
+        response = client.get('/readyz')
+    finally:
+        holder.execute('ROLLBACK')
+        holder.close()
+    assert response.status_code == 503
+    assert response.json['failing'] == ['write_lock_wait_ms']
+    assert response.json['checks']['write_lock_wait_ms']['value'] >= 50
+
+@pytest.mark.flask_only
+def test_stale_result_fails_readiness(app, probe, monkeypatch):
+    """Test a result the background thread stopped refreshing is not trusted."""
+    monkeypatch.setitem(app.config, 'READINESS_REFRESH_INTERVAL', 60)
+    probe.start()
+    ready, _ = probe.status()
+    assert ready
+    probe.result = dict(probe.result, checked_at=time.monotonic() - 181)
+    ready, report = probe.status()
+    assert not ready
+    assert report['failing'] == ['stale']
@@ -0,0 +1,101 @@
+import os
+import pytest
+from sqlalchemy import text
+from app import store
+import migrations
+
+pytestmark = pytest.mark.flask_only
+
+requires_sqlite = pytest.mark.skipif(
+    not os.environ['DATABASE_URL'].startswith('sqlite'), reason='Checks the SQLite FTS5 index'
+)
+
+def _add_todos(client, *tasks):
+    client.post('/todos/bulk', json={'todos': [{'task': task} for task in tasks]})
+
+def _search(client, query):
+    return client.get('/todos/search', query_string=query)
+
+def test_search_ranks_and_highlights(client, db):
+    """Test GET /todos/search returns ranked matches with highlighted terms."""
+    _add_todos(client, 'Call the plumber', 'Buy milk', 'Buy milk and milk powder')
+
+    response = _search(client, {'q': 'milk'})
+    assert response.status_code == 200
+    results = response.json['results']
+    assert [r['task'] for r in results] == ['Buy milk and milk powder', 'Buy milk']
+    assert results[0]['score'] > results[1]['score']
+    assert results[1]['highlight'] == 'Buy <mark>milk</mark>'
+    assert response.json['index_complete'] is True
+
+def test_search_paginates(client, db):
+    """Test limit and offset page through the results via next_offset."""
+    _add_todos(client, *[f'Report {n}' for n in range(5)])
+
+    first = _search(client, {'q': 'report', 'limit': 3}).json
+    assert len(first['results']) == 3
+    second = _search(client, {'q': 'report', 'limit': 3, 'offset': first['next_offset']}).json
+    assert len(second['results']) == 2
+    assert second['next_offset'] is None
+    ids = {r['id'] for r in first['results'] + second['results']}
+    assert len(ids) == 5
+
+def test_search_validates_parameters(client, db):
+    """Test a missing query or a bad offset returns 400."""
+    assert _search(client, {}).status_code == 400
+    assert _search(client, {'q': 'x', 'offset': '-1'}).status_code == 400
+    assert _search(client, {'q': 'x', 'limit': '0'}).status_code == 400
+
+def test_search_follows_updates_and_deletes(client, db):
+    """Test the index stays in sync with writes to the todo table."""
+    todo_id = client.post('/todos', json={'task': 'Water plants'}).json['id']
+    client.put(f'/todos/{todo_id}', json={'task': 'Feed cat'})
+    assert _search(client, {'q': 'plants'}).json['results'] == []
+    assert [r['id'] for r in _search(client, {'q': 'cat'}).json['results']] == [todo_id]
+
+    client.delete(f'/todos/{todo_id}')
+    assert _search(client, {'q': 'cat'}).json['results'] == []
+
+@requires_sqlite
+def test_search_matches_prefix_and_treats_syntax_literally(client, db):
+    """Test the last word matches as a prefix and FTS5 operators are not interpreted."""
+    _add_todos(client, 'Schedule dentist', 'Pay "NOT" invoice')
+
+    assert [r['task'] for r in _search(client, {'q': 'dent'}).json['results']] == ['Schedule dentist']
+    assert [r['task'] for r in _search(client, {'q': 'pay NOT'}).json['results']] == ['Pay "NOT" invoice']
+    assert _search(client, {'q': '"*'}).status_code == 200
+
+@requires_sqlite
+def test_existing_todos_are_backfilled_in_batches(client, db):
+    """Test todos created before the index are indexed incrementally."""
+    engine = store.db.engine
+    migrations.downgrade(engine, target=4)
+    with engine.begin() as connection:
+        for n in range(5):
+            connection.execute(text('INSERT INTO todo (task, completed) VALUES (:task, 0)'), {'task': f'Legacy {n}'})
+    migrations.upgrade(engine)
+
+    assert _search(client, {'q': 'legacy'}).json['index_complete'] is False
+    assert store.backfill_search_index(batch_size=2) is False
+    assert store.search_index_pending() == 3
+    assert len(_search(client, {'q': 'legacy'}).json['results']) == 2
+
+    # New writes are indexed right away while the backfill is still running
+    client.post('/todos', json={'task': 'Legacy new'})
+    while not store.backfill_search_index(batch_size=2):
+        pass
+    response = _search(client, {'q': 'legacy', 'limit': 10}).json
+    assert len(response['results']) == 6
+    assert response['index_complete'] is True
+
+@requires_sqlite
+def test_reindex_search_command(app, client, db):
+    """Test flask reindex-search --full rebuilds the index."""
+    _add_todos(client, 'Alpha', 'Beta')
+    with store.db.engine.begin() as connection:
+        connection.execute(text('DELETE FROM todo_fts'))
+    assert _search(client, {'q': 'alpha'}).json['results'] == []
+
+    result = app.test_cli_runner().invoke(args=['reindex-search', '--full'])
+    assert 'Search index is complete' in result.output
+    assert len(_search(client, {'q': 'alpha'}).json['results']) == 1
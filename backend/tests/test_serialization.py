@@ -0,0 +1,57 @@
+import pytest
+from flask import jsonify
+from serialization import ENCODERS, create_encoder
+
+TASKS = ['plain', 'quote " and \\ backslash', 'tab\tnew\nline\x00\x1f\x7f', 'café ☕ 𝄞', ' </script>', '']
+
+@pytest.fixture(params=sorted(ENCODERS))
+def encoder(request):
+    return create_encoder(request.param)
+
+def _rows(tasks):
+    return [(n + 1, task, completed) for n, (task, completed) in
+            enumerate(zip(tasks, [True, False, None] * len(tasks)))]
+
+def _jsonify(rows):
+    return jsonify([{'id': i, 'task': t, 'completed': c} for i, t, c in rows]).get_data()
+
+@pytest.mark.parametrize('task', TASKS)
+def test_array_matches_jsonify(encoder, task):
+    """Test encoded pages are byte-identical to jsonify, escapes included."""
+    rows = _rows(['ascii first', task])
+    assert encoder.array(rows) == _jsonify(rows)
+
+def test_empty_array_matches_jsonify(encoder):
+    """Test an empty page encodes like jsonify([])."""
+    assert encoder.array([]) == _jsonify([])
+
+def test_streamed_array_and_ndjson(encoder):
+    """Test streamed chunks join into the same document as a single page."""
+    rows = _rows(TASKS)
+    chunks = [b'[', encoder.array_items(rows[:2], True), encoder.array_items(rows[2:], False), b']']
+    assert b''.join(chunks) + b'\n' == _jsonify(rows)
+    lines = encoder.ndjson(rows).splitlines()
+    assert lines == [_jsonify([row]).strip()[1:-1] for row in rows]
+
+def test_unknown_encoder():
+    """Test asking for an encoder that is not installed fails clearly."""
+    with pytest.raises(ValueError):
+        create_encoder('simdjson')
+
+@pytest.mark.flask_only
+def test_list_endpoint_body_unchanged(client, db):
+    """Test GET /todos returns what jsonify of to_dict() returned before."""
+    client.post('/todos/bulk', json={'todos': [{'task': 'Ünïcode', 'completed': True}, {'task': 'b'}]})
+    response = client.get('/todos')
+    expected = _jsonify([(todo['id'], todo['task'], todo['completed']) for todo in response.json])
+    assert response.data == expected
+    assert response.mimetype == 'application/json'
+
+@pytest.mark.flask_only
+def test_list_endpoint_is_indented_in_debug_mode(app, client, db, monkeypatch):
+    """Test GET /todos pretty-prints like jsonify when the app runs in debug mode."""
+    client.post('/todos', json={'task': 'Pretty'})
+    monkeypatch.setattr(app, 'debug', True)
+    response = client.get('/todos')
+    assert response.data == _jsonify([(todo['id'], todo['task'], todo['completed']) for todo in response.json])
+    assert b'\n  ' in response.data
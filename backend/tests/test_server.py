@@ -0,0 +1,86 @@
+import os
+import runpy
+import subprocess
+import sys
+from types import SimpleNamespace
+from app import Todo, create_app
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), '..')
+CONFIG_PATH = os.path.join(BACKEND_DIR, 'gunicorn.conf.py')
+
+def test_gunicorn_config_from_environment(monkeypatch):
+    """Test the production worker pool is configured through the environment."""
+    monkeypatch.setenv('PORT', '8080')
+    monkeypatch.setenv('WEB_CONCURRENCY', '3')
+    monkeypatch.setenv('CACHE_BACKEND', 'redis')
+    monkeypatch.setenv('GUNICORN_THREADS', '16')
+    monkeypatch.setenv('GUNICORN_MAX_REQUESTS', '500')
+    config = runpy.run_path(CONFIG_PATH)
+    assert config['bind'] == '0.0.0.0:8080'
+    assert config['workers'] == 3
+    assert config['threads'] == 16
+    assert config['max_requests'] == 500
+    assert config['worker_class'] == 'gthread'
+
+def test_gunicorn_workers_follow_cache_backend(monkeypatch):
+    """Test the per-process memory cache means one worker by default, and is turned off for more."""
+    monkeypatch.delenv('WEB_CONCURRENCY', raising=False)
+    monkeypatch.setenv('CACHE_BACKEND', 'memory')
+    assert runpy.run_path(CONFIG_PATH)['workers'] == 1
+    assert os.environ['CACHE_BACKEND'] == 'memory'
+    monkeypatch.setenv('WEB_CONCURRENCY', '3')
+    assert runpy.run_path(CONFIG_PATH)['workers'] == 3
+    assert os.environ['CACHE_BACKEND'] == 'none'
+    monkeypatch.delenv('WEB_CONCURRENCY')
+    monkeypatch.setenv('CACHE_BACKEND', 'redis')
+    assert runpy.run_path(CONFIG_PATH)['workers'] > 1
+    assert os.environ['CACHE_BACKEND'] == 'redis'
+
+def test_import_has_no_side_effects(tmp_path):
+    """Test importing app creates no app, database file, log directory or thread."""
+    script = 'import threading, app; print(threading.active_count(), hasattr(app, "app"))'
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'todos.db'}")
+    result = subprocess.run([sys.executable, '-c', script], cwd=tmp_path, env=dict(env, PYTHONPATH=BACKEND_DIR),
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ['1', 'False']
+    assert list(tmp_path.iterdir()) == []
+
+def test_create_app_returns_independent_apps(client, tmp_path):
+    """Test each app created has its own initialized database and caches."""
+    other = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'other.db'}",
+                        'SEARCH_BACKFILL_ON_STARTUP': False})
+    other_client = other.test_client()
+    assert other_client.get('/todos').json == []
+    todo_id = other_client.post('/todos', json={'task': 'Elsewhere'}).json['id']
+    other_client.put(f'/todos/{todo_id}', json={'completed': True})
+    assert other_client.get('/todos').json[0]['completed'] is True
+    with other.app_context():
+        assert Todo.query.count() == 1
+
+    assert client.get('/todos').json == []
+    client.post('/todos', json={'task': 'Here'})
+    assert [todo['task'] for todo in client.get('/todos').json] == ['Here']
+
+def test_asgi_app_refuses_to_start_when_auth_is_required(tmp_path):
+    """Test the ASGI variant, which has no API keys, does not serve the anonymous list when keys are required."""
+    script = ('import asyncio, asgi_app\n'
+              'async def main():\n'
+              '    async with asgi_app.lifespan(asgi_app.app):\n'
+              '        pass\n'
+              'asyncio.run(main())\n')
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'todos.db'}", AUTH_REQUIRED='true',
+               PYTHONPATH=BACKEND_DIR)
+    result = subprocess.run([sys.executable, '-c', script], cwd=tmp_path, env=env, capture_output=True, text=True)
+    assert result.returncode != 0
+    assert 'AUTH_REQUIRED is set' in result.stderr
+    assert not (tmp_path / 'todos.db').exists()
+
+def test_worker_init_keeps_app_usable(app, client):
+    """Test the gunicorn worker hook leaves a working, warmed up connection pool."""
+    runpy.run_path(CONFIG_PATH)['post_worker_init'](SimpleNamespace(wsgi=app))
+    probe = app.extensions['todo_api']['readiness_probe']
+    try:
+        assert client.get('/health').status_code == 200
+        assert probe.status()[0]  # Measured by the probe thread the hook started
+    finally:
+        probe.stop()
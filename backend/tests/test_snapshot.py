@@ -0,0 +1,132 @@
+import io
+import os
+import pytest
+import snapshot
+from app import store
+from tenancy import generate_api_key, hash_api_key
+
+pytestmark = pytest.mark.flask_only
+
+requires_sqlite = pytest.mark.skipif(
+    not os.environ['DATABASE_URL'].startswith('sqlite'), reason='Checks the SQLite FTS5 index'
+)
+
+TODOS = [{'task': 'Buy milk', 'completed': False}, {'task': 'Café crème ☕', 'completed': True},
+         {'task': 'Write "quoted" report', 'completed': False}]
+
+def _tenant():
+    api_key = generate_api_key()
+    store.create_tenant('importer', hash_api_key(api_key))
+    return {'X-API-Key': api_key}
+
+def _todos(client, headers=None):
+    return [{'task': todo['task'], 'completed': todo['completed']} for todo in client.get('/todos', headers=headers).json]
+
+@pytest.mark.parametrize('snapshot_format', ['ndjson', 'columnar'])
+def test_snapshot_round_trip(app, client, monkeypatch, snapshot_format):
+    """Test an exported snapshot imports into another tenant as the same todos, in order."""
+    monkeypatch.setitem(app.config, 'SNAPSHOT_BATCH_SIZE', 2)
+    client.post('/todos/bulk', json={'todos': TODOS})
+    exported = client.get('/todos/export', query_string={'format': snapshot_format})
+    assert exported.status_code == 200
+    assert exported.mimetype == snapshot.FORMATS[snapshot_format]
+    assert exported.headers['Content-Disposition'].startswith('attachment')
+
+    tenant = _tenant()
+    response = client.post('/todos/import', query_string={'format': snapshot_format}, data=exported.data,
+                           headers=tenant)
+    assert response.status_code == 201
+    assert response.json == {'imported': 3}
+    assert _todos(client, tenant) == TODOS
+    # Ids are assigned anew, since the originals belong to the anonymous list
+    assert {todo['id'] for todo in client.get('/todos').json}.isdisjoint(
+        todo['id'] for todo in client.get('/todos', headers=tenant).json)
+
+def test_export_ndjson_matches_stream(client):
+    """Test the NDJSON export holds the lines GET /todos?stream=ndjson sends."""
+    client.post('/todos/bulk', json={'todos': TODOS})
+    assert client.get('/todos/export').data == client.get('/todos?stream=ndjson').data
+
+def test_columnar_format_is_compact():
+    """Test the columnar encoding is a fraction of the NDJSON size and decodes losslessly."""
+    rows = [(n, f'Todo number {n}', n % 3 == 0) for n in range(1, 5001)]
+    columnar = b''.join(snapshot.write_snapshot('columnar', [rows[:2500], rows[2500:]], None))
+    assert columnar.startswith(snapshot.MAGIC)
+    ndjson_size = sum(len(f'{{"completed":false,"id":{n},"task":"{task}"}}\n') for n, task, _ in rows)
+    assert len(columnar) < ndjson_size / 10
+    batches = list(snapshot.read_snapshot('columnar', io.BytesIO(columnar), batch_size=3000))
+    assert [len(batch) for batch in batches] == [3000, 2000]
+    assert [row for batch in batches for row in batch] == [(task, completed) for _, task, completed in rows]
+
+def test_invalid_import_is_rolled_back(app, client, monkeypatch):
+    """Test a snapshot with a bad row adds nothing, even after earlier batches were inserted."""
+    monkeypatch.setitem(app.config, 'SNAPSHOT_BATCH_SIZE', 2)
+    client.post('/todos', json={'task': 'Existing'})
+    body = b'{"task": "One"}\n{"task": "Two"}\n\n{"task": "Three"}\n{"task": ""}\n'
+    response = client.post('/todos/import', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 400
+    assert response.json['error'] == 'Line 5: Task must be a non-empty string'
+    assert client.post('/todos/import', data=b'{"task": "One"}\nnot json\n').json['error'] == 'Line 2: not valid JSON'
+    assert _todos(client) == [{'task': 'Existing', 'completed': False}]
+
+def test_truncated_or_corrupt_columnar_import_is_rejected(client):
+    """Test a columnar upload without its end frame, or with a damaged frame, imports nothing."""
+    data = b''.join(snapshot.write_snapshot('columnar', [[(1, 'One', False), (2, 'Two', True)]], None))
+    content_type = snapshot.FORMATS['columnar']
+    assert client.post('/todos/import', data=data[:-8], content_type=content_type).json['error'] == 'Snapshot is truncated'
+    corrupt = data[:len(snapshot.MAGIC) + 8] + b'x' * (len(data) - len(snapshot.MAGIC) - 16) + data[-8:]
+    assert client.post('/todos/import', data=corrupt, content_type=content_type).json['error'] == 'Frame is corrupt'
+    assert client.post('/todos/import', data=b'TODOCOL0', content_type=content_type).status_code == 400
+    assert client.get('/todos').json == []
+
+def test_snapshot_format_is_validated(client):
+    """Test an unknown format is rejected."""
+    assert client.get('/todos/export?format=csv').status_code == 400
+    assert client.post('/todos/import?format=csv', data=b'').status_code == 400
+
+def test_import_refreshes_cached_list(client):
+    """Test imported todos show up in a list that was cached before."""
+    first = client.get('/todos')
+    client.post('/todos/import', data=b'{"task": "Imported", "completed": true}\n')
+    second = client.get('/todos', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert _todos(client) == [{'task': 'Imported', 'completed': True}]
+
+def test_import_publishes_reset_event(app, client):
+    """Test a committed import tells the owner's event streams to reload, and a rejected one does not."""
+    feed = app.extensions['todo_api']['change_feed']
+    tenant = _tenant()
+    after = feed._seq
+    client.post('/todos/import', data=b'{"task": "One"}\n{"task": ""}\n', headers=tenant)
+    assert feed.wait(after, 0) == []
+    client.post('/todos/import', data=b'{"task": "One"}\n{"task": "Two"}\n', headers=tenant)
+    assert [event for _, event, _, _ in feed.wait(after, 0)] == ['reset']
+    stream = feed.stream(feed.event_id(after), heartbeat=0, owner=1)
+    next(stream)
+    assert next(stream) == f'id: {feed.event_id(after + 1)}\nevent: reset\ndata: {{}}\n\n'
+
+@requires_sqlite
+def test_imported_todos_are_indexed_by_backfill(client):
+    """Test the import leaves search indexing to the backfill, and keeps indexing later writes."""
+    client.post('/todos/import', data=b'{"task": "Imported needle"}\n{"task": "Another needle"}\n')
+    while not store.backfill_search_index(batch_size=1):
+        pass
+    assert len(client.get('/todos/search?q=needle').json['results']) == 2
+    client.post('/todos', json={'task': 'Fresh needle'})
+    assert len(client.get('/todos/search?q=needle').json['results']) == 3
+
+def test_export_and_import_commands(app, client, tmp_path):
+    """Test flask export-todos and import-todos copy the todos between tenants through a file."""
+    client.post('/todos/bulk', json={'todos': TODOS})
+    path = str(tmp_path / 'todos.snapshot')
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['export-todos', path, '--format', 'columnar'])
+    assert 'Exported 3 todos' in result.output
+
+    tenant = _tenant()
+    result = runner.invoke(args=['import-todos', path, '--format', 'columnar', '--tenant', '1'])
+    assert 'Imported 3 todos' in result.output
+    assert _todos(client, tenant) == TODOS
+    result = runner.invoke(args=['import-todos', path, '--tenant', '99'])
+    assert result.exit_code != 0
+    assert 'No tenant with id 99' in result.output
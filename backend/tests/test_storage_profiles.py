@@ -0,0 +1,54 @@
+import os
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+import storage_profiles
+
+requires_sqlite = pytest.mark.skipif(
+    not os.environ['DATABASE_URL'].startswith('sqlite'), reason='SQLite storage profile only'
+)
+
+def test_load_profile_defaults_to_flask_env():
+    """Test the profile follows FLASK_ENV unless DB_PROFILE is set."""
+    assert storage_profiles.load_profile({'FLASK_ENV': 'development'})[0] == 'development'
+    assert storage_profiles.load_profile({})[0] == 'production'
+
+def test_load_profile_applies_overrides():
+    """Test single DB_* variables override profile values."""
+    name, settings = storage_profiles.load_profile({'DB_PROFILE': 'production', 'DB_BUSY_TIMEOUT': '250'})
+    assert name == 'production'
+    assert settings['busy_timeout'] == 250
+    assert settings['journal_mode'] == 'WAL'
+
+def test_load_profile_rejects_unknown_name():
+    with pytest.raises(ValueError):
+        storage_profiles.load_profile({'DB_PROFILE': 'turbo'})
+
+def test_sqlite_file_path():
+    """Test only file SQLite URIs get a path, resolved against the instance folder."""
+    assert storage_profiles.sqlite_file_path('sqlite:///todos.db', '/srv/instance') == '/srv/instance/todos.db'
+    assert storage_profiles.sqlite_file_path('sqlite:////data/todos.db', '/srv') == '/data/todos.db'
+    assert storage_profiles.sqlite_file_path('sqlite://', '/srv') is None
+    assert storage_profiles.sqlite_file_path('postgresql://db/todos', '/srv') is None
+
+@requires_sqlite
+def test_pragmas_applied_to_writer(db):
+    """Test new writer connections run in WAL mode with the busy timeout set."""
+    with db.engine.connect() as connection:
+        assert connection.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert connection.execute(text('PRAGMA busy_timeout')).scalar() == 5000
+
+@requires_sqlite
+def test_reader_pool_is_read_only(db):
+    """Test the read pool cannot write to the database."""
+    with db.engines['reader'].connect() as connection:
+        with pytest.raises(OperationalError):
+            connection.execute(text("INSERT INTO todo (task, completed, version) VALUES ('x', 0, 1)"))
+
+@requires_sqlite
+def test_health_reports_storage_settings(client):
+    """Test /health reports the active storage profile."""
+    storage = client.get('/health').json['storage']
+    assert storage['profile'] == 'testing'
+    assert storage['pragmas']['journal_mode'] == 'WAL'
+    assert storage['read_pool_size'] == 4
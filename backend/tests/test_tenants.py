@@ -0,0 +1,135 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import textwrap
+import pytest
+from sqlalchemy import text
+from app import Todo, store
+from change_feed import ChangeFeed
+from tenancy import RateLimiter, generate_api_key, hash_api_key
+
+pytestmark = pytest.mark.flask_only
+
+requires_sqlite = pytest.mark.skipif(
+    not os.environ['DATABASE_URL'].startswith('sqlite'), reason='Checks SQLite database files and query plans'
+)
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), '..')
+
+def _tenant(name):
+    """Create a tenant and return the headers that authenticate as it."""
+    api_key = generate_api_key()
+    store.create_tenant(name, hash_api_key(api_key))
+    return {'Authorization': f'Bearer {api_key}'}
+
+def test_tenants_only_see_their_own_todos(client):
+    """Test each tenant and the anonymous list are isolated from each other."""
+    alice, bob = _tenant('alice'), _tenant('bob')
+    todo_id = client.post('/todos', json={'task': 'Alice task'}, headers=alice).json['id']
+    client.post('/todos', json={'task': 'Anonymous task'})
+
+    assert [todo['task'] for todo in client.get('/todos', headers=alice).json] == ['Alice task']
+    assert [todo['task'] for todo in client.get('/todos').json] == ['Anonymous task']
+    assert client.get('/todos', headers=bob).json == []
+    # Also once Alice's todo is cached
+    assert client.get(f'/todos/{todo_id}', headers=alice).status_code == 200
+    assert client.get(f'/todos/{todo_id}', headers=bob).status_code == 404
+    assert client.put(f'/todos/{todo_id}', json={'completed': True}, headers=bob).status_code == 404
+    assert client.delete(f'/todos/{todo_id}', headers=bob).status_code == 404
+    assert client.delete('/todos/bulk', json={'ids': [todo_id]}, headers=bob).json['results'][0]['status'] == 404
+    assert client.get('/todos/search?q=task', headers=bob).json['results'] == []
+    assert client.get('/todos/changes', headers=bob).json['changes'] == []
+    assert client.get(f'/todos/{todo_id}', headers=alice).json['completed'] is False
+
+def test_tombstones_are_scoped_to_the_owner(client):
+    """Test delta sync only reports the deletes of the tenant's own todos."""
+    alice, bob = _tenant('alice'), _tenant('bob')
+    todo_id = client.post('/todos', json={'task': 'Gone'}, headers=alice).json['id']
+    tokens = {name: client.get('/todos/changes', headers=headers).json['token']
+              for name, headers in (('alice', alice), ('bob', bob))}
+    client.delete(f'/todos/{todo_id}', headers=alice)
+    assert client.get('/todos/changes', query_string={'since': tokens['alice']}, headers=alice).json['changes'] == [
+        {'id': todo_id, 'revision': 2, 'deleted': True}]
+    assert client.get('/todos/changes', query_string={'since': tokens['bob']}, headers=bob).json['changes'] == []
+
+def test_api_keys_are_checked(client, app, monkeypatch):
+    """Test unknown keys are rejected and keys are required when configured."""
+    response = client.get('/todos', headers={'X-API-Key': 'not-a-key'})
+    assert response.status_code == 401
+    assert response.headers['WWW-Authenticate'] == 'Bearer'
+    assert client.get('/todos', headers={'X-API-Key': generate_api_key()}).status_code == 401
+
+    monkeypatch.setitem(app.config, 'AUTH_REQUIRED', True)
+    assert client.get('/todos').status_code == 401
+    assert client.get('/todos', headers=_tenant('alice')).status_code == 200
+    assert client.get('/health').status_code == 200
+
+def test_create_tenant_command(app, client):
+    """Test the CLI prints a working API key."""
+    result = app.test_cli_runner().invoke(args=['create-tenant', 'acme'])
+    assert 'Created tenant 1 (acme)' in result.output
+    api_key = result.output.split('API key: ')[1].strip()
+    assert client.get('/todos', headers={'X-API-Key': api_key}).status_code == 200
+
+def test_rate_limiter_token_bucket():
+    """Test each key gets its burst, then refills at the configured rate."""
+    now = [0.0]
+    limiter = RateLimiter(rate=2, burst=3, clock=lambda: now[0])
+    assert [limiter.acquire('a') for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire('a') == pytest.approx(0.5)
+    assert limiter.acquire('b') == 0
+    now[0] = 0.5
+    assert limiter.acquire('a') == 0
+    assert limiter.acquire('a') > 0
+
+def test_change_feed_streams_only_the_owners_events():
+    """Test a stream skips the events of other owners."""
+    feed = ChangeFeed()
+    stream = feed.stream(heartbeat=0, owner=1)
+    next(stream)
+    next(stream)  # reset
+    feed.publish('create', {'id': 1, 'task': 'Theirs', 'completed': False}, owner=2)
+    feed.publish('create', {'id': 2, 'task': 'Mine', 'completed': False}, owner=1)
+    assert 'Mine' in next(stream)
+
+@requires_sqlite
+def test_tenant_list_uses_owner_index(db):
+    """Test a tenant's keyset page is an index range scan over its own rows."""
+    sql = store.build_list_query(Todo.id, owner_id=3, after=10, limit=50).compile(
+        db.engine, compile_kwargs={'literal_binds': True})
+    with db.engine.connect() as connection:
+        plan = ' '.join(row[-1] for row in connection.execute(text(f'EXPLAIN QUERY PLAN {sql}')))
+    assert plan.startswith('SEARCH todo USING COVERING INDEX ix_todo_owner_id_id')
+    assert 'TEMP B-TREE' not in plan
+
+@requires_sqlite
+def test_tenants_are_sharded_across_database_files(tmp_path):
+    """Test DB_SHARDS keeps each tenant's todos in the database file of its shard."""
+    script = textwrap.dedent('''
+        import json
+        from app import create_app, store
+        from tenancy import hash_api_key
+        app = create_app()
+        with app.app_context():
+            for name in ('one', 'two'):
+                store.create_tenant(name, hash_api_key(name))
+        client = app.test_client()
+        for name in ('one', 'two'):
+            client.post('/todos', json={'task': name}, headers={'X-API-Key': name})
+        print(json.dumps([[t['task'] for t in client.get('/todos', headers={'X-API-Key': name}).json]
+                          for name in ('one', 'two')]))
+    ''')
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'todos.db'}", DB_SHARDS='2',
+               SEARCH_BACKFILL_ON_STARTUP='false')
+    result = subprocess.run([sys.executable, '-c', script], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == [['one'], ['two']]
+
+    def tasks(path):
+        with sqlite3.connect(path) as connection:
+            return [row[0] for row in connection.execute('SELECT task FROM todo')]
+    # Tenant 1 lands on shard 1, tenant 2 on the main database
+    assert tasks(tmp_path / 'todos.shard1.db') == ['one']
+    assert tasks(tmp_path / 'todos.db') == ['two']
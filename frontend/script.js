@@ -3,32 +3,109 @@ const todoForm = document.getElementById('todo-form');
 const todoInput = document.getElementById('todo-input');
 const todoList = document.getElementById('todo-list');
 
-// Fetch and display todos
-async function getTodos() {
-    const response = await fetch(apiUrl);
-    const todos = await response.json();
-    todoList.innerHTML = '';
-    todos.forEach(todo => {
-        const li = document.createElement('li');
-        li.dataset.id = todo.id;
-        if (todo.completed) {
-            li.classList.add('completed');
-        }
+// ETag of the list currently rendered, sent back so unchanged lists return 304
+let todosEtag = null;
+// Rendered todos by id
+const todos = new Map();
+// Deltas received while the full list is loading, applied once it arrives
+let pendingDeltas = null;
+// The change feed only carries writes served by the process the stream is
+// connected to, so the list is also revalidated with a conditional GET
+const refreshInterval = 15000;
+// Wait before opening a new stream after the server refused one (503)
+const resubscribeDelay = 60000;
+
+function renderTodo(todo) {
+    const li = document.createElement('li');
+    li.dataset.id = todo.id;
+    if (todo.completed) {
+        li.classList.add('completed');
+    }
+
+    const span = document.createElement('span');
+    span.textContent = todo.task;
+    span.addEventListener('click', () => toggleComplete(todo.id, !todos.get(todo.id).completed));
+
+    const deleteButton = document.createElement('button');
+    deleteButton.textContent = 'Delete';
+    deleteButton.addEventListener('click', (e) => {
+        e.stopPropagation();
+        deleteTodo(todo.id);
+    });
+
+    li.appendChild(span);
+    li.appendChild(deleteButton);
+    return li;
+}
+
+// Insert or replace a todo, keeping the list ordered by id like GET /todos
+function upsertTodo(todo) {
+    const li = renderTodo(todo);
+    const existing = todoList.querySelector(`li[data-id="${todo.id}"]`);
+    if (existing) {
+        existing.replaceWith(li);
+    } else {
+        const next = [...todoList.children].find(item => Number(item.dataset.id) > todo.id);
+        todoList.insertBefore(li, next || null);
+    }
+    todos.set(todo.id, todo);
+}
+
+function removeTodo(id) {
+    const existing = todoList.querySelector(`li[data-id="${id}"]`);
+    if (existing) existing.remove();
+    todos.delete(id);
+}
 
-        const span = document.createElement('span');
-        span.textContent = todo.task;
-        span.addEventListener('click', () => toggleComplete(todo.id, !todo.completed));
+// Apply a create/update/delete delta; applying one twice is harmless
+function applyDelta(event, data) {
+    if (pendingDeltas) {
+        pendingDeltas.push([event, data]);
+    } else if (event === 'delete') {
+        removeTodo(data.id);
+    } else {
+        upsertTodo(data);
+    }
+}
 
-        const deleteButton = document.createElement('button');
-        deleteButton.textContent = 'Delete';
-        deleteButton.addEventListener('click', (e) => {
-            e.stopPropagation();
-            deleteTodo(todo.id);
-        });
+// Fetch and display the full list
+async function getTodos() {
+    pendingDeltas = pendingDeltas || [];
+    try {
+        const headers = todosEtag ? { 'If-None-Match': todosEtag } : {};
+        const response = await fetch(apiUrl, { headers, cache: 'no-store' });
+        // 304 leaves the list as it is, and so does an error (e.g. 429 or
+        // 500), whose body is not a list; the next refresh tries again
+        if (response.ok) {
+            const list = await response.json();
+            todosEtag = response.headers.get('ETag');
+            todoList.innerHTML = '';
+            todos.clear();
+            list.forEach(upsertTodo);
+        } else if (response.status !== 304) {
+            console.warn(`Loading todos failed with status ${response.status}`);
+        }
+    } catch (error) {
+        console.warn('Loading todos failed:', error);
+    } finally {
+        const deltas = pendingDeltas;
+        pendingDeltas = null;
+        deltas.forEach(([event, data]) => applyDelta(event, data));
+    }
+}
 
-        li.appendChild(span);
-        li.appendChild(deleteButton);
-        todoList.appendChild(li);
+// Follow changes made by other tabs and clients through the server's change feed
+function subscribe() {
+    const events = new EventSource(`${apiUrl}/events`);
+    // EventSource reconnects by itself when a stream ends, but gives up on an
+    // error status such as the 503 sent when too many streams are open
+    events.addEventListener('error', () => {
+        if (events.readyState === EventSource.CLOSED) setTimeout(subscribe, resubscribeDelay);
+    });
+    // Sent on connect, and whenever missed changes cannot be replayed
+    events.addEventListener('reset', getTodos);
+    ['create', 'update', 'delete'].forEach(name => {
+        events.addEventListener(name, (e) => applyDelta(name, JSON.parse(e.data)));
     });
 }
 
@@ -38,32 +115,43 @@ todoForm.addEventListener('submit', async (e) => {
     const task = todoInput.value.trim();
     if (!task) return;
 
-    await fetch(apiUrl, {
+    const response = await fetch(apiUrl, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ task })
     });
     todoInput.value = '';
-    getTodos();
+    if (response.ok) applyDelta('create', await response.json());
 });
 
 // Toggle complete status
 async function toggleComplete(id, completed) {
-    await fetch(`${apiUrl}/${id}`, {
+    const response = await fetch(`${apiUrl}/${id}`, {
         method: 'PUT',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ completed })
     });
-    getTodos();
+    if (response.ok) applyDelta('update', await response.json());
 }
 
 // Delete a todo
 async function deleteTodo(id) {
-    await fetch(`${apiUrl}/${id}`, {
+    const response = await fetch(`${apiUrl}/${id}`, {
         method: 'DELETE'
     });
-    getTodos();
+    if (response.ok || response.status === 404) applyDelta('delete', { id });
+}
+
+// Revalidate the list unless a load is running or the tab is hidden; an
+// unchanged list costs a 304
+function refreshTodos() {
+    if (!pendingDeltas && !document.hidden) getTodos();
 }
 
 // Initial load
-getTodos();
+if (window.EventSource) {
+    subscribe();
+} else {
+    getTodos();
+}
+setInterval(refreshTodos, refreshInterval);